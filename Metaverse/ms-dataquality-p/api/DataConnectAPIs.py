@@ -6,9 +6,8 @@ import boto3
 from botocore.exceptions import ClientError
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from backend.dataconnect import DataconnectBackend
-from backend.gitlab_utils import GitLabUtils
-from backend.database import Database
+from fastapi.responses import JSONResponse
+from backend.service_registry import ServiceRegistry
 from dotenv import load_dotenv
 import logging
 import time
@@ -24,7 +23,27 @@ load_dotenv(env_file, override=True)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Services are built on first use (or by the background warm-up) so the app starts serving at once
+def _database():
+    from backend.database import Database
+    return Database()
+
+def _dataconnect_backend():
+    from backend.dataconnect import DataconnectBackend
+    return DataconnectBackend()
+
+def _gitlab_utils():
+    from backend.gitlab_utils import GitLabUtils
+    return GitLabUtils()
+
+db_name = os.getenv('DB_NAME')
+services = ServiceRegistry()
+db = services.register('database', _database)
+dcb = services.register('dataconnect_backend', _dataconnect_backend)
+gl_utils = services.register('gitlab', _gitlab_utils)
+
+# The lifespan handler starts the service warm-up in the background
+app = FastAPI(lifespan=services.lifespan)
 
 # Enable CORS for all routes
 app.add_middleware(
@@ -35,11 +54,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-db_name = os.getenv('DB_NAME')
-db = Database()
-dcb = DataconnectBackend()
-gl_utils = GitLabUtils()
+@app.get("/healthz")
+async def healthz():
+    return services.health()
+
+@app.get("/readyz")
+async def readyz():
+    ready, report = services.readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
 
 
 
@@ -261,16 +283,18 @@ async def offboard_instance(creds: dict, resources: dict):
 # Function to delete resources
 def delete_aws_resources(creds, resources):
     try:
+        from backend.aws_clients import aws_clients
+        # One-off clients: customer credentials are not kept in the process-wide pool
         session = boto3.Session(
             aws_access_key_id=creds["aws_access_key_id"],
             aws_secret_access_key=creds["aws_secret_access_key"],
             region_name=creds["region"]
         )
-        
-        lambda_client = session.client('lambda')
-        secrets_client = session.client('secretsmanager')
-        kms_client = session.client('kms')
-        ecr_client = session.client('ecr')
+
+        lambda_client = session.client('lambda', config=aws_clients.config)
+        secrets_client = session.client('secretsmanager', config=aws_clients.config)
+        kms_client = session.client('kms', config=aws_clients.config)
+        ecr_client = session.client('ecr', config=aws_clients.config)
 
         # Delete Lambda function
         lambda_client.delete_function(FunctionName=f"{resources['instance_id']}_s3_lambda")
@@ -1,16 +1,17 @@
 import os
 import sys
-from fastapi import FastAPI, HTTPException
+import asyncio
+from fastapi import FastAPI, HTTPException, Query, Header
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from pydantic import BaseModel
+from typing import List, Optional
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from backend.checker import DataQualityChecker
-from backend.gitlab_utils import GitLabUtils
-from backend.database import Database
-from backend.dataquality import DataQualityService
+from backend.service_registry import ServiceRegistry
+from backend.response_formats import JSON, ARROW, MEDIA_TYPES, negotiate_format, to_arrow_table, iter_arrow_stream, parquet_bytes
 
 # Load environment variables
 env_file = '.env'
@@ -21,7 +22,52 @@ if not load_dotenv(env_file, override=True):
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Services are built on first use (or by the background warm-up) so the app starts serving at once
+def _database():
+    from backend.database import Database
+    return Database()
+
+def _dataquality_service():
+    from backend.dataquality import DataQualityService
+    return DataQualityService()
+
+def _gitlab_utils():
+    from backend.gitlab_utils import GitLabUtils
+    return GitLabUtils()
+
+def _checker():
+    from backend.checker import DataQualityChecker
+    return DataQualityChecker(dqs=dqs)
+
+def _incremental_checker():
+    from backend.incremental import IncrementalChecker
+    return IncrementalChecker(checker)
+
+def _approximate_checker():
+    from backend.approximate import ApproximateChecker
+    return ApproximateChecker(checker)
+
+def _spark_session():
+    return dqs.spark_manager.get()
+
+def _spark_status():
+    from backend.spark_session import spark_manager
+    return spark_manager.stats()
+
+services = ServiceRegistry()
+db = services.register('database', _database)
+dqs = services.register('dataquality_service', _dataquality_service)
+gl_utils = services.register('gitlab', _gitlab_utils, required=False)
+checker = services.register('checker', _checker)
+incremental_checker = services.register('incremental_checker', _incremental_checker)
+approximate_checker = services.register('approximate_checker', _approximate_checker)
+if os.getenv('SPARK_WARMUP', 'false').lower() == 'true':
+    # Optional: also start the JVM ahead of the first dataset read
+    services.register('spark', _spark_session, required=False)
+services.add_probe('spark_session', _spark_status)
+
+# The lifespan handler starts the service warm-up in the background
+app = FastAPI(lifespan=services.lifespan)
 
 # Enable CORS for all routes
 app.add_middleware(
@@ -32,21 +78,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-try:
-    db = Database()
-    dqs = DataQualityService()
-    gl_utils = GitLabUtils()
-    checker = DataQualityChecker()
-except Exception as e:
-    logger.error("Failed to initialize services: %s", str(e))
-    raise
+@app.get("/healthz")
+async def healthz():
+    return services.health()
+
+@app.get("/readyz")
+async def readyz():
+    ready, report = services.readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+def response_format(accept, requested):
+    try:
+        return negotiate_format(accept, requested)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+def table_response(table, fmt, paging=None):
+    """Arrow IPC stream or Parquet body; paging info travels in X-* headers."""
+    headers = {
+        f"X-{key.replace('_', '-').title()}": '' if value is None else str(value)
+        for key, value in (paging or {}).items() if key != 'columns'
+    }
+    if fmt == ARROW:
+        return StreamingResponse(iter_arrow_stream(table), media_type=MEDIA_TYPES[ARROW], headers=headers)
+    return Response(parquet_bytes(table), media_type=MEDIA_TYPES[fmt], headers=headers)
 
 # Define Pydantic models
 class Dataset(BaseModel):
     id: str
     name: str
 
+class GenerateChecksRequest(Dataset):
+    preview_limit: Optional[int] = None
+    cursor: int = 0
+    columns: Optional[List[str]] = None
+
 class QualityRule(BaseModel):
     column: str
     rule_name: str
@@ -58,31 +124,213 @@ class QualityCheckCreate(BaseModel):
     description: str
     rule: QualityRule
     dataset: Dataset
+    sample_size: Optional[int] = None
+    execution_mode: Optional[str] = None
+    approximate: bool = False
+    confidence: float = 0.95
+    margin: float = 0.01
+
+class QualityCheckBatch(BaseModel):
+    type: str
+    name: str
+    description: str
+    # Without rules, the dataset's stored rule set is applied (latest unless rule_set_version is given)
+    rules: Optional[List[QualityRule]] = None
+    rule_set_version: Optional[str] = None
+    dataset: Dataset
+    sample_size: Optional[int] = None
+    execution_mode: Optional[str] = None
+    approximate: bool = False
+    confidence: float = 0.95
+    margin: float = 0.01
 
 @app.post("/api/data-quality/dataset/generate-checks")
-async def generate_quality_rules(dataset: Dataset):
+async def generate_quality_rules(dataset: GenerateChecksRequest):
     try:
-        result = dqs.process_selected_dataset(dataset.model_dump())
+        # Spark reads and rule generation block: run them off the event loop
+        result = await asyncio.to_thread(
+            dqs.process_selected_dataset,
+            dataset.model_dump(include={'id', 'name'}), dataset.preview_limit, dataset.cursor, dataset.columns
+        )
         if result:
             df = result["dataframe"]
             metadata = result["metadata"]
             rules = result["rules"]
-            return {"dataframe": df, "metadata": metadata, "rules": rules}
+            return {"dataframe": df, "preview": result["preview"], "metadata": metadata, "rules": rules,
+                    "rule_set_version": result["rule_set_version"]}
         else:
             raise HTTPException(status_code=500, detail="Failed to generate quality rules.")
     except Exception as e:
         logger.error("Error generating quality rules: %s", str(e))
         raise HTTPException(status_code=500, detail="Error in processing dataset quality rules.")
 
+# Handlers that read datasets, run checks or call AWS are plain functions: FastAPI runs them in its
+# thread pool instead of blocking the event loop
+@app.get("/api/data-quality/dataset/{dataset_id}/preview")
+def preview_dataset(dataset_id: str, cursor: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                    columns: Optional[str] = None, format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    fmt = response_format(accept, format)
+    try:
+        page = dqs.preview_dataset(dataset_id, limit, cursor, columns.split(',') if columns else None, as_arrow=fmt != JSON)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error previewing dataset: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error previewing dataset.")
+    if page is None:
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    if fmt != JSON:
+        return table_response(page.pop('records'), fmt, page)
+    return page
+
+@app.get("/api/data-quality/dataset/{dataset_id}/export")
+def export_dataset(dataset_id: str, columns: Optional[str] = None, format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    fmt = response_format(accept, format)
+    if fmt == JSON:
+        raise HTTPException(status_code=406, detail="Full datasets are exported as Arrow or Parquet only, use the preview endpoint for JSON pages.")
+    try:
+        table = dqs.export_dataset(dataset_id, columns.split(',') if columns else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error exporting dataset: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error exporting dataset.")
+    if table is None:
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    return table_response(table, fmt, {'total': table.num_rows})
+
 @app.post("/api/data-quality/dataset/apply-check")
-async def apply_quality_check(quality_check: QualityCheckCreate):
+def apply_quality_check(quality_check: QualityCheckCreate):
     try:
-        check_result = checker.generate_and_save_quality_report(quality_check.dataset.model_dump(), quality_check.rule)
+        if quality_check.approximate:
+            # Estimates with confidence intervals from a bounded sample of the dataset
+            estimates = approximate_checker.run(quality_check.dataset.model_dump(), [quality_check.rule], quality_check.confidence, quality_check.margin)
+            return estimates["reports"][0]
+        check_result = checker.generate_and_save_quality_report(quality_check.dataset.model_dump(), quality_check.rule, quality_check.sample_size, quality_check.execution_mode)
         return check_result
     except Exception as e:
         logger.error("Error applying quality check: %s", str(e))
         raise HTTPException(status_code=500, detail="Error applying quality check.")
 
+def resolve_rules(quality_checks):
+    """Rules of the request, else the stored rule set of the dataset (one lookup, no S3 read)."""
+    if quality_checks.rules:
+        return quality_checks.rules
+    from backend.rule_set_store import to_quality_rules
+    rule_set = dqs.rule_set_store.get(quality_checks.dataset.id, quality_checks.rule_set_version)
+    if rule_set is None:
+        raise HTTPException(status_code=404, detail="No rules given and no stored rule set for this dataset.")
+    return [QualityRule(**rule) for rule in to_quality_rules(rule_set)]
+
+@app.get("/api/data-quality/dataset/{dataset_id}/rules")
+def get_rule_set(dataset_id: str, version: Optional[str] = None):
+    try:
+        rule_set = dqs.rule_set_store.get(dataset_id, version)
+    except Exception as e:
+        logger.error("Error reading rule set: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error reading rule set.")
+    if rule_set is None:
+        raise HTTPException(status_code=404, detail="Rule set not found.")
+    return rule_set
+
+@app.get("/api/data-quality/dataset/{dataset_id}/rules/versions")
+def list_rule_set_versions(dataset_id: str):
+    try:
+        return {"versions": dqs.rule_set_store.versions(dataset_id)}
+    except Exception as e:
+        logger.error("Error listing rule set versions: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error listing rule set versions.")
+
+@app.post("/api/data-quality/dataset/apply-checks")
+def apply_quality_checks(quality_checks: QualityCheckBatch):
+    rules = resolve_rules(quality_checks)
+    try:
+        if quality_checks.approximate:
+            return approximate_checker.run(quality_checks.dataset.model_dump(), rules, quality_checks.confidence, quality_checks.margin)
+        # The dataset is loaded once and every rule of the suite is evaluated against it
+        check_results = checker.generate_quality_reports(quality_checks.dataset.model_dump(), rules, quality_checks.sample_size, quality_checks.execution_mode)
+        return check_results
+    except Exception as e:
+        logger.error("Error applying quality checks: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error applying quality checks.")
+
+@app.post("/api/data-quality/dataset/apply-checks/incremental")
+def apply_incremental_quality_checks(quality_checks: QualityCheckBatch):
+    try:
+        # Only new or changed objects of the dataset are read, the rest comes from stored partials
+        return incremental_checker.run(quality_checks.dataset.model_dump(), quality_checks.rules)
+    except Exception as e:
+        logger.error("Error applying incremental quality checks: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error applying incremental quality checks.")
+
+@app.post("/api/data-quality/events/s3")
+def handle_s3_event(event: dict):
+    try:
+        return incremental_checker.handle_s3_event(event)
+    except Exception as e:
+        logger.error("Error handling S3 event: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error handling S3 event.")
+
+@app.get("/api/data-quality/results/{result_id}/invalid-records")
+def get_invalid_records(result_id: str, cursor: int = Query(0, ge=0), limit: int = Query(1000, ge=1, le=10000),
+                        format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    fmt = response_format(accept, format)
+    if fmt != JSON:
+        entry = checker.invalid_records.get_page_frame(result_id, cursor, limit)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Check result not found or expired.")
+        page, paging = entry
+        return table_response(to_arrow_table(page), fmt, paging)
+    page = checker.invalid_records.get_page(result_id, cursor, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Check result not found or expired.")
+    return page
+
+@app.get("/api/data-quality/results/{result_id}/invalid-records/stream")
+def stream_invalid_records(result_id: str, format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    fmt = response_format(accept, format)
+    if fmt != JSON:
+        records = checker.invalid_records.get(result_id)
+        if records is None:
+            raise HTTPException(status_code=404, detail="Check result not found or expired.")
+        return table_response(to_arrow_table(records), fmt)
+    source = checker.invalid_records.get_source(result_id)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Check result not found or expired.")
+    records, positions = source
+    # Rows are serialized chunk by chunk while FastAPI sends them
+    return StreamingResponse(checker.invalid_records.stream_ndjson(records, positions=positions), media_type="application/x-ndjson")
+
+@app.get("/api/data-quality/cache/stats")
+async def get_cache_stats():
+    from backend.rule_compiler import rule_cache_stats
+    from backend.aws_clients import aws_clients
+    from backend.api_mistral import mistral_metrics
+    return {
+        "dataset_frames": dqs.frame_cache.stats(),
+        "invalid_records": checker.invalid_records.stats(),
+        "column_profiles": dqs.profile_store.stats(),
+        "compiled_rules": rule_cache_stats(),
+        "generated_rules": dqs.rule_cache.stats() if dqs.rule_cache else None,
+        "raw_objects": dqs.object_cache.stats() if dqs.object_cache else None,
+        "aws_clients": aws_clients.stats(),
+        "mistral_api": mistral_metrics.stats()
+    }
+
+@app.get("/api/data-quality/spark/session")
+async def get_spark_session():
+    return dqs.spark_manager.stats()
+
+@app.delete("/api/data-quality/rule-cache")
+def invalidate_rule_cache(column: Optional[str] = None, dtype: Optional[str] = None):
+    if dqs.rule_cache is None:
+        raise HTTPException(status_code=404, detail="Rule generation cache is disabled.")
+    try:
+        return {"deleted": dqs.rule_cache.invalidate(column, dtype)}
+    except Exception as e:
+        logger.error("Error invalidating rule cache: %s", str(e))
+        raise HTTPException(status_code=500, detail="Error invalidating rule cache.")
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=1002)
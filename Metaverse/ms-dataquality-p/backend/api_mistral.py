@@ -1,42 +1,404 @@
-import requests
+import os
+import time
 import json
+import atexit
+import random
+import asyncio
 import logging
+import threading
+from collections import deque
+import aiohttp
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MISTRAL_MAX_CONCURRENCY = int(os.getenv('MISTRAL_MAX_CONCURRENCY', 8))
+MISTRAL_COLUMN_TIMEOUT_SECONDS = float(os.getenv('MISTRAL_COLUMN_TIMEOUT_SECONDS', 60))
+MISTRAL_MAX_RETRIES = int(os.getenv('MISTRAL_MAX_RETRIES', 3))
+MISTRAL_BATCH_SIZE = int(os.getenv('MISTRAL_BATCH_SIZE', 10))
+MISTRAL_MAX_TOKENS = int(os.getenv('MISTRAL_MAX_TOKENS', 8192))
+MISTRAL_CONNECT_TIMEOUT_SECONDS = float(os.getenv('MISTRAL_CONNECT_TIMEOUT_SECONDS', 5))
+MISTRAL_KEEPALIVE_SECONDS = float(os.getenv('MISTRAL_KEEPALIVE_SECONDS', 60))
+MISTRAL_BACKOFF_BASE_SECONDS = float(os.getenv('MISTRAL_BACKOFF_BASE_SECONDS', 0.5))
+MISTRAL_BACKOFF_MAX_SECONDS = float(os.getenv('MISTRAL_BACKOFF_MAX_SECONDS', 20))
 
 
-# Fonction pour générer des règles de qualité des données et leurs scripts SQL pour une colonne donnée
-def generate_quality_rules_with_sql(api_key, column_name):
-    url = "https://api.mistral.ai/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`.
+    A 429 from the provider pauses every caller until its Retry-After has elapsed.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available, else return the seconds to wait for the next one."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    async def acquire_async(self, deadline=None):
+        """Wait for a token. Returns False if none is available before `deadline` (monotonic)."""
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+# Shared by every request of the process so concurrent API calls stay within the provider quota
+mistral_rate_limiter = TokenBucket(
+    rate=float(os.getenv('MISTRAL_REQUESTS_PER_SECOND', 2)),
+    capacity=float(os.getenv('MISTRAL_BURST', 4))
+)
+
+
+def _backoff_seconds(attempt):
+    """Exponential backoff with full jitter, so concurrent callers don't retry in lockstep."""
+    return random.uniform(0, min(MISTRAL_BACKOFF_MAX_SECONDS, MISTRAL_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _retry_after_seconds(response, attempt):
+    """Delay requested by a 429 response (seconds or HTTP date), else jittered exponential backoff."""
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return _backoff_seconds(attempt)
+
+
+class MistralMetrics:
+    """Latency, retries and token usage of the completion calls, over the process lifetime."""
+
+    def __init__(self, window=1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, latency, attempts, usage=None, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.retries += max(attempts - 1, 0)
+            self._latencies.append(latency)
+            if usage:
+                self.prompt_tokens += usage.get('prompt_tokens') or 0
+                self.completion_tokens += usage.get('completion_tokens') or 0
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(q):
+                return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)], 4) if latencies else None
+
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'retries': self.retries,
+                'latency_p50_seconds': percentile(0.5),
+                'latency_p95_seconds': percentile(0.95),
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
+
+
+mistral_metrics = MistralMetrics()
+
+
+MISTRAL_URL = "https://api.mistral.ai/v1/chat/completions"
+MISTRAL_MODEL = "mistral-small-latest"
+# Bump when the batched prompt or its response schema changes, so cached rules are regenerated
+RULES_PROMPT_VERSION = "batch-json-1"
+
+# Shape requested from the model for batched generation
+RULES_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "columns": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "column": {"type": "string"},
+                    "rules": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"rule": {"type": "string"}, "sql": {"type": "string"}},
+                            "required": ["rule", "sql"]
+                        }
+                    }
+                },
+                "required": ["column", "rules"]
+            }
+        }
+    },
+    "required": ["columns"]
+}
+
+
+class MistralClient:
+    """
+    Async client of the completion API. One aiohttp session (keep-alive connection pool)
+    lives on a background event loop, so sync callers from any thread and async callers
+    share the same connections instead of paying a TLS handshake per request.
+    """
+
+    def __init__(self, max_connections, keepalive_seconds, connect_timeout):
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.connect_timeout = connect_timeout
+        self._loop = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='mistral-client', daemon=True).start()
+        return self._loop
+
+    def run(self, coroutine):
+        """Run a coroutine on the client loop and wait for its result (for sync callers)."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop()).result()
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_seconds,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def chat_completion(self, api_key, payload, label, rate_limiter=None, timeout=None):
+        """
+        POST a chat completion and return the message content. Waits for the shared rate
+        limiter, retries 429s after their Retry-After and 5xx or connection errors with
+        jittered exponential backoff, and gives up once `timeout` has elapsed.
+        """
+        if asyncio.get_running_loop() is not self._ensure_loop():
+            # The session belongs to the client loop: callers on another loop hop over to it
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                self.chat_completion(api_key, payload, label, rate_limiter, timeout), self._loop
+            ))
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        rate_limiter = rate_limiter or mistral_rate_limiter
+        timeout = timeout or MISTRAL_COLUMN_TIMEOUT_SECONDS
+        session = await self._get_session()
+        start = time.monotonic()
+        # The timeout covers the whole call: waiting for a token, retries and the requests themselves
+        deadline = start + timeout
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                if not await rate_limiter.acquire_async(deadline):
+                    raise TimeoutError(f"no request slot available within {timeout}s")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"timed out after {timeout}s")
+                request_timeout = aiohttp.ClientTimeout(total=remaining, connect=min(self.connect_timeout, remaining))
+                retry = attempt <= MISTRAL_MAX_RETRIES
+                try:
+                    async with session.post(MISTRAL_URL, headers=headers, json=payload, timeout=request_timeout) as response:
+                        if response.status == 429 and retry:
+                            delay = _retry_after_seconds(response, attempt - 1)
+                            logger.info(f"Rate limited while generating rules for {label}, retrying in {delay:.1f}s")
+                            rate_limiter.pause(delay)
+                            continue
+                        if response.status >= 500 and retry:
+                            delay = _backoff_seconds(attempt - 1)
+                            logger.info(f"Server error {response.status} for {label}, retrying in {delay:.1f}s")
+                            await asyncio.sleep(delay)
+                            continue
+                        response.raise_for_status()  # Raise an exception for bad status codes
+                        response_data = await response.json()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if not retry or time.monotonic() >= deadline:
+                        raise
+                    delay = _backoff_seconds(attempt - 1)
+                    logger.info(f"Connection error for {label} ({type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                usage = response_data.get("usage") or {}
+                latency = time.monotonic() - start
+                mistral_metrics.record(latency, attempt, usage)
+                content = response_data.get("choices", [])[0].get("message", {}).get("content", "")
+                logger.info(
+                    f"API response for {label} in {latency:.2f}s "
+                    f"({usage.get('prompt_tokens')} prompt / {usage.get('completion_tokens')} completion tokens): "
+                    f"{content[:150]}..."  # Print first 150 characters of response
+                )
+                return content
+        except Exception:
+            mistral_metrics.record(time.monotonic() - start, attempt, error=True)
+            raise
+
+    async def _close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self):
+        if self._loop is not None and self._loop.is_running():
+            self.run(self._close())
+
+
+# Shared by every caller of the process, closed at interpreter exit
+mistral_client = MistralClient(
+    max_connections=int(os.getenv('MISTRAL_MAX_CONNECTIONS', MISTRAL_MAX_CONCURRENCY)),
+    keepalive_seconds=MISTRAL_KEEPALIVE_SECONDS,
+    connect_timeout=MISTRAL_CONNECT_TIMEOUT_SECONDS
+)
+atexit.register(mistral_client.close)
+
+
+def _column_name_and_type(column):
+    """Accept a column name or a (name, type) pair such as Spark's DataFrame.dtypes."""
+    if isinstance(column, (list, tuple)):
+        return str(column[0]), str(column[1])
+    return str(column), None
+
+
+def parse_rules_response(content, columns):
+    """
+    Validate a batched JSON response against RULES_RESPONSE_SCHEMA and return
+    {column: [{'rule': ..., 'sql': ...}]} for the requested columns only.
+    Raises ValueError when the response is not JSON of the expected shape.
+    """
+    content = content.strip()
+    if content.startswith('```'):
+        # Some answers still wrap the JSON in a markdown fence
+        content = content.strip('`').removeprefix('json').strip()
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {str(e)}")
+    entries = data.get('columns') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError("Response has no 'columns' list")
+
+    rules = {column: [] for column in columns}
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get('column') not in rules or not isinstance(entry.get('rules'), list):
+            continue
+        for rule in entry['rules']:
+            if not isinstance(rule, dict):
+                continue
+            name, sql = rule.get('rule'), rule.get('sql')
+            if isinstance(name, str) and isinstance(sql, str) and name.strip() and sql.strip():
+                rules[entry['column']].append({'rule': name.strip(), 'sql': sql.strip()})
+    return rules
+
+
+async def agenerate_quality_rules_for_batch(api_key, columns, rate_limiter=None, timeout=None):
+    """
+    Generate the rules of several columns in one request, asking for JSON that follows
+    RULES_RESPONSE_SCHEMA. Returns {column: [{'rule': ..., 'sql': ...}]}; every column
+    of a failed batch gets an empty list.
+    """
+    columns = [_column_name_and_type(column) for column in columns]
+    names = [name for name, _ in columns]
+    described = "\n".join(f"- {name}" + (f" ({data_type})" if data_type else "") for name, data_type in columns)
     payload = {
-        "model": "mistral-small-latest",
+        "model": MISTRAL_MODEL,
         "messages": [
             {
                 "role": "user",
-                "content": f"Generate data quality rule names for the following column: {column_name}. For each rule, also provide the SQL script to check the rule. Format: 'Rule: RuleName | SQL Query: <sql_script>'"
+                "content": (
+                    "Generate data quality rule names for each of the following columns of the table `table_name` "
+                    f"(column types in parentheses):\n{described}\n"
+                    "For each rule, also provide the SQL script to check the rule. "
+                    "Answer only with JSON matching this JSON schema, with one entry per column:\n"
+                    f"{json.dumps(RULES_RESPONSE_SCHEMA)}"
+                )
             }
         ],
+        "response_format": {"type": "json_object"},
         "temperature": 0.7,
         "top_p": 1,
-        "max_tokens": 1024,  
+        "max_tokens": min(1024 * len(columns), MISTRAL_MAX_TOKENS),
         "stream": False,
         "safe_prompt": False,
         "random_seed": 1337
     }
+    label = ", ".join(names)
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()  # Raise an exception for bad status codes
-        response_data = response.json()
-        content = response_data.get("choices", [])[0].get("message", {}).get("content", "")
-        logger.info(f"API response for {column_name}: {content[:150]}...")  # Print first 100 characters of response
-        return content
+        content = await mistral_client.chat_completion(api_key, payload, label, rate_limiter, timeout)
+        return parse_rules_response(content, names)
     except Exception as e:
-        logger.info(f"Error generating rules for {column_name}: {str(e)}")
-        return ""
\ No newline at end of file
+        logger.info(f"Error generating rules for {label}: {str(e)}")
+        return {name: [] for name in names}
+
+
+def generate_quality_rules_for_batch(api_key, columns, rate_limiter=None, timeout=None):
+    return mistral_client.run(agenerate_quality_rules_for_batch(api_key, columns, rate_limiter, timeout))
+
+
+async def agenerate_quality_rules_for_columns(api_key, columns, batch_size=None, max_concurrency=None, timeout=None):
+    """
+    Generate the rules of every column with batched JSON prompts of `batch_size` columns,
+    sent concurrently (at most `max_concurrency` requests in flight, paced by the shared
+    rate limiter). `columns` holds names or (name, type) pairs. Returns
+    {column: [{'rule': ..., 'sql': ...}]} in column order.
+    """
+    columns = list(columns)
+    if not columns:
+        return {}
+    batch_size = max(1, batch_size or MISTRAL_BATCH_SIZE)
+    batches = [columns[i:i + batch_size] for i in range(0, len(columns), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency or MISTRAL_MAX_CONCURRENCY, len(batches))))
+
+    async def generate(batch):
+        async with semaphore:
+            return await agenerate_quality_rules_for_batch(api_key, batch, None, timeout)
+
+    rules = {}
+    for batch_rules in await asyncio.gather(*(generate(batch) for batch in batches)):
+        rules.update(batch_rules)
+    return {name: rules.get(name, []) for name, _ in map(_column_name_and_type, columns)}
+
+
+def generate_quality_rules_for_columns(api_key, columns, batch_size=None, max_concurrency=None, timeout=None):
+    """Blocking wrapper of agenerate_quality_rules_for_columns (the requests run on the shared client loop)."""
+    return mistral_client.run(agenerate_quality_rules_for_columns(api_key, columns, batch_size, max_concurrency, timeout))
@@ -0,0 +1,306 @@
+import os
+import math
+import random
+import logging
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+from dotenv import load_dotenv
+from backend.rule_compiler import compile_rule
+from backend.rule_kernels import unique
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def z_score(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def required_sample_size(population, confidence=0.95, margin=0.01):
+    """
+    Cochran's sample size for estimating a proportion (worst case p = 0.5) within `margin`,
+    with the finite population correction.
+    """
+    z = z_score(confidence)
+    n0 = z * z * 0.25 / (margin * margin)
+    if population:
+        n0 = n0 / (1 + (n0 - 1) / population)
+        return int(math.ceil(min(n0, population)))
+    return int(math.ceil(n0))
+
+
+def proportion_interval(invalid, sample_size, population, confidence=0.95):
+    """
+    Wilson score interval of the invalid rate observed on the sample, narrowed by the
+    finite population correction. Returns (rate, low, high).
+    """
+    if sample_size == 0:
+        return 0.0, 0.0, 1.0
+    rate = invalid / sample_size
+    if population and sample_size >= population:
+        # The whole population was checked: the rate is exact
+        return rate, rate, rate
+    z = z_score(confidence)
+    denominator = 1 + z * z / sample_size
+    center = (rate + z * z / (2 * sample_size)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / sample_size + z * z / (4 * sample_size * sample_size)) / denominator
+    if population and population > 1:
+        half_width *= math.sqrt(max(population - sample_size, 0) / (population - 1))
+    return rate, max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+class HyperLogLog:
+    """
+    Vectorized HyperLogLog distinct-count sketch over 64-bit value hashes (2**precision registers).
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_series(self, series):
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            series = series.astype('float64')
+        self.add_hashes(pd.util.hash_pandas_object(series, index=False).to_numpy())
+
+    def add_hashes(self, hashes):
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        # A sentinel bit keeps the rank bounded when the remaining bits are all zero
+        rest = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = (64 - np.floor(np.log2(rest.astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+def _parse_block(header, block):
+    """
+    Parse the complete lines of a block as text: (frame, bytes of those lines), or None when the
+    block starts inside a quoted field.
+    """
+    # Drop the partial first and last lines of the block
+    block = block[block.find('\n') + 1:]
+    block = block[:block.rfind('\n') + 1]
+    if not block:
+        return None
+    try:
+        return pd.read_csv(StringIO(header + '\n' + block), dtype=str, keep_default_na=False), len(block.encode('utf-8'))
+    except pd.errors.ParserError:
+        return None
+
+
+def sample_csv_object(s3_client, bucket_name, key, target_rows, block_bytes, max_blocks, full_read_bytes, seed=None,
+                      max_workers=8):
+    """
+    Read a bounded random sample of a CSV object with ranged GETs: at most `max_blocks` blocks
+    of `block_bytes`, whatever the object size. Small objects are read whole.
+    Rows are drawn evenly from many small blocks spread over the object, so neighbouring rows
+    (often written together) don't make up the sample. Blocks that start inside a quoted
+    multi-line field are skipped.
+    Returns (frame, estimated_population, full) where `full` means the whole object was read.
+    """
+    size = s3_client.head_object(Bucket=bucket_name, Key=key)['ContentLength']
+    if size <= full_read_bytes:
+        body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        frame = pd.read_csv(BytesIO(body))
+        return frame, len(frame), True
+
+    def read_range(start, end):
+        response = s3_client.get_object(Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}")
+        return response['Body'].read().decode('utf-8', errors='replace')
+
+    # The head block is larger than the sampled ones, for a steadier first row size estimate
+    head = read_range(0, max(block_bytes, 64 * 1024) - 1)
+    header, _, head_rows = head.partition('\n')
+    head_rows = head_rows[:head_rows.rfind('\n') + 1]
+    rows_in_head = max(head_rows.count('\n'), 1)
+    average_row_bytes = max(len(head_rows.encode('utf-8')) / rows_in_head, 1)
+    population = int((size - len(header) - 1) / average_row_bytes)
+    sample_size = min(target_rows, population)
+
+    # As many blocks as the budget allows (one per sampled row at most), a few rows taken from each
+    rng = random.Random(seed)
+    candidates = range(len(header) + 1, max(size - block_bytes, len(header) + 2))
+    offsets = sorted(rng.sample(candidates, min(max_blocks, max(sample_size, 1), len(candidates))))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        bodies = list(executor.map(lambda offset: read_range(offset, offset + block_bytes - 1), offsets))
+    parsed = [block for block in (_parse_block(header, body) for body in bodies) if block is not None]
+    blocks = [frame for frame, _ in parsed]
+    if not blocks:
+        raise ValueError(f"No sampled block of s3://{bucket_name}/{key} could be parsed as CSV.")
+    if len(blocks) < len(bodies):
+        logger.info(f"Skipped {len(bodies) - len(blocks)} of {len(bodies)} sampled blocks of s3://{bucket_name}/{key} (split quoted fields).")
+
+    # Re-estimate the row count from every sampled block, not only the head of the file
+    sampled_rows = sum(len(frame) for frame in blocks)
+    sampled_bytes = sum(nbytes for _, nbytes in parsed)
+    if sampled_rows:
+        population = int((size - len(header) - 1) / (sampled_bytes / sampled_rows))
+        sample_size = min(target_rows, population)
+    per_block = max(1, math.ceil(sample_size / len(blocks)))
+    picked = [frame.sample(min(per_block, len(frame)), random_state=rng.randrange(2 ** 32)) for frame in blocks]
+    frame = pd.concat(picked, ignore_index=True)
+    if len(frame) > sample_size:
+        frame = frame.sample(sample_size, random_state=seed)
+    # Blocks were parsed as text: parse the sampled rows once more so column types are inferred over all of them
+    frame = pd.read_csv(StringIO(frame.to_csv(index=False)))
+    return frame, population, False
+
+
+# Sampled CSV object whose column values are streamed through a sketch for Unique rules
+CsvObject = namedtuple('CsvObject', ['bucket_name', 'key'])
+
+
+def distinct_report(distinct, relative_error, population, confidence, method):
+    """Unique estimates from a distinct-count sketch over every row of the dataset."""
+    z = z_score(confidence)
+    low = distinct * (1 - z * relative_error)
+    high = distinct * (1 + z * relative_error)
+    return {
+        'Estimated Valid Rows': int(round(min(distinct, population))),
+        'Estimated Incidents': int(round(max(population - distinct, 0))),
+        'Incidents Interval': [int(max(population - min(high, population), 0)), int(max(population - low, 0))],
+        'Estimate Method': method
+    }
+
+
+class ApproximateChecker:
+    """
+    Answers rule suites with estimates and confidence intervals from a statistically sized
+    sample. CSV objects are sampled with a bounded number of ranged reads, so the run time
+    does not grow with the dataset size; other formats are sampled by Spark without collecting
+    the dataset. Duplicates can't be extrapolated from a sample, so Unique streams the column
+    through a HyperLogLog sketch (Spark's approx_count_distinct for non-CSV datasets) instead.
+    """
+
+    def __init__(self, checker):
+        self.checker = checker
+        self.dqs = checker.dqs
+        self.db = checker.db
+        # Many small blocks: a few rows from each, spread over the whole object
+        self.block_bytes = int(os.getenv('APPROX_BLOCK_BYTES', 8 * 1024))
+        self.max_blocks = int(os.getenv('APPROX_MAX_BLOCKS', 1024))
+        self.read_workers = int(os.getenv('APPROX_READ_WORKERS', 16))
+        self.full_read_bytes = int(os.getenv('APPROX_FULL_READ_BYTES', 8 * 1024 * 1024))
+        self.sketch_chunk_rows = int(os.getenv('APPROX_SKETCH_CHUNK_ROWS', 500000))
+
+    def load_sample(self, dataset, confidence, margin):
+        """
+        Return (sample, population, source). `source` is what Unique sketches run over: the
+        whole pandas frame when it was read anyway, the Spark DataFrame, or the CsvObject of a
+        sampled CSV.
+        """
+        selected_data = self.db.get_dataset_by_id(dataset['id'])
+        if not selected_data:
+            raise ValueError(f"No dataset found with ID: {dataset['id']}")
+        record = selected_data[0]
+        if (record.get('dataset_type') or '').lower() == 'csv':
+            source = self.db.get_datasource_by_id(record.get('datasource_id'))
+            target_rows = required_sample_size(None, confidence, margin)
+            sample, population, full = sample_csv_object(
+                self.dqs.s3_client, source[0]['name'], record.get('name'), target_rows,
+                self.block_bytes, self.max_blocks, self.full_read_bytes, max_workers=self.read_workers
+            )
+            return sample, population, sample if full else CsvObject(source[0]['name'], record.get('name'))
+        # Other formats can't be read by byte ranges: Spark samples the rows, only the sample is collected
+        sdf = self.dqs.load_spark_dataframe(selected_data)
+        if sdf is None:
+            raise ValueError(f"Dataset {dataset['id']} could not be read.")
+        population = sdf.count()
+        sample_size = required_sample_size(population, confidence, margin)
+        if sample_size >= population:
+            frame = sdf.toPandas()
+            return frame, len(frame), frame
+        # Bernoulli sampling with some slack so the limit, not the draw, sets the sample size
+        fraction = min(1.0, 1.1 * sample_size / population + 1e-6)
+        frame = sdf.sample(withReplacement=False, fraction=fraction).limit(sample_size).toPandas()
+        return frame, population, sdf
+
+    def estimate_unique(self, sample, source, column, population, confidence, exact=False):
+        if exact:
+            # The sample is the whole (small) dataset: count duplicates exactly
+            duplicates = int(sample[column].duplicated().sum())
+            return {
+                'Estimated Valid Rows': len(sample) - duplicates,
+                'Estimated Incidents': duplicates,
+                'Incidents Interval': [duplicates, duplicates],
+                'Estimate Method': 'exact'
+            }
+        if column not in sample.columns:
+            raise ValueError(f"Column '{column}' not found in the dataset.")
+        if isinstance(source, CsvObject):
+            # One streamed pass over the column with a fixed-size sketch; the pass also counts the rows
+            sketch, rows = HyperLogLog(), 0
+            body = self.dqs.s3_client.get_object(Bucket=source.bucket_name, Key=source.key)['Body']
+            for chunk in pd.read_csv(body, usecols=[column], chunksize=self.sketch_chunk_rows):
+                sketch.add_series(chunk[column])
+                rows += len(chunk)
+            return dict(distinct_report(sketch.count(), sketch.relative_error(), rows, confidence, 'hyperloglog'),
+                        **{'Population Estimate': rows})
+        if hasattr(source, 'iloc'):
+            sketch = HyperLogLog()
+            sketch.add_series(source[column])
+            return distinct_report(sketch.count(), sketch.relative_error(), population, confidence, 'hyperloglog')
+        # Spark DataFrame: HyperLogLog++ on the executors, nulls count as one more value like in pandas
+        from pyspark.sql import functions as F
+        relative_error = 0.01
+        counts = source.agg(
+            F.approx_count_distinct(F.col(f"`{column}`"), rsd=relative_error).alias('distinct'),
+            F.count(F.when(F.col(f"`{column}`").isNull(), 1)).alias('nulls')
+        ).collect()[0]
+        distinct = counts['distinct'] + (1 if counts['nulls'] else 0)
+        return distinct_report(distinct, relative_error, population, confidence, 'hyperloglog')
+
+    def run(self, dataset, rules, confidence=0.95, margin=0.01):
+        try:
+            frame, population, source = self.load_sample(dataset, confidence, margin)
+        except Exception as e:
+            logger.error(f"Error sampling dataset {dataset.get('id')}: {str(e)}")
+            reports = [{'Column': rule.column, 'Rule': rule.rule_name, 'Confidence': confidence,
+                        'Error': f"Dataset could not be sampled: {str(e)}"} for rule in rules]
+            return {'reports': reports, 'approximate': True}
+        exact = hasattr(source, 'iloc') and len(frame) == len(source)
+        reports = []
+        for rule in rules:
+            report = {'Column': rule.column, 'Rule': rule.rule_name, 'Sample Size': len(frame),
+                      'Population Estimate': population, 'Confidence': confidence}
+            try:
+                compiled = compile_rule(rule.rule_name, rule.column, rule.query)
+                if compiled.kernel is unique:
+                    report.update(self.estimate_unique(frame, source, rule.column, population, confidence, exact))
+                else:
+                    metrics = self.checker.check_rule(frame, rule.rule_name, rule.column, compiled.sql_script, compiled)
+                    if metrics is None:
+                        raise ValueError(f"Rule '{rule.rule_name}' could not be applied on column '{rule.column}'.")
+                    rate, low, high = proportion_interval(int(metrics['invalid_count']), len(frame), population, confidence)
+                    report.update({
+                        'Estimated Valid Rows': int(round(population * (1 - rate))),
+                        'Estimated Incidents': int(round(population * rate)),
+                        'Incidents Interval': [int(math.floor(population * low)), int(math.ceil(population * high))],
+                        'Invalid Rate': round(rate, 6),
+                        'Estimate Method': 'exact' if exact else 'sample'
+                    })
+            except Exception as e:
+                logger.error(f"Error estimating rule '{rule.rule_name}' on column '{rule.column}': {str(e)}")
+                report['Error'] = str(e)
+            reports.append(report)
+        return {'reports': reports, 'approximate': True}
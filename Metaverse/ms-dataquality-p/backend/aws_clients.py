@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+import threading
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AwsClientFactory:
+    """
+    Shared boto3 clients, one per (service, region, credentials), with a sized connection
+    pool, adaptive retries and TCP keep-alive. Clients are thread-safe and reused by every
+    service of the process; resources are not, so those are kept per thread.
+    Also memoizes bucket existence and region lookups and counts requests per client.
+    """
+
+    def __init__(self, max_pool_connections, max_attempts, connect_timeout, read_timeout, bucket_cache_seconds):
+        self.config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={'mode': 'adaptive', 'max_attempts': max_attempts},
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=True
+        )
+        self.bucket_cache_seconds = bucket_cache_seconds
+        self._sessions = {}
+        self._clients = {}
+        self._local = threading.local()
+        self._counters = {}
+        self._buckets = {}
+        self._regions = {}
+        self._lock = threading.Lock()
+
+    def _credentials(self, region, access_key, secret_key):
+        return (
+            region or os.getenv('AWS_REGION'),
+            access_key or os.getenv('ACCESS_KEY'),
+            secret_key or os.getenv('SECRET_KEY')
+        )
+
+    def _session(self, region, access_key, secret_key):
+        # Sessions are only used under the lock: creating clients from one is not thread-safe
+        key = (region, access_key, secret_key)
+        if key not in self._sessions:
+            self._sessions[key] = boto3.session.Session(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region
+            )
+        return self._sessions[key]
+
+    def _label(self, service, region, access_key):
+        # Never expose the access key itself in stats
+        return f"{service}:{region}:{(access_key or 'default')[-4:]}"
+
+    def _count(self, label, client):
+        counter = self._counters.setdefault(label, {'calls': 0, 'http_requests': 0, 'errors': 0, 'operations': {}})
+
+        def on_call(model, **kwargs):
+            with self._lock:
+                counter['calls'] += 1
+                counter['operations'][model.name] = counter['operations'].get(model.name, 0) + 1
+
+        def on_send(**kwargs):
+            # Retries are sent again: http_requests - calls is the retry overhead
+            with self._lock:
+                counter['http_requests'] += 1
+
+        def on_response(parsed=None, **kwargs):
+            if parsed and parsed.get('Error'):
+                with self._lock:
+                    counter['errors'] += 1
+
+        client.meta.events.register('before-call.*.*', on_call)
+        client.meta.events.register('before-send.*.*', on_send)
+        client.meta.events.register('after-call.*.*', on_response)
+
+    def client(self, service, region=None, access_key=None, secret_key=None):
+        region, access_key, secret_key = self._credentials(region, access_key, secret_key)
+        key = (service, region, access_key, secret_key)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._session(region, access_key, secret_key).client(service, config=self.config)
+                    self._count(self._label(service, region, access_key), client)
+                    self._clients[key] = client
+        return client
+
+    def resource(self, service, region=None, access_key=None, secret_key=None):
+        region, access_key, secret_key = self._credentials(region, access_key, secret_key)
+        key = (service, region, access_key, secret_key)
+        resources = self._local.__dict__.setdefault('resources', {})
+        if key not in resources:
+            with self._lock:
+                # A session per thread as well: resources keep a reference to theirs
+                session = boto3.session.Session(
+                    aws_access_key_id=access_key,
+                    aws_secret_access_key=secret_key,
+                    region_name=region
+                )
+                resource = session.resource(service, config=self.config)
+                self._count(self._label(service, region, access_key), resource.meta.client)
+            resources[key] = resource
+        return resources[key]
+
+    def _fresh(self, entry):
+        return entry is not None and time.monotonic() - entry[1] < self.bucket_cache_seconds
+
+    def bucket_exists(self, bucket_name, region=None):
+        """HEAD the bucket once per `bucket_cache_seconds`; only found buckets are memoized."""
+        with self._lock:
+            entry = self._buckets.get(bucket_name)
+        if self._fresh(entry):
+            return True
+        try:
+            self.client('s3', region).head_bucket(Bucket=bucket_name)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchBucket'):
+                return False
+            raise
+        self.remember_bucket(bucket_name)
+        return True
+
+    def remember_bucket(self, bucket_name):
+        with self._lock:
+            self._buckets[bucket_name] = (True, time.monotonic())
+
+    def ensure_bucket(self, bucket_name, region=None):
+        """Create the bucket when it does not exist (memoized, so a hot bucket costs no request)."""
+        if self.bucket_exists(bucket_name, region):
+            return False
+        region = region or os.getenv('AWS_REGION')
+        logger.info(f"Bucket '{bucket_name}' does not exist. Creating it now.")
+        create_bucket_params = {'Bucket': bucket_name}
+        if region != 'us-east-1':  # us-east-1 does not require location constraint
+            create_bucket_params['CreateBucketConfiguration'] = {'LocationConstraint': region}
+        try:
+            self.client('s3', region).create_bucket(**create_bucket_params)
+        except ClientError as e:
+            # Created concurrently by another request
+            if e.response['Error']['Code'] != 'BucketAlreadyOwnedByYou':
+                raise
+        self.remember_bucket(bucket_name)
+        return True
+
+    def bucket_region(self, bucket_name):
+        """Region of a bucket (memoized, regions never change)."""
+        with self._lock:
+            region = self._regions.get(bucket_name)
+        if region is None:
+            location = self.client('s3').get_bucket_location(Bucket=bucket_name).get('LocationConstraint')
+            # Buckets of us-east-1 report no location constraint
+            region = location or 'us-east-1'
+            with self._lock:
+                self._regions[bucket_name] = region
+        return region
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': {
+                    label: dict(counter, operations=dict(counter['operations']))
+                    for label, counter in self._counters.items()
+                },
+                'known_buckets': len(self._buckets),
+                'known_regions': len(self._regions)
+            }
+
+
+# Process-wide factory shared by every service
+aws_clients = AwsClientFactory(
+    max_pool_connections=int(os.getenv('AWS_MAX_POOL_CONNECTIONS', 50)),
+    max_attempts=int(os.getenv('AWS_MAX_ATTEMPTS', 5)),
+    connect_timeout=float(os.getenv('AWS_CONNECT_TIMEOUT', 5)),
+    read_timeout=float(os.getenv('AWS_READ_TIMEOUT', 60)),
+    bucket_cache_seconds=float(os.getenv('AWS_BUCKET_CACHE_SECONDS', 3600))
+)
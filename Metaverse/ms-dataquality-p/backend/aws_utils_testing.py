@@ -1,8 +1,7 @@
-import boto3
 import json
 import logging
-import os
 from dotenv import load_dotenv
+from backend.aws_clients import aws_clients
 
 env_file = '.env'
 load_dotenv(env_file, override=True)
@@ -13,10 +12,8 @@ logger = logging.getLogger(__name__)
 
 class AWSUtils:
     def __init__(self):
-        self.lambda_client = boto3.client('lambda',
-                                          region_name=os.getenv('AWS_REGION'),
-                                          aws_access_key_id=os.getenv('ACCESS_KEY'),
-                                          aws_secret_access_key=os.getenv('SECRET_KEY'))
+        # Cheap to build per call: the pooled client is shared
+        self.lambda_client = aws_clients.client('lambda')
 
 
     def invoke_lambda(self, function_name, payload):
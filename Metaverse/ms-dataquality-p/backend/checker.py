@@ -1,30 +1,39 @@
+import time
 import traceback
 from venv import logger
+import numpy as np
 import pandas as pd
-import boto3
 from io import StringIO
 import os
 from dotenv import load_dotenv
-import re
-import pandasql as ps
 from backend.database import Database
 from backend.dataquality import DataQualityService
+from backend.rule_compiler import clean_rule_sql, compile_rule, ROW_POSITION_COLUMN
+from backend.sql_engine import create_sql_engines
+from backend.result_store import invalid_record_store, records_to_json
+from backend.spark_rules import check_rule_spark
+from backend.aws_clients import aws_clients
 
 # Load environment variables from .env file
 load_dotenv()
 
 class DataQualityChecker:
     
-    def __init__(self):
-        self.db = Database()
-        self.dqs = DataQualityService()
-        # Initialize the S3 client with credentials from the .env file
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('ACCESS_KEY'),
-            aws_secret_access_key=os.getenv('SECRET_KEY'),
-            region_name=os.getenv('AWS_REGION')  # Optional
-        )
+    def __init__(self, connect=True, dqs=None):
+        # connect=False only sets up rule execution (no DynamoDB, Spark or S3), e.g. for benchmarks
+        if connect:
+            self.db = Database()
+            # Reuse the caller's DataQualityService (and its clients) when given one
+            self.dqs = dqs or DataQualityService()
+            # Pooled S3 client shared with the other services of the process
+            self.s3_client = aws_clients.client('s3')
+        # Generated SQL rules run on DuckDB by default, pandasql/SQLite is kept as a fallback
+        self.sql_engines = create_sql_engines()
+        # Full invalid record sets are kept server side, responses only inline a sample
+        self.invalid_records = invalid_record_store
+        self.invalid_sample_size = int(os.getenv('INVALID_RECORDS_SAMPLE_SIZE', 100))
+        # 'pandas' collects the dataset to the driver, 'spark' evaluates rules on the Spark DataFrame
+        self.execution_mode = os.getenv('CHECK_EXECUTION_MODE', 'pandas')
         
     def load_rules_from_s3(self, bucket_name, csv_file_key):
         """
@@ -40,92 +49,60 @@ class DataQualityChecker:
         Cleans the SQL script by removing '**' marks and anything after the first semicolon.
         The semicolon is preserved as part of the query.
         """
-        # Remove any '**' marks
-        script = re.sub(r'\*\*', '', script)
-        
-        # Attempt to find the first semicolon
-        match = re.search(r'.*?;', script)
-        
-        # Check if a match was found
-        if match:
-            # Keep only up to and including the first semicolon
-            script = match.group(0)
-        
-        # Strip any leading/trailing whitespace
-        return script.strip()
+        return clean_rule_sql(script)
 
 
 
-    def check_rule(self, df, rule_name, column, rule_sql):
+    def check_rule(self, df, rule_name, column, rule_sql, compiled=None, profile=None):
         """
         Apply a rule dynamically based on the rule name and SQL script.
+        Rule preparation (cleaning, kernel lookup, query rewriting) is cached by compile_rule.
+        With the column `profile` of the dataset, built-in families are counted from the profile.
         """
         try:
-            # Map rule names to check types (you can expand this)
-            if "Not Null" in rule_name:
-                invalid_count = df[column].isnull().sum()
-                valid_count = len(df) - invalid_count
-            elif "Unique" in rule_name:
-                invalid_count = df[column].duplicated().sum()
-                valid_count = len(df) - invalid_count
-            elif "Positive Integer" in rule_name:
-                invalid_count = df[df[column] <= 0].shape[0]
-                valid_count = len(df) - invalid_count
-            elif "Numeric" in rule_name:
-                invalid_count = df[~df[column].apply(lambda x: str(x).isdigit())].shape[0]
-                valid_count = len(df) - invalid_count
-            elif "Length" in rule_name:
-                length = int(re.findall(r'\d+', rule_name)[0])
-                invalid_count = df[df[column].astype(str).str.len() != length].shape[0]
-                valid_count = len(df) - invalid_count
-            elif "No Leading Zeros" in rule_name:
-                invalid_count = df[df[column].astype(str).str.startswith('0')].shape[0]
-                valid_count = len(df) - invalid_count
-            elif "Consistent Data Type" in rule_name:
-                invalid_count = df[df[column].apply(lambda x: isinstance(x, int) or isinstance(x, float))].shape[0]
-                valid_count = len(df) - invalid_count
-            elif "Regex" in rule_name:
-                pattern = rule_sql.strip()  # Assuming regex pattern is in SQL query
-                invalid_count = df[~df[column].astype(str).str.match(pattern)].shape[0]
+            if compiled is None:
+                compiled = compile_rule(rule_name, column, rule_sql)
+
+            # Built-in rule families run as vectorized kernels (see backend/rule_kernels.py)
+            if compiled.kernel is not None:
+                invalid_count = profile.invalid_count(column, rule_name, compiled.kernel) if profile is not None else None
+                if invalid_count == 0:
+                    # Nothing to locate: the rows are not read at all
+                    invalid_positions = np.empty(0, dtype=np.int64)
+                else:
+                    invalid_mask = compiled.kernel(df[column], rule_name, compiled.sql_script)
+                    if invalid_count is None:
+                        invalid_count = int(invalid_mask.sum())
+                    invalid_positions = np.flatnonzero(invalid_mask)
                 valid_count = len(df) - invalid_count
             else:
-                # Execute the rule as an SQL query on the DataFrame using pandasql
-                query = re.sub(r'\bFROM\s+\w+', 'FROM df', rule_sql, flags=re.IGNORECASE)
-                query = re.sub(r'\bCOUNT\b', 'COUNT(*)', query, flags=re.IGNORECASE)
-
-                # Apply TRIM(column_name) and LENGTH(column_name) format fixes using the `column` variable
-                query = re.sub(r'\bTRIM\b', f'TRIM({column})', query, flags=re.IGNORECASE)
-                query = re.sub(r'\bLENGTH\b', f'LENGTH({column})', query, flags=re.IGNORECASE)
-
-                query = re.sub(r'\bUPPER\b', f'UPPER({column})', query, flags=re.IGNORECASE)
-                query = re.sub(r'\bLOWER\b', f'LOWER({column})', query, flags=re.IGNORECASE)
-
-                query = re.sub(r'\bCHAR_LENGTH\b', f'CHAR_LENGTH({column})', query, flags=re.IGNORECASE)
-
-                if "IntegerOnly" in rule_name:
-                    query = re.sub(r'\bMOD\b', f'MOD({column}, 1)', query, flags=re.IGNORECASE)
-
-                #query = re.sub(r'\bCAST\b', f'CAST({column} AS INTEGER)', query, flags=re.IGNORECASE)
-
-                query = re.sub(r'\b!=\b', '<>', query, flags=re.IGNORECASE)
-
-                # Replace unsupported ~ operator
-                if '~' in query:
-                    raise ValueError("SQLite does not support the '~' operator. Use LIKE or apply Python regex manually on DataFrame.")
+                # Execute the rule as an SQL query on the DataFrame
+                query = compiled.query
 
                 print(f"Executing SQL query: {query}")
 
-                # Execute the modified query using pandasql
-                filtered_df = ps.sqldf(query, locals())
-                valid_count = filtered_df.shape[0]
-                invalid_count = len(df) - valid_count
-                invalid_records = df[~df.index.isin(filtered_df.index)]
+                if compiled.position_query is not None:
+                    # The engines return a fresh index: the valid rows are matched back to df by
+                    # the row position column the query selects
+                    positioned = df.assign(**{ROW_POSITION_COLUMN: np.arange(len(df), dtype=np.int64)})
+                    valid_positions = self.run_sql_rule(positioned, compiled.position_query)[ROW_POSITION_COLUMN].to_numpy()
+                    valid_mask = np.zeros(len(df), dtype=bool)
+                    valid_mask[valid_positions] = True
+                    invalid_positions = np.flatnonzero(~valid_mask)
+                    invalid_count = len(invalid_positions)
+                    valid_count = len(df) - invalid_count
+                else:
+                    # Aggregating queries only give counts, their rows can't be located in df
+                    filtered_df = self.run_sql_rule(df, query)
+                    valid_count = filtered_df.shape[0]
+                    invalid_count = len(df) - valid_count
+                    invalid_positions = np.empty(0, dtype=np.int64)
 
             print(f"Rule '{rule_name}' applied on column '{column}'. Valid: {valid_count}, Invalid: {invalid_count} \n")
             return {
                 'valid_count': valid_count,
                 'invalid_count': invalid_count,
-                'invalid_records': invalid_records  # Return the DataFrame of invalid records
+                'invalid_positions': invalid_positions  # Row positions of the invalid records in df
             }
         
         except Exception as e:
@@ -134,7 +111,31 @@ class DataQualityChecker:
         
         
 
+    def run_sql_rule(self, df, query):
+        """
+        Run a rewritten rule query against the DataFrame (exposed as table `df`),
+        trying each configured SQL engine in order until one succeeds.
+        """
+        last_error = None
+        for engine in self.sql_engines:
+            if '~' in query and not engine.supports_regex_operator:
+                last_error = ValueError(f"{engine.name} does not support the '~' operator. Use LIKE or a Regex rule instead.")
+                continue
+            try:
+                return engine.query(query, {'df': df})
+            except Exception as e:
+                logger.warning(f"SQL engine '{engine.name}' failed to run query: {str(e)}")
+                last_error = e
+        raise last_error
+
     def get_dataset_data(self, dataset):
+        entry = self.get_dataset_entry(dataset)
+        return entry['dataframe'] if entry else None
+
+    def get_dataset_entry(self, dataset):
+        """
+        Return the loaded dataset as {'dataframe': ..., 'profile': ...}, or None.
+        """
         selected_data = self.db.get_dataset_by_id(dataset["id"])
         if not selected_data:
             logger.warning(f"No dataset found with ID: {dataset}")
@@ -143,20 +144,23 @@ class DataQualityChecker:
         s3_datasets = self.dqs.extract_datasets_from_s3_only(selected_data)
         logger.info(f"display s3_datasets: {s3_datasets}")
         if s3_datasets:
-            dataset = s3_datasets[0]
-
-            return dataset['dataframe']
+            return s3_datasets[0]
         logger.warning("No S3 datasets found")
         return None
 
-    def perform_data_quality_checks(self, df, rule):
+    def perform_data_quality_checks(self, df, rule, sample_size=None, profile=None):
         """
         Perform data quality checks on the DataFrame using the rules.
+        Only a bounded sample of the invalid records is returned; the full set is kept
+        in the invalid record store under 'Result Id' for paging or streaming.
         """
+        if sample_size is None:
+            sample_size = self.invalid_sample_size
 
         column = rule.column
         rule_name = rule.rule_name
-        sql_script = self.clean_sql_script(rule.query)  # Clean the SQL query
+        compiled = compile_rule(rule_name, column, rule.query)
+        sql_script = compiled.sql_script  # Cleaned SQL query
         
         # Check if the column exists in the DataFrame
         if column not in df.columns:
@@ -168,7 +172,13 @@ class DataQualityChecker:
             print(f"Skipping rule '{rule_name}' for column '{column}' due to JOIN in query.")
 
         # Apply the rule and get metrics
-        metrics = self.check_rule(df, rule_name, column, sql_script)
+        metrics = self.check_rule(df, rule_name, column, sql_script, compiled, profile)
+        if metrics is None:
+            raise ValueError(f"Rule '{rule_name}' could not be applied on column '{column}'.")
+
+        # The store keeps row positions into df, not a copy of the invalid rows
+        invalid_positions = metrics['invalid_positions']
+        result_id = self.invalid_records.put(df, {'column': column, 'rule': rule_name}, invalid_positions)
 
         # Only append results if metrics are valid (not None)
         quality_results = {
@@ -176,7 +186,9 @@ class DataQualityChecker:
             'Rule': rule_name,
             'Valid Rows': metrics['valid_count'],
             'Incidents': metrics['invalid_count'],
-            'Invalid Records': metrics['invalid_records'].to_dict(orient="records")
+            'Invalid Records': records_to_json(df.iloc[invalid_positions[:sample_size]]),
+            'Invalid Records Truncated': len(invalid_positions) > sample_size,
+            'Result Id': result_id
         }
 
         return quality_results
@@ -184,16 +196,85 @@ class DataQualityChecker:
 
 
 
-    def generate_and_save_quality_report(self, dataset, rule):
+    def perform_spark_quality_checks(self, sdf, rule, sample_size=None):
+        """
+        Perform a data quality check directly on the Spark DataFrame.
+        Only the counts and a limited invalid-row sample are collected to the driver.
+        """
+        if sample_size is None:
+            sample_size = self.invalid_sample_size
+
+        column = rule.column
+        rule_name = rule.rule_name
+        compiled = compile_rule(rule_name, column, rule.query)
+
+        if column not in sdf.columns:
+            print(f"Column '{column}' not found in the dataset.")
+
+        metrics = check_rule_spark(sdf, rule_name, column, compiled, sample_size)
+        print(f"Rule '{rule_name}' applied on column '{column}' with Spark. Valid: {metrics['valid_count']}, Invalid: {metrics['invalid_count']} \n")
+
+        # The invalid rows stay a lazy Spark DataFrame, pages are computed on request
+        result_id = self.invalid_records.put(
+            metrics['invalid_rows'],
+            {'column': column, 'rule': rule_name, 'total': metrics['invalid_count']}
+        )
+
+        return {
+            'Column': column,
+            'Rule': rule_name,
+            'Valid Rows': metrics['valid_count'],
+            'Incidents': metrics['invalid_count'],
+            'Invalid Records': records_to_json(metrics['invalid_records']),
+            'Invalid Records Truncated': metrics['invalid_count'] > sample_size,
+            'Result Id': result_id
+        }
+
+    def load_dataset_frame(self, dataset):
+        """
+        Load the dataset once and return it as a pandas DataFrame.
+        """
+        return self.load_dataset(dataset)[0]
+
+    def load_dataset(self, dataset):
+        """
+        Load the dataset once and return (DataFrame, column profile).
+        The profile is None when the dataset could not be profiled.
+        """
+        entry = self.get_dataset_entry(dataset)
+        if entry is None:
+            return None, None
+        df, profile = entry['dataframe'], entry.get('profile')
+
+        # Ensure df is a DataFrame, convert if needed
+        if isinstance(df, list):
+            df = pd.DataFrame(df)
+            profile = None
+        return df, profile
+
+    def load_spark_frame(self, dataset):
+        """
+        Load the dataset as a Spark DataFrame, without collecting it to the driver.
+        """
+        selected_data = self.db.get_dataset_by_id(dataset["id"])
+        if not selected_data:
+            logger.warning(f"No dataset found with ID: {dataset}")
+            return None
+        return self.dqs.load_spark_dataframe(selected_data)
+
+    def is_spark_mode(self, execution_mode=None):
+        return (execution_mode or self.execution_mode) == 'spark'
+
+    def generate_and_save_quality_report(self, dataset, rule, sample_size=None, execution_mode=None):
         try:
-            df = self.get_dataset_data(dataset)
+            if self.is_spark_mode(execution_mode):
+                sdf = self.load_spark_frame(dataset)
+                return self.perform_spark_quality_checks(sdf, rule, sample_size)
 
-            # Ensure df is a DataFrame, convert if needed
-            if isinstance(df, list):
-                df = pd.DataFrame(df)
+            df, profile = self.load_dataset(dataset)
 
             # Perform data quality checks
-            quality_report = self.perform_data_quality_checks(df, rule)
+            quality_report = self.perform_data_quality_checks(df, rule, sample_size, profile)
 
             return quality_report
         except Exception as e:
@@ -201,4 +282,57 @@ class DataQualityChecker:
             traceback.print_exc()
             return {}
 
+    def generate_quality_reports(self, dataset, rules, sample_size=None, execution_mode=None):
+        """
+        Evaluate a whole rule suite against a single load of the dataset.
+        Returns one report per rule (in the order given) plus the total timing.
+        """
+        spark_mode = self.is_spark_mode(execution_mode)
+
+        start = time.perf_counter()
+        profile = None
+        try:
+            if spark_mode:
+                # Cached on the executors so the suite reads the S3 object only once
+                df = self.load_spark_frame(dataset)
+                df = df.cache() if df is not None else None
+            else:
+                df, profile = self.load_dataset(dataset)
+        except Exception as e:
+            logger.error(f"Error loading dataset for quality checks: {str(e)}")
+            traceback.print_exc()
+            df = None
+        load_seconds = time.perf_counter() - start
+
+        reports = []
+        try:
+            for rule in rules:
+                rule_start = time.perf_counter()
+                try:
+                    if df is None:
+                        raise ValueError("Dataset could not be loaded.")
+                    if spark_mode:
+                        report = self.perform_spark_quality_checks(df, rule, sample_size)
+                    else:
+                        report = self.perform_data_quality_checks(df, rule, sample_size, profile)
+                except Exception as e:
+                    logger.error(f"Error applying rule '{rule.rule_name}' on column '{rule.column}': {str(e)}")
+                    report = {'Column': rule.column, 'Rule': rule.rule_name, 'Error': str(e)}
+                report['Duration Seconds'] = round(time.perf_counter() - rule_start, 6)
+                reports.append(report)
+        finally:
+            if spark_mode and df is not None:
+                df.unpersist()
+
+        total_seconds = time.perf_counter() - start
+        return {
+            'reports': reports,
+            'timing': {
+                'rules': len(rules),
+                'load_seconds': round(load_seconds, 6),
+                'check_seconds': round(total_seconds - load_seconds, 6),
+                'total_seconds': round(total_seconds, 6)
+            }
+        }
+
 
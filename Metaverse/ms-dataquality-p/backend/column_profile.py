@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+from dotenv import load_dotenv
+from backend.rule_kernels import (
+    not_null, unique, positive_integer, numeric, length, no_leading_zeros, consistent_data_type, value_lengths,
+    _non_str_mask
+)
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Families whose failing-row count is fully determined by a stored count of the profile
+_COUNTED_FAMILIES = {
+    positive_integer: 'non_positive',
+    numeric: 'not_numeric',
+    no_leading_zeros: 'leading_zero',
+    consistent_data_type: 'numeric_typed',
+}
+
+
+def _type_mix(series, non_null, non_str):
+    """Count the non-null values per value type without visiting string values one by one."""
+    if not ptypes.is_object_dtype(series.dtype):
+        return {str(series.dtype): non_null} if non_null else {}
+    mix = {'str': non_null - int(non_str.sum())} if non_null > non_str.sum() else {}
+    if non_str.any():
+        for type_name, count in series[non_str].map(lambda value: type(value).__name__).value_counts().items():
+            mix[type_name] = int(count)
+    return mix
+
+
+def _value_statistics(series):
+    """
+    Null count, distinct count, length histogram and family counts over every row.
+    Used for numeric columns (cheap) and object columns mixing strings with other types.
+    The distinct count is exact, not a sketch estimate: Unique incidents are answered from it.
+    """
+    try:
+        # Same equality as duplicated(): NaN/None count as one value
+        distinct = int(series.nunique(dropna=False))
+    except TypeError:
+        # Unhashable values (lists, dicts): Unique falls back to the kernel
+        distinct = None
+    if ptypes.is_float_dtype(series.dtype):
+        # Rendering every float as text costs more than the Length rule it would answer
+        histogram = None
+    else:
+        lengths = pd.Series(value_lengths(series)).value_counts(dropna=True)
+        histogram = {int(value): int(count) for value, count in lengths.items()}
+    return {
+        'null_count': int(not_null(series, '', '').sum()),
+        'distinct_count': distinct,
+        'length_histogram': histogram,
+        'counts': {name: int(kernel(series, '', '').sum()) for kernel, name in _COUNTED_FAMILIES.items()},
+    }
+
+
+def _text_statistics(series):
+    """
+    Same statistics for a text column in a single factorization: every family is evaluated
+    once per distinct value and weighted by how many rows hold it.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    null_count = int((codes < 0).sum())
+    occurrences = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    values = pd.Series(uniques, dtype=series.dtype)
+    if null_count:
+        # Families still have to be evaluated once on a missing value
+        values = pd.concat([values, series[series.isna()].iloc[:1]], ignore_index=True)
+        occurrences = np.append(occurrences, null_count)
+
+    lengths = value_lengths(values)
+    known = ~np.isnan(lengths)
+    histogram = pd.Series(occurrences[known]).groupby(lengths[known].astype(np.int64)).sum()
+    return {
+        'null_count': null_count,
+        # duplicated() tells None and NaN apart, factorize does not
+        'distinct_count': len(uniques) + (len(series[series.isna()].drop_duplicates()) if null_count else 0),
+        'length_histogram': {int(value): int(count) for value, count in histogram.items()},
+        'counts': {
+            name: int(occurrences[kernel(values, '', '')].sum()) for kernel, name in _COUNTED_FAMILIES.items()
+        },
+    }
+
+
+def profile_column(series):
+    """
+    Profile one column: null count, distinct count, min/max, value-length histogram,
+    value type mix and the failing-row counts of the built-in families that only depend
+    on the values themselves.
+    """
+    non_null = int(series.notna().sum())
+    text = ptypes.is_object_dtype(series.dtype) or ptypes.is_string_dtype(series.dtype)
+    non_str = _non_str_mask(series) if ptypes.is_object_dtype(series.dtype) else np.zeros(len(series), dtype=bool)
+    # Factorizing merges 1, 1.0 and True, so only all-string columns take the distinct-value path
+    statistics = _text_statistics(series) if text and not non_str.any() else _value_statistics(series)
+
+    profile = {
+        'dtype': str(series.dtype),
+        'rows': len(series),
+        'type_mix': _type_mix(series, non_null, non_str),
+        'min': None,
+        'max': None,
+    }
+    profile.update(statistics)
+    if ptypes.is_numeric_dtype(series.dtype) and not ptypes.is_bool_dtype(series.dtype) and non_null:
+        low, high = series.min(), series.max()
+        # numpy scalars -> plain python numbers so the profile serializes as JSON
+        profile['min'] = low.item() if hasattr(low, 'item') else low
+        profile['max'] = high.item() if hasattr(high, 'item') else high
+    return profile
+
+
+class DatasetProfile:
+    """
+    Column profiles of one dataset version, computed once when the frame is loaded.
+    Answers the failing-row count of the built-in rule families without reading rows again.
+    """
+
+    def __init__(self, frame):
+        self.rows = len(frame)
+        self.columns = {}
+        for column in frame.columns:
+            try:
+                self.columns[column] = profile_column(frame[column])
+            except Exception as e:
+                logger.warning(f"Could not profile column '{column}': {str(e)}")
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a profile saved with to_dict (JSON turns the histogram lengths into strings)."""
+        profile = cls.__new__(cls)
+        profile.rows = data['rows']
+        profile.columns = {}
+        for column, column_profile in data['columns'].items():
+            histogram = column_profile['length_histogram']
+            if histogram is not None:
+                histogram = {int(value): count for value, count in histogram.items()}
+            profile.columns[column] = dict(column_profile, length_histogram=histogram)
+        return profile
+
+    def invalid_count(self, column, rule_name, kernel):
+        """Return the number of rows failing the rule, or None when the profile can't tell."""
+        profile = self.columns.get(column)
+        if profile is None or kernel is None:
+            return None
+        if kernel is not_null:
+            return profile['null_count']
+        if kernel is unique:
+            distinct = profile['distinct_count']
+            return None if distinct is None else profile['rows'] - distinct
+        if kernel is length:
+            if profile['length_histogram'] is None:
+                return None
+            expected = int(re.findall(r'\d+', rule_name)[0])
+            return profile['rows'] - profile['length_histogram'].get(expected, 0)
+        if kernel in _COUNTED_FAMILIES:
+            return profile['counts'][_COUNTED_FAMILIES[kernel]]
+        # Regex rules depend on the user pattern, they always scan the column
+        return None
+
+    def to_dict(self):
+        return {'rows': self.rows, 'columns': self.columns}
+
+
+class ProfileStore:
+    """
+    Store of dataset profiles keyed by (dataset_id, version), the same key as the frame cache,
+    so a changed S3 object always gets a fresh profile. The profile of the latest version of
+    each dataset is kept on disk (one JSON file per dataset, named by a hash of its id), so it
+    survives restarts and frame cache evictions; the most recently used ones are also kept in
+    memory (LRU of `max_entries`).
+    """
+
+    # Bumped when the profile statistics change, so older files are profiled again
+    FORMAT = 1
+
+    def __init__(self, max_entries, store_dir):
+        self.max_entries = max_entries
+        self.store_dir = store_dir
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.store_dir, f"{hashlib.sha256(str(dataset_id).encode('utf-8')).hexdigest()}.json")
+
+    def _load(self, dataset_id, version):
+        try:
+            with open(self._path(dataset_id), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # JSON turns the (ETag, LastModified) tuple into a list
+        if entry.get('format') != self.FORMAT or entry.get('version') != json.loads(json.dumps(version)):
+            return None
+        return DatasetProfile.from_dict(entry['profile'])
+
+    def _remember(self, dataset_id, version, profile):
+        with self._lock:
+            for key in [k for k in self._profiles if k[0] == dataset_id]:
+                del self._profiles[key]
+            self._profiles[(dataset_id, version)] = profile
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, dataset_id, version):
+        key = (dataset_id, version)
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                self.hits += 1
+                return profile
+        profile = self._load(dataset_id, version)
+        with self._lock:
+            if profile is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(dataset_id, version, profile)
+        return profile
+
+    def put(self, dataset_id, version, profile):
+        self._remember(dataset_id, version, profile)
+        entry = {'format': self.FORMAT, 'version': version, 'profile': profile.to_dict()}
+        tmp_path = f"{self._path(dataset_id)}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                # numpy/Decimal min-max values that slipped through are stored as text
+                json.dump(entry, f, default=str)
+            os.replace(tmp_path, self._path(dataset_id))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not save the profile of dataset {dataset_id}: {str(e)}")
+
+    def get_or_build(self, dataset_id, version, frame):
+        """Return the stored profile of this version, profiling the frame if there is none."""
+        if not isinstance(frame, pd.DataFrame):
+            return None
+        profile = self.get(dataset_id, version) if version else None
+        if profile is None:
+            try:
+                profile = DatasetProfile(frame)
+            except Exception as e:
+                logger.warning(f"Could not profile dataset {dataset_id}: {str(e)}")
+                return None
+            if version:
+                self.put(dataset_id, version, profile)
+        return profile
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._profiles),
+                'store_dir': self.store_dir,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Process-wide store shared by every DataQualityService / DataQualityChecker instance
+column_profile_store = ProfileStore(
+    max_entries=int(os.getenv('COLUMN_PROFILE_MAX_DATASETS', 64)),
+    store_dir=os.getenv('COLUMN_PROFILE_DIR', os.path.join('.dq_state', 'profiles'))
+)
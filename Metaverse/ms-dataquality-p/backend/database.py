@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 import os
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key, Attr
+from backend.aws_clients import aws_clients
 from botocore.exceptions import ClientError
 
 # Load environment variables
@@ -36,19 +37,8 @@ class Database:
             aws_region = os.getenv('AWS_REGION', 'us-east-1')
             self.cipher = Fernet(encryption_key)
 
-            self.dynamodb = boto3.resource(
-                'dynamodb',
-                region_name=aws_region,
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key
-            )
-
-            self.dynamodb_client = boto3.client(
-                'dynamodb',
-                region_name=aws_region,
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key
-            )
+            self._aws_credentials = (aws_region, aws_access_key, aws_secret_key)
+            self.dynamodb_client = aws_clients.client('dynamodb', *self._aws_credentials)
             
             # Create tables if they don't exist
             self.create_tables()
@@ -56,6 +46,11 @@ class Database:
             # Mark the instance as initialized to prevent re-initialization
             self._initialized = True
 
+    @property
+    def dynamodb(self):
+        # boto3 resources are not thread-safe: each thread gets its own
+        return aws_clients.resource('dynamodb', *self._aws_credentials)
+
     def list_existing_tables(self):
         """Helper function to list existing DynamoDB tables."""
         try:
@@ -65,11 +60,33 @@ class Database:
             return []
 
     def create_tables(self):
-        self.users_table = self.create_users_table()
-        self.workspaces_table = self.create_workspaces_table()
-        self.dataconnects_table = self.create_dataconnects_table()
-        self.datasources_table = self.create_datasources_table()
-        self.datasets_table = self.create_datasets_table()
+        self.create_users_table()
+        self.create_workspaces_table()
+        self.create_dataconnects_table()
+        self.create_datasources_table()
+        self.create_datasets_table()
+
+    # Table objects belong to the (per-thread) resource that built them: they are resolved on
+    # each call from the calling thread's resource instead of being kept on the singleton
+    @property
+    def users_table(self):
+        return self.dynamodb.Table('users')
+
+    @property
+    def workspaces_table(self):
+        return self.dynamodb.Table('workspaces')
+
+    @property
+    def dataconnects_table(self):
+        return self.dynamodb.Table('dataconnects')
+
+    @property
+    def datasources_table(self):
+        return self.dynamodb.Table('datasources')
+
+    @property
+    def datasets_table(self):
+        return self.dynamodb.Table('datasets')
 
     def encrypt(self, data):
         return self.cipher.encrypt(data.encode()).decode()
@@ -330,6 +347,214 @@ class Database:
 
 
 
+    def create_rule_generation_cache_table(self):
+        """
+        Table of the optional DynamoDB backend of the rule generation cache. Only created when
+        that backend is used; expired items are removed by DynamoDB TTL on `expires_at`.
+        """
+        try:
+            existing_tables = self.list_existing_tables()
+            if 'rule_generation_cache' in existing_tables:
+                print("Rule generation cache table already exists.")
+                return self.dynamodb.Table('rule_generation_cache')
+
+            table = self.dynamodb.create_table(
+                TableName='rule_generation_cache',
+                KeySchema=[
+                    {'AttributeName': 'signature', 'KeyType': 'HASH'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'signature', 'AttributeType': 'S'}
+                ],
+                ProvisionedThroughput={
+                    'ReadCapacityUnits': 5,
+                    'WriteCapacityUnits': 5
+                }
+            )
+            table.wait_until_exists()
+            self.dynamodb_client.update_time_to_live(
+                TableName='rule_generation_cache',
+                TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+            )
+            print("Rule generation cache table created successfully")
+            return table
+
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceInUseException':
+                print("Rule generation cache table already exists.")
+                return self.dynamodb.Table('rule_generation_cache')
+            else:
+                print(f"Unexpected error: {e}")
+
+    def get_rule_generation_cache_table(self):
+        # Created once, then resolved per call like the other tables
+        if not getattr(self, '_rule_generation_cache_table_ready', False):
+            self._rule_generation_cache_table_ready = self.create_rule_generation_cache_table() is not None
+        return self.dynamodb.Table('rule_generation_cache')
+
+    def get_cached_rules(self, signature):
+        try:
+            response = self.get_rule_generation_cache_table().get_item(Key={'signature': signature})
+            return response.get('Item')
+        except ClientError as e:
+            print(f"An error occurred: {e}")
+            return None
+
+    def put_cached_rules(self, item):
+        try:
+            self.get_rule_generation_cache_table().put_item(Item=item)
+        except ClientError as e:
+            print(f"An error occurred: {e}")
+
+    def delete_cached_rules(self, column=None, dtype=None):
+        """Delete the cached rules of an exact column name and/or normalized dtype (all entries by default)."""
+        try:
+            table = self.get_rule_generation_cache_table()
+            scan_kwargs = {'ProjectionExpression': '#signature', 'ExpressionAttributeNames': {'#signature': 'signature'}}
+            conditions = []
+            if column is not None:
+                conditions.append(Attr('column').eq(column))
+            if dtype is not None:
+                conditions.append(Attr('dtype').eq(dtype))
+            if conditions:
+                condition = conditions[0]
+                for extra in conditions[1:]:
+                    condition = condition & extra
+                scan_kwargs['FilterExpression'] = condition
+            deleted = 0
+            while True:
+                response = table.scan(**scan_kwargs)
+                with table.batch_writer() as batch:
+                    for item in response.get('Items', []):
+                        batch.delete_item(Key={'signature': item['signature']})
+                        deleted += 1
+                if 'LastEvaluatedKey' not in response:
+                    return deleted
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except ClientError as e:
+            print(f"An error occurred: {e}")
+            return 0
+
+    def create_rule_sets_table(self):
+        """
+        Generated rule sets, keyed by dataset id and version ('v' + zero-padded sequence).
+        The 'latest' item of a dataset holds a copy of its newest rule set, so the latest
+        rules are read with a single GetItem. Created on first use.
+        """
+        try:
+            existing_tables = self.list_existing_tables()
+            if 'rule_sets' in existing_tables:
+                print("Rule sets table already exists.")
+                return self.dynamodb.Table('rule_sets')
+
+            table = self.dynamodb.create_table(
+                TableName='rule_sets',
+                KeySchema=[
+                    {'AttributeName': 'dataset_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'version', 'KeyType': 'RANGE'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'dataset_id', 'AttributeType': 'S'},
+                    {'AttributeName': 'version', 'AttributeType': 'S'}
+                ],
+                ProvisionedThroughput={
+                    'ReadCapacityUnits': 5,
+                    'WriteCapacityUnits': 5
+                }
+            )
+            table.wait_until_exists()
+            print("Rule sets table created successfully")
+            return table
+
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceInUseException':
+                print("Rule sets table already exists.")
+                return self.dynamodb.Table('rule_sets')
+            else:
+                print(f"Unexpected error: {e}")
+
+    def get_rule_sets_table(self):
+        # Created once, then resolved per call like the other tables
+        if not getattr(self, '_rule_sets_table_ready', False):
+            self._rule_sets_table_ready = self.create_rule_sets_table() is not None
+        return self.dynamodb.Table('rule_sets')
+
+    def get_rule_set(self, dataset_id, version='latest'):
+        try:
+            response = self.get_rule_sets_table().get_item(Key={'dataset_id': dataset_id, 'version': version})
+            return response.get('Item')
+        except ClientError as e:
+            print(f"An error occurred: {e}")
+            return None
+
+    def list_rule_set_versions(self, dataset_id):
+        """Versions of a dataset's rule sets, oldest first, without their rules."""
+        try:
+            query_kwargs = {
+                'KeyConditionExpression': Key('dataset_id').eq(dataset_id) & Key('version').begins_with('v'),
+                'ProjectionExpression': '#version, #sequence, rules_hash, created_at, source_etag',
+                'ExpressionAttributeNames': {'#version': 'version', '#sequence': 'sequence'}
+            }
+            items = []
+            while True:
+                response = self.get_rule_sets_table().query(**query_kwargs)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    return items
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except ClientError as e:
+            print(f"An error occurred: {e}")
+            return []
+
+    def put_rule_set(self, item, previous_sequence):
+        """
+        Write a new rule set version and move the 'latest' item to it in one transaction.
+        The move is conditional on 'latest' still being at `previous_sequence`, so concurrent
+        saves can't go backwards. Returns False when another save won.
+        """
+        table = self.get_rule_sets_table()
+        if previous_sequence is None:
+            latest_condition = {'ConditionExpression': 'attribute_not_exists(dataset_id)'}
+        else:
+            latest_condition = {
+                'ConditionExpression': '#sequence = :previous',
+                'ExpressionAttributeNames': {'#sequence': 'sequence'},
+                'ExpressionAttributeValues': {':previous': previous_sequence}
+            }
+        try:
+            # The resource's client takes python values, like Table.put_item
+            table.meta.client.transact_write_items(TransactItems=[
+                {'Put': {'TableName': table.name, 'Item': item,
+                         'ConditionExpression': 'attribute_not_exists(dataset_id)'}},
+                {'Put': dict(latest_condition, TableName=table.name,
+                             Item=dict(item, version='latest', current_version=item['version']))}
+            ])
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            if 'ConditionalCheckFailed' not in reasons:
+                raise
+            if reasons[0] == 'ConditionalCheckFailed' and reasons[1] != 'ConditionalCheckFailed':
+                # The version exists but 'latest' lags behind it (written before saves were transactional)
+                self.repair_latest_rule_set(item['dataset_id'], item['version'], latest_condition)
+            return False
+
+    def repair_latest_rule_set(self, dataset_id, version, latest_condition):
+        """Point a lagging 'latest' item at an existing version."""
+        stored = self.get_rule_set(dataset_id, version)
+        if stored is None:
+            return
+        try:
+            self.get_rule_sets_table().put_item(
+                Item=dict(stored, version='latest', current_version=version), **latest_condition
+            )
+            print(f"Moved the latest rule set of dataset {dataset_id} to {version}")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
     def hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
 
@@ -1,15 +1,22 @@
-from datetime import datetime
-from io import StringIO
 import traceback
-from aiohttp import ClientError
-import boto3
-from .spark_session import create_spark_session
+from .spark_session import spark_manager
 from .dataconnect import DataconnectBackend
 import pandas as pd
-from .api_mistral import generate_quality_rules_with_sql
+from .api_mistral import generate_quality_rules_for_columns
 import os
 import re
 from backend.database import Database
+from backend.frame_cache import dataset_frame_cache
+from backend.column_profile import column_profile_store
+from backend.rule_generation_cache import create_rule_generation_cache
+from backend.schema_registry import schema_registry, schema_to_ddl
+from backend.result_store import records_to_json
+from backend.response_formats import to_arrow_table
+from backend.parquet_cache import create_parquet_cache
+from backend.excel_reader import create_excel_reader
+from backend.object_cache import create_object_cache
+from backend.aws_clients import aws_clients
+from backend.rule_set_store import create_rule_set_store
 import logging
 from dotenv import load_dotenv
 
@@ -22,16 +29,34 @@ logger = logging.getLogger(__name__)
 class DataQualityService:
     def __init__(self, ):
         self.dataconnect = DataconnectBackend()
-        self.spark = create_spark_session()
+        # The shared SparkSession is only started by the first read that needs it
+        self.spark_manager = spark_manager
         self.api_key = os.getenv('MISTRAL_API_KEY')
         self.db = Database()
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('ACCESS_KEY'),
-            aws_secret_access_key=os.getenv('SECRET_KEY'),
-            region_name=os.getenv('AWS_REGION')
-        )
+        # Pooled client shared with the other services of the process
+        self.s3_client = aws_clients.client('s3')
         self.region = os.getenv('AWS_REGION')
+        self.frame_cache = dataset_frame_cache
+        # Column profiles are built once per dataset version, when the frame is loaded
+        self.profile_store = column_profile_store
+        # Generated rules are reused across datasets sharing column names and types
+        self.rule_cache = create_rule_generation_cache(self.db)
+        # CSV schemas are inferred once from a sample instead of an inferSchema pass per read
+        self.schema_registry = schema_registry
+        # Raw CSV/Excel files are converted to Parquet once per S3 version and read from the copy afterwards
+        self.parquet_cache = create_parquet_cache(self.s3_client)
+        # Excel workbooks are streamed to Parquet in python instead of the spark-excel JVM package
+        self.excel_reader = create_excel_reader(self.s3_client)
+        # Raw objects are kept on local disk per ETag, so hot datasets are not downloaded again
+        self.object_cache = create_object_cache(self.s3_client)
+        # Generated rules are versioned per dataset instead of written as timestamped CSVs
+        self.rule_set_store = create_rule_set_store(self.db)
+        self.preview_default_rows = int(os.getenv('PREVIEW_DEFAULT_ROWS', 100))
+        self.preview_max_rows = int(os.getenv('PREVIEW_MAX_ROWS', 1000))
+
+    @property
+    def spark(self):
+        return self.spark_manager.get()
 
     def get_dataconnect_datasets(self, user_id, workspace_id):
         datasets = self.dataconnect.get_all_datasets(user_id, workspace_id)
@@ -45,24 +70,107 @@ class DataQualityService:
         script = re.sub(r'\([^)]*\)', '', script)
         return script
     
-    def ensure_bucket_exists(self, bucket_name):
+    def local_object(self, s3_path, etag):
+        """Path of the local copy of an S3 object version (downloaded on first use), or None."""
+        if self.object_cache is None or not etag:
+            return None
+        bucket_name, _, key = s3_path.split('://', 1)[1].partition('/')
+        return self.object_cache.fetch(bucket_name, key, etag)
+
+    def read_dataframe(self, s3_path, file_type, schema=None, sheets=None, etag=None):
+        """
+        Read a dataset from S3 as a (lazy) Spark DataFrame according to its file type.
+        With a registered `schema` CSV files are read in a single pass, without inferSchema, in
+        FAILFAST mode: a value that does not fit the schema fails the read instead of becoming NULL.
+        For Excel, `sheets` selects the sheets to read (first sheet by default, '*' for all).
+        When the object `etag` is known, the object is read from the local object cache.
+        """
+        local_path = self.local_object(s3_path, etag)
+        source_path = f"file://{local_path}" if local_path else s3_path
+        if file_type.lower() == 'csv':
+            if schema:
+                return self.spark.read.csv(source_path, header=True, schema=schema_to_ddl(schema), mode='FAILFAST')
+            return self.spark.read.csv(source_path, header=True, inferSchema=True)
+        elif file_type.lower() == 'excel':
+            bucket_name, _, key = s3_path.split('://', 1)[1].partition('/')
+            parquet_dir = self.excel_reader.to_parquet(bucket_name, key, sheets, local_path, etag)
+            # Sheets may not share all their columns: missing ones are read as nulls
+            return self.spark.read.option("mergeSchema", "true").parquet(f"file://{parquet_dir}")
+        elif file_type.lower() == 'sql':
+            return self.spark.read.text(source_path).withColumnRenamed("value", "sql_content")
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    def resolve_schema(self, dataset_id, bucket_name, file_name, file_type, version=None):
+        """
+        Registered schema of the current version of a dataset (inferred from a sample on first use),
+        or None to let Spark infer it.
+        """
+        if version is None:
+            version = self.get_object_version(bucket_name, file_name)
+        etag = version[0] if version else None
+        return self.schema_registry.resolve(self.s3_client, dataset_id, bucket_name, file_name, file_type, etag)
+
+    def read_checked(self, dataset_id, s3_path, file_type, schema, etag, sheets=None, consume=None):
+        """
+        Read a dataset with its registered `schema` and return (df, consume(df)). The schema of a
+        new version comes from a sample, so the first read has to parse every row: `consume` (a
+        full pass returning None on failure, e.g. materialize) or a no-op write. When a later value
+        does not fit (e.g. 'N/A' in a column sampled as bigint), the dataset is read again with
+        inferSchema and the inferred schema replaces the sampled one.
+        """
+        df = self.read_dataframe(s3_path, file_type, schema, sheets, etag)
+        if not schema or self.schema_registry.is_validated(dataset_id, etag):
+            return df, consume(df) if consume else None
         try:
-            # Check if bucket exists
-            self.s3_client.head_bucket(Bucket=bucket_name)
-            print(f"Bucket '{bucket_name}' already exists.")
-        except ClientError as e:
-            error_code = e.response['Error']['Code']
-            if error_code == '404':
-                print(f"Bucket '{bucket_name}' does not exist. Creating it now.")
-                # Create bucket with specified region if necessary
-                create_bucket_params = {'Bucket': bucket_name}
-                if self.region != 'us-east-1':  # us-east-1 does not require location constraint
-                    create_bucket_params['CreateBucketConfiguration'] = {
-                        'LocationConstraint': self.region
-                    }
-                self.s3_client.create_bucket(**create_bucket_params)
+            if consume:
+                result = consume(df)
             else:
-                raise e  # Re-raise other errors
+                # count() would not parse the fields: the no-op sink reads every column of every row
+                df.write.format('noop').mode('overwrite').save()
+                result = True
+        except Exception as e:
+            logger.warning(f"Reading {s3_path} with its sampled schema failed: {str(e)}")
+            result = None
+        if result is not None:
+            self.schema_registry.mark_validated(dataset_id, etag)
+            return df, result if consume else None
+        logger.warning(f"Sampled schema of {s3_path} does not fit every row, reading it with inferSchema")
+        df = self.read_dataframe(s3_path, file_type, None, sheets, etag)
+        self.schema_registry.mark_validated(
+            dataset_id, etag, [(field.name, field.dataType.simpleString()) for field in df.schema.fields]
+        )
+        return df, consume(df) if consume else None
+
+    def open_dataset(self, dataset_id, bucket_name, file_name, file_type, version=None, sheets=None):
+        """
+        Return the lazy Spark DataFrame of a dataset. The Parquet copy of the current S3
+        version is used when there is one (column pruning and predicate pushdown apply);
+        otherwise the raw file is read and materialized as Parquet for the next reads.
+        """
+        s3_path = f"s3a://{bucket_name}/{file_name}"
+        if version is None:
+            version = self.get_object_version(bucket_name, file_name)
+        etag = version[0] if version else None
+        # The cached copy holds the default sheet only: other sheet selections are read directly
+        if self.parquet_cache is None or (file_type or '').lower() not in ('csv', 'excel') or sheets:
+            schema = self.resolve_schema(dataset_id, bucket_name, file_name, file_type, version)
+            return self.read_checked(dataset_id, s3_path, file_type, schema, etag, sheets)[0]
+
+        cached_path = self.parquet_cache.lookup(dataset_id, etag)
+        if cached_path:
+            logger.info(f"Reading dataset {dataset_id} from its Parquet copy")
+            return self.spark.read.parquet(self.parquet_cache.spark_path(cached_path))
+
+        schema = self.resolve_schema(dataset_id, bucket_name, file_name, file_type, version)
+        # Materializing parses every row, so it also validates a sampled schema
+        df, materialized_path = self.read_checked(
+            dataset_id, s3_path, file_type, schema, etag,
+            consume=lambda frame: self.parquet_cache.materialize(frame, dataset_id, etag)
+        )
+        if materialized_path:
+            return self.spark.read.parquet(self.parquet_cache.spark_path(materialized_path))
+        # Unknown version or failed write: keep reading the raw file
+        return df
 
     def extract_datasets_from_s3(self, dataconnect_datasets):
         s3_datasets = []
@@ -78,30 +186,21 @@ class DataQualityService:
                 file_size = dataset.get('file_size')
                 last_modified = dataset.get('last_modified')
                 file_type = dataset.get('dataset_type')
+                sheets = dataset.get('sheets')
             elif isinstance(dataset, (list, tuple)) and len(dataset) >= 7:
                 # If dataset is a list or tuple, unpack it
                 dataconnect_id, bucket_name, file_name, file_size, last_modified, file_type = dataset[1:7]
+                sheets = None
             else:
                 logger.error(f"Unexpected dataset format: {type(dataset)}")
                 continue
             s3_path = f"s3a://{bucket_name}/{file_name}"
             try:
-                if file_type.lower() == 'csv':
-                    df = self.spark.read.csv(s3_path, header=True, inferSchema=True)
-                elif file_type.lower() == 'excel':
-                    df = self.spark.read.format("com.crealytics:spark-excel_2.11:0.13.5") \
-                        .option("header", "true") \
-                        .option("inferSchema", "true") \
-                        .load(s3_path)
-                elif file_type.lower() == 'sql':
-                    df = self.spark.read.text(s3_path).withColumnRenamed("value", "sql_content")
-                else:
-                    raise ValueError(f"Unsupported file type: {file_type}")
-
-                rules = {}
-                for column in df.columns:
-                    logger.info(f"Generating quality rules for column: {column}")
-                    rules[column] = generate_quality_rules_with_sql(self.api_key, column)
+                # Resolved here so the saved rule set records the object version it was generated from
+                version = self.get_object_version(bucket_name, file_name)
+                df = self.open_dataset(dataconnect_id, bucket_name, file_name, file_type, version, sheets=sheets)
+
+                rules = self.generate_column_rules(df.dtypes)
 
                 s3_datasets.append({
                     'dataframe': df,
@@ -111,7 +210,8 @@ class DataQualityService:
                         'file_name': file_name,
                         'file_size': file_size,
                         'last_modified': last_modified,
-                        'file_type': file_type
+                        'file_type': file_type,
+                        'etag': version[0] if version else None
                     },
                     'rules': rules
                 })
@@ -119,9 +219,31 @@ class DataQualityService:
                 logger.warning(f"Error reading dataset {s3_path}: {str(e)}")
         return s3_datasets
 
+    def generate_column_rules(self, columns):
+        """
+        Return {column: [{'rule': ..., 'sql': ...}]} for (column, type) pairs, taking the rules
+        from the rule generation cache when possible and generating only the missing ones.
+        """
+        rules, missing = {}, []
+        for column, dtype in columns:
+            cached = self.rule_cache.get(column, dtype) if self.rule_cache else None
+            if cached is None:
+                missing.append((column, dtype))
+            else:
+                rules[column] = cached
+        logger.info(f"Rules of {len(columns) - len(missing)} columns served from the cache, generating {len(missing)}")
+
+        # Batches of columns (with their types) per request, sent concurrently within the provider rate limit
+        generated = generate_quality_rules_for_columns(self.api_key, missing)
+        for column, dtype in missing:
+            rules[column] = generated.get(column, [])
+            # Failed or timed out batches come back empty and are not cached
+            if rules[column] and self.rule_cache:
+                self.rule_cache.put(column, dtype, rules[column])
+        return {column: rules[column] for column, _ in columns}
+
     def generate_and_save_rules(self, dataset):
         try:
-            df = dataset['dataframe']
             metadata = dataset['metadata']
             rules = dataset['rules']
 
@@ -130,37 +252,20 @@ class DataQualityService:
             table_name = re.sub(r'\W+', '_', file_name)
 
             rows = []
-            for column, content in rules.items():
-                individual_rules = content.split('Rule:')
-                for rule in individual_rules[1:]:
-                    rule = rule.strip()
-                    try:
-                        rule_parts = rule.split('SQL Query:', 1)
-                        if len(rule_parts) == 2:
-                            rule_name = rule_parts[0].strip()
-                            sql_script = self.clean_sql_script(rule_parts[1].strip())
-                            sql_script = sql_script.replace('table_name', table_name)
-                            rows.append({'Column': column, 'Rule': rule_name, 'SQL Query': sql_script})
-                    except Exception as e:
-                        print(f"Error processing rule: {str(e)}")
-                        traceback.print_exc()
-
-            rules_df = pd.DataFrame(rows)
-
-            # Set up S3 bucket name and output file name
-            bucket_name = "quality-rules"
-            current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-            folder_name = datetime.now().strftime("%Y%m%d")
-            output_file = f"{folder_name}/{file_name}_{current_datetime}_generated_rules.csv"
-
-            # Ensure bucket exists
-            self.ensure_bucket_exists(bucket_name)
-
-            # Convert DataFrame to CSV and upload to S3
-            csv_buffer = StringIO()
-            rules_df.to_csv(csv_buffer, header=True, index=False)
-            self.s3_client.put_object(Bucket=bucket_name, Key=output_file, Body=csv_buffer.getvalue())
-            print(f"Generated rules saved to: s3://{bucket_name}/{output_file}")
+            # Rules arrive already parsed and validated: {column: [{'rule': ..., 'sql': ...}]}
+            for column, column_rules in rules.items():
+                for rule in column_rules:
+                    sql_script = self.clean_sql_script(rule['sql'])
+                    sql_script = sql_script.replace('table_name', table_name)
+                    rows.append({'Column': column, 'Rule': rule['rule'], 'SQL Query': sql_script})
+
+            rules_df = pd.DataFrame(rows, columns=['Column', 'Rule', 'SQL Query'])
+
+            # A new version is only written when the rules differ from the latest one
+            rule_set, created = self.rule_set_store.save(metadata['dataconnect_id'], rows, metadata['file_name'],
+                                                         source_etag=metadata.get('etag'))
+            rules_df.attrs['rule_set_version'] = rule_set['version']
+            print(f"Rule set {rule_set['version']} of dataset {metadata['dataconnect_id']} {'saved' if created else 'unchanged'}")
 
             return rules_df
 
@@ -170,7 +275,69 @@ class DataQualityService:
             return pd.DataFrame(columns=['Column', 'Rule', 'SQL Query'])
 
 
-    def process_selected_dataset(self, dataset):
+    def preview_dataframe(self, df, limit=None, cursor=0, columns=None, as_arrow=False):
+        """
+        Return one bounded page of a Spark DataFrame: `limit` rows from `cursor`, optionally
+        projected on `columns`. The limit is pushed down into the Spark read, so the cost
+        does not depend on the dataset size. With `as_arrow` the records are an Arrow table.
+        """
+        limit = min(max(limit or self.preview_default_rows, 1), self.preview_max_rows)
+        cursor = max(cursor or 0, 0)
+        if columns:
+            unknown = [column for column in columns if column not in df.columns]
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+            df = df.select(*[f"`{column}`" for column in columns])
+        if cursor:
+            df = df.offset(cursor)
+        # One extra row tells whether another page exists without counting the dataset
+        page = df.limit(limit + 1)
+        if as_arrow:
+            table = to_arrow_table(page)
+            has_more = table.num_rows > limit
+            records, page_columns = table.slice(0, limit), table.column_names
+        else:
+            page = page.toPandas()
+            has_more = len(page) > limit
+            records, page_columns = records_to_json(page.head(limit)), list(page.columns)
+        return {
+            'records': records,
+            'columns': page_columns,
+            'cursor': cursor,
+            'limit': limit,
+            'next_cursor': cursor + limit if has_more else None
+        }
+
+    def load_spark_dataset(self, dataset_id):
+        selected_data = self.db.get_dataset_by_id(dataset_id)
+        if not selected_data:
+            logger.warning(f"No dataset found with ID: {dataset_id}")
+            return None
+        return self.load_spark_dataframe(selected_data)
+
+    def preview_dataset(self, dataset_id, limit=None, cursor=0, columns=None, as_arrow=False):
+        """Page through the rows of a dataset, or None if it can't be found or read."""
+        df = self.load_spark_dataset(dataset_id)
+        if df is None:
+            return None
+        return self.preview_dataframe(df, limit, cursor, columns, as_arrow)
+
+    def export_dataset(self, dataset_id, columns=None):
+        """
+        Whole dataset as an Arrow table, collected from Spark as Arrow record batches
+        (no pandas or python row objects), or None if it can't be found or read.
+        """
+        df = self.load_spark_dataset(dataset_id)
+        if df is None:
+            return None
+        if columns:
+            unknown = [column for column in columns if column not in df.columns]
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+            df = df.select(*[f"`{column}`" for column in columns])
+        return to_arrow_table(df)
+
+    def process_selected_dataset(self, dataset, preview_limit=None, cursor=0, columns=None):
         logger.info(f"Processing dataset with ID: {dataset}")
         logger.info(dataset["id"])
         selected_data = self.db.get_dataset_by_id(dataset["id"])
@@ -185,23 +352,48 @@ class DataQualityService:
             logger.info(f"Dataset meatada: {dataset['metadata']}")
             rules_df = self.generate_and_save_rules(dataset)
 
-            df_json = dataset['dataframe'].toPandas().to_dict(orient='records')
+            # Only a bounded preview is returned, further rows are fetched page by page
+            preview = self.preview_dataframe(dataset['dataframe'], preview_limit, cursor, columns)
             rules_json = rules_df.to_dict(orient='records')
 
             result = {
-                "dataframe": df_json,
+                "dataframe": preview.pop('records'),
+                "preview": preview,
                 "metadata": dataset['metadata'],
-                "rules": rules_json
+                "rules": rules_json,
+                "rule_set_version": rules_df.attrs.get('rule_set_version')
             }
             logger.info(f"Processed result keys: {result.keys()}")
             return result
         logger.warning("No S3 datasets found")
         return None
     
+    def get_object_version(self, bucket_name, file_name):
+        """
+        Return the (ETag, LastModified) pair identifying the current S3 object, or None
+        when it can't be resolved (in which case the frame is read without caching).
+        """
+        try:
+            head = self.s3_client.head_object(Bucket=bucket_name, Key=file_name)
+            return (head.get('ETag'), str(head.get('LastModified')))
+        except Exception as e:
+            logger.warning(f"Could not resolve version of s3://{bucket_name}/{file_name}: {str(e)}")
+            return None
+
     def extract_datasets_from_s3_only(self, dataconnect_datasets):
         s3_datasets = []
         for dataset in dataconnect_datasets:
             if isinstance(dataset, dict):
+                dataset_id = dataset.get('id')
+                # Hot datasets validated recently are served without any S3 round trip
+                version = self.frame_cache.recent_version(dataset_id)
+                cached = self.frame_cache.get(dataset_id, version) if version else None
+                if cached is not None:
+                    s3_datasets.append({
+                        'dataframe': cached,
+                        'profile': self.profile_store.get_or_build(dataset_id, version, cached)
+                    })
+                    continue
                 source = self.db.get_datasource_by_id(dataset.get('datasource_id'))
                 bucket_name = source[0]['name']
                 file_name = dataset.get('name')
@@ -209,31 +401,51 @@ class DataQualityService:
             elif isinstance(dataset, (list, tuple)) and len(dataset) >= 7:
                 # If dataset is a list or tuple, unpack it
                 dataconnect_id, bucket_name, file_name, file_size, last_modified, file_type = dataset[1:7]
+                dataset_id = dataconnect_id
             else:
                 logger.error(f"Unexpected dataset format: {type(dataset)}")
                 continue
             s3_path = f"s3a://{bucket_name}/{file_name}"
+
+            version = self.get_object_version(bucket_name, file_name)
+            if version:
+                cached = self.frame_cache.get(dataset_id, version)
+                if cached is not None:
+                    logger.info(f"Serving dataset {dataset_id} from the frame cache")
+                    self.frame_cache.mark_validated(dataset_id, version)
+                    s3_datasets.append({
+                        'dataframe': cached,
+                        'profile': self.profile_store.get_or_build(dataset_id, version, cached)
+                    })
+                    continue
             try:
-                if file_type.lower() == 'csv':
-                    df = self.spark.read.csv(s3_path, header=True, inferSchema=True)
-                elif file_type.lower() == 'excel':
-                    df = self.spark.read.format("com.crealytics:spark-excel_2.11:0.13.5") \
-                        .option("header", "true") \
-                        .option("inferSchema", "true") \
-                        .load(s3_path)
-                elif file_type.lower() == 'sql':
-                    df = self.spark.read.text(s3_path).withColumnRenamed("value", "sql_content")
-                else:
-                    raise ValueError(f"Unsupported file type: {file_type}")
+                df = self.open_dataset(dataset_id, bucket_name, file_name, file_type, version)
 
+                frame = df.toPandas()
+                if version:
+                    self.frame_cache.put(dataset_id, version, frame)
 
                 s3_datasets.append({
-                    'dataframe': df.toPandas().to_dict(orient='records')
+                    'dataframe': frame,
+                    'profile': self.profile_store.get_or_build(dataset_id, version, frame)
                 })
             except Exception as e:
                 logger.warning(f"Error reading dataset {s3_path}: {str(e)}")
         return s3_datasets
 
+    def load_spark_dataframe(self, dataconnect_datasets):
+        """
+        Return the Spark DataFrame of the first dataset without collecting it to the driver.
+        """
+        for dataset in dataconnect_datasets:
+            source = self.db.get_datasource_by_id(dataset.get('datasource_id'))
+            s3_path = f"s3a://{source[0]['name']}/{dataset.get('name')}"
+            try:
+                return self.open_dataset(dataset.get('id'), source[0]['name'], dataset.get('name'), dataset.get('dataset_type'),
+                                         sheets=dataset.get('sheets'))
+            except Exception as e:
+                logger.warning(f"Error reading dataset {s3_path}: {str(e)}")
+        return None
+
     def stop_spark(self):
-        if self.spark:
-            self.spark.stop()
\ No newline at end of file
+        self.spark_manager.stop()
\ No newline at end of file
@@ -0,0 +1,404 @@
+import os
+import re
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, date, time as dt_time
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SHEET_COLUMN = 'sheet_name'
+
+# Native replacement of the spark-excel package: workbook rows are streamed (read-only mode)
+# into Arrow record batches and written as Parquet, which Spark then reads like any dataset.
+
+
+def _open_rows(path, sheet):
+    """Iterate the rows of one sheet as tuples of python values, without loading the workbook."""
+    if path.lower().endswith('.xls'):
+        import xlrd
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            worksheet = book.sheet_by_name(sheet)
+            for row in worksheet.get_rows():
+                yield tuple(
+                    xlrd.xldate_as_datetime(cell.value, book.datemode) if cell.ctype == xlrd.XL_CELL_DATE
+                    else None if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK)
+                    else bool(cell.value) if cell.ctype == xlrd.XL_CELL_BOOLEAN
+                    else int(cell.value) if cell.ctype == xlrd.XL_CELL_NUMBER and float(cell.value).is_integer()
+                    else cell.value
+                    for cell in row
+                )
+        finally:
+            book.release_resources()
+        return
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook[sheet].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def sheet_names(path):
+    if path.lower().endswith('.xls'):
+        import xlrd
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            return book.sheet_names()
+        finally:
+            book.release_resources()
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def _header(row):
+    names, seen = [], {}
+    for position, value in enumerate(row):
+        name = str(value).strip() if value is not None and str(value).strip() else f"_c{position}"
+        # Same renaming as Spark's CSV reader for repeated names
+        if name in seen:
+            name = f"{name}{position}"
+        seen[name] = True
+        names.append(name)
+    return names
+
+
+def _coerce(value, arrow_type):
+    """Convert a value Arrow can't take as is (e.g. a date in a timestamp column), or raise ValueError."""
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type):
+        return str(value)
+    if isinstance(value, bool):
+        if pa.types.is_boolean(arrow_type):
+            return value
+    elif pa.types.is_integer(arrow_type):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+    elif pa.types.is_floating(arrow_type):
+        # Only ints that a double holds exactly
+        if isinstance(value, int) and int(float(value)) == value:
+            return float(value)
+    elif pa.types.is_timestamp(arrow_type):
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return datetime.combine(value, dt_time())
+    raise ValueError(f"{value!r} does not fit {arrow_type}")
+
+
+def _infer_type(values):
+    try:
+        arrow_type = pa.array(values).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        # Mixed values (e.g. numbers and text) become text, as with CSV type inference
+        return pa.string()
+    if pa.types.is_null(arrow_type) or pa.types.is_time(arrow_type) or pa.types.is_binary(arrow_type):
+        return pa.string()
+    if pa.types.is_date(arrow_type):
+        return pa.timestamp('us')
+    return arrow_type
+
+
+def _widen(current, candidate):
+    """Narrowest type holding the values of both types: int -> double -> string."""
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if current != candidate and any(check(current) for check in numeric) and any(check(candidate) for check in numeric):
+        return pa.float64()
+    return pa.string()
+
+
+def _lossless_cast(source, target):
+    """Casts that keep every value (Arrow's safe cast raises instead of truncating numbers)."""
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if pa.types.is_null(source) or pa.types.is_string(target):
+        return True
+    if any(check(source) for check in numeric) and any(check(target) for check in numeric):
+        return True
+    return (pa.types.is_date(source) or pa.types.is_timestamp(source)) and pa.types.is_timestamp(target)
+
+
+def _to_array(values, arrow_type):
+    """Arrow array of the values with the given type, or None when one of them does not fit it."""
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        # Mixed python types: converted value by value below
+        array = None
+    if array is not None and (array.type == arrow_type or _lossless_cast(array.type, arrow_type)):
+        try:
+            return array.cast(arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+    if array is not None and not pa.types.is_string(arrow_type):
+        return None
+    try:
+        return pa.array([_coerce(value, arrow_type) for value in values], type=arrow_type)
+    except (ValueError, pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return None
+
+
+def _column_array(values, current, has_values):
+    """
+    (array, type) of a batch of one column. The column keeps its type when every value fits,
+    otherwise it is widened so that no value is truncated or dropped.
+    """
+    if has_values:
+        array = _to_array(values, current)
+        if array is not None:
+            return array, current
+    candidate = _infer_type(values)
+    # A column with only empty cells so far takes the type of its first values
+    arrow_type = _widen(current, candidate) if has_values else candidate
+    array = _to_array(values, arrow_type)
+    if array is None:
+        arrow_type = pa.string()
+        array = _to_array(values, arrow_type)
+    return array, arrow_type
+
+
+def iter_sheet_batches(path, sheet, batch_rows=10000, sheet_column=None):
+    """
+    Yield the rows of a sheet as Arrow record batches of `batch_rows` rows. The first row
+    is the header; column types are inferred from the first batch and widened (int ->
+    double -> string) when a later batch holds values that don't fit, so memory stays
+    bounded by one batch whatever the sheet size. Batches yielded before a widening keep
+    the narrower schema: consumers cast them (see write_sheet_parquet).
+    """
+    rows = _open_rows(path, sheet)
+    header = next(rows, None)
+    if header is None:
+        return
+    names = _header(header)
+    types = [None] * len(names)
+    has_values = [False] * len(names)
+    columns = [[] for _ in names]
+
+    def flush():
+        arrays, fields = [], []
+        for position, (name, values) in enumerate(zip(names, columns)):
+            array, types[position] = _column_array(values, types[position], has_values[position])
+            has_values[position] = has_values[position] or array.null_count < len(array)
+            arrays.append(array)
+            fields.append(pa.field(name, types[position]))
+        if sheet_column:
+            arrays.append(pa.array([sheet] * len(columns[0]), type=pa.string()))
+            fields.append(pa.field(sheet_column, pa.string()))
+        for values in columns:
+            values.clear()
+        return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
+
+    width = len(names)
+    flushed = False
+    for row in rows:
+        if row is None or all(value is None for value in row):
+            continue
+        for position in range(width):
+            columns[position].append(row[position] if position < len(row) else None)
+        if len(columns[0]) >= batch_rows:
+            flushed = True
+            yield flush()
+    if columns[0] or not flushed:
+        yield flush()
+
+
+def write_sheet_parquet(path, sheet, output_path, batch_rows=10000, sheet_column=None):
+    """
+    Stream one sheet into a Parquet file. Returns the number of rows written. When a batch
+    widens the schema, the rows written so far are copied (one row group at a time) into
+    a new file with the wider schema, which then receives the following batches.
+    """
+    writer, written, generation = None, 0, 0
+    current_path = f"{output_path}.{generation}.tmp"
+    try:
+        for batch in iter_sheet_batches(path, sheet, batch_rows, sheet_column):
+            if writer is None:
+                writer = pq.ParquetWriter(current_path, batch.schema)
+            elif batch.schema != writer.schema:
+                writer.close()
+                generation += 1
+                widened_path = f"{output_path}.{generation}.tmp"
+                writer = pq.ParquetWriter(widened_path, batch.schema)
+                with pq.ParquetFile(current_path) as previous:
+                    for group in range(previous.num_row_groups):
+                        writer.write_table(previous.read_row_group(group).cast(batch.schema))
+                os.remove(current_path)
+                current_path = widened_path
+            writer.write_batch(batch)
+            written += batch.num_rows
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(current_path):
+            os.remove(current_path)
+        raise
+    if writer is not None:
+        writer.close()
+        os.replace(current_path, output_path)
+    return written
+
+
+def _rewrite_parquet(path, schema):
+    """Cast a Parquet file to `schema`, one row group at a time, and replace it."""
+    tmp_path = f"{path}.cast.tmp"
+    try:
+        with pq.ParquetFile(path) as source, pq.ParquetWriter(tmp_path, schema) as writer:
+            for group in range(source.num_row_groups):
+                writer.write_table(source.read_row_group(group).cast(schema))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def unify_parquet_types(paths, max_workers=1):
+    """
+    Give a column the same type in every file (int -> double -> string, as within a sheet):
+    Spark's mergeSchema fails on sheets that disagree on a column type. Only the files
+    holding a narrower type are rewritten. Returns the number of rewritten files.
+    """
+    schemas = {path: pq.read_schema(path) for path in paths}
+    types = {}
+    for schema in schemas.values():
+        for field in schema:
+            current = types.get(field.name)
+            types[field.name] = field.type if current is None or current == field.type else _widen(current, field.type)
+    targets = {
+        path: pa.schema([field.with_type(types[field.name]) for field in schema])
+        for path, schema in schemas.items()
+        if any(field.type != types[field.name] for field in schema)
+    }
+    if targets:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+            for future in [executor.submit(_rewrite_parquet, path, schema) for path, schema in targets.items()]:
+                future.result()
+    return len(targets)
+
+
+class ExcelReader:
+    """
+    Converts an Excel object of S3 into a local Parquet directory (one file per selected
+    sheet, written in parallel) that Spark reads instead of going through spark-excel.
+    A column typed differently by two sheets is widened in every file before the rename.
+
+    Every conversion is written to a private directory and renamed into place as
+    <staging_dir>/<sha256(bucket/key)>/<etag>-<sheets>, so a directory is never rewritten
+    under a Spark frame reading it; a known version is converted only once. Directories
+    of other versions are removed once older than `retention_seconds`.
+    """
+
+    def __init__(self, s3_client, staging_dir, batch_rows, max_workers, retention_seconds):
+        self.s3_client = s3_client
+        self.staging_dir = os.path.abspath(staging_dir)
+        self.batch_rows = batch_rows
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def resolve_sheets(self, path, sheets):
+        """`sheets` is None (first sheet), '*' (all sheets), a comma separated string or a list."""
+        available = sheet_names(path)
+        if not sheets:
+            return available[:1]
+        if sheets == '*':
+            return available
+        if isinstance(sheets, str):
+            sheets = [sheet.strip() for sheet in sheets.split(',') if sheet.strip()]
+        missing = [sheet for sheet in sheets if sheet not in available]
+        if missing:
+            raise ValueError(f"Unknown sheets: {', '.join(missing)}")
+        return list(sheets)
+
+    def to_parquet(self, bucket_name, key, sheets=None, local_path=None, etag=None):
+        """
+        Convert the selected sheets of the workbook and return the Parquet directory. The
+        workbook is read from `local_path` when given (e.g. the object cache), else downloaded.
+        With the object `etag`, an earlier conversion of the same version and sheets is reused.
+        """
+        if local_path:
+            return self._convert(bucket_name, key, local_path, sheets, etag)
+        suffix = '.xls' if key.lower().endswith('.xls') else '.xlsx'
+        with tempfile.NamedTemporaryFile(suffix=suffix, dir=self.staging_dir) as workbook_file:
+            # Workbooks are zip (or OLE) containers that need random access: spool them to disk, not memory
+            self.s3_client.download_fileobj(bucket_name, key, workbook_file)
+            workbook_file.flush()
+            return self._convert(bucket_name, key, workbook_file.name, sheets, etag)
+
+    def _convert(self, bucket_name, key, workbook_path, sheets, etag=None):
+        object_dir = os.path.join(self.staging_dir, hashlib.sha256(f"{bucket_name}/{key}".encode('utf-8')).hexdigest())
+        selected = self.resolve_sheets(workbook_path, sheets)
+        selection = hashlib.sha256('\0'.join(selected).encode('utf-8')).hexdigest()[:16]
+        # Without a known version every conversion gets a directory of its own
+        version = re.sub(r'[^A-Za-z0-9_-]', '', etag) if etag else uuid.uuid4().hex
+        output_dir = os.path.join(object_dir, f"{version}-{selection}")
+        if os.path.isdir(output_dir):
+            # In use again: keep it out of the next prune
+            os.utime(output_dir)
+            return output_dir
+        tmp_dir = os.path.join(object_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            # With several sheets every row says which sheet it comes from
+            sheet_column = SHEET_COLUMN if len(selected) > 1 else None
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(selected)))) as executor:
+                futures = [
+                    executor.submit(
+                        write_sheet_parquet, workbook_path, sheet,
+                        os.path.join(tmp_dir, f"part-{position:05d}.parquet"), self.batch_rows, sheet_column
+                    )
+                    for position, sheet in enumerate(selected)
+                ]
+                rows = sum(future.result() for future in futures)
+            if len(selected) > 1:
+                parts = [os.path.join(tmp_dir, name) for name in sorted(os.listdir(tmp_dir)) if name.endswith('.parquet')]
+                unify_parquet_types(parts, self.max_workers)
+            os.rename(tmp_dir, output_dir)
+        except OSError:
+            if not os.path.isdir(output_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            # A concurrent conversion of the same version was renamed into place first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return output_dir
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.info(f"Converted {len(selected)} sheet(s) of s3://{bucket_name}/{key} to Parquet ({rows} rows)")
+        self._prune(object_dir, output_dir)
+        return output_dir
+
+    def _prune(self, object_dir, current_dir):
+        """Remove the other conversions of an object once they are older than the retention."""
+        cutoff = time.time() - self.retention_seconds
+        for name in os.listdir(object_dir):
+            path = os.path.join(object_dir, name)
+            try:
+                if path != current_dir and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+
+def create_excel_reader(s3_client):
+    return ExcelReader(
+        s3_client,
+        staging_dir=os.getenv('EXCEL_STAGING_DIR', os.path.join('.dq_state', 'excel')),
+        batch_rows=int(os.getenv('EXCEL_BATCH_ROWS', 10000)),
+        max_workers=int(os.getenv('EXCEL_MAX_WORKERS', 4)),
+        retention_seconds=float(os.getenv('EXCEL_STAGING_RETENTION_SECONDS', 24 * 3600))
+    )
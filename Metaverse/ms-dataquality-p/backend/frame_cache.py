@@ -0,0 +1,122 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def frame_size_bytes(frame):
+    """Approximate in-memory size of a loaded frame (pandas DataFrame or list of records)."""
+    try:
+        return int(frame.memory_usage(index=True, deep=True).sum())
+    except AttributeError:
+        # Fall back to a rough estimate for plain python containers
+        return sum(len(str(row)) for row in frame) if frame is not None else 0
+
+
+class FrameCache:
+    """
+    Memory-bounded LRU cache of loaded dataset frames.
+
+    Entries are keyed by (dataset_id, version) where the version is the S3 object's
+    ETag + LastModified, so a changed object never serves a stale frame. Eviction is
+    size-aware: least recently used frames are dropped until the byte budget fits.
+    """
+
+    def __init__(self, max_bytes, revalidate_seconds=0):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries = OrderedDict()
+        self._validated = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, dataset_id, version):
+        key = (dataset_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, dataset_id, version, frame):
+        size = frame_size_bytes(frame)
+        with self._lock:
+            # Older versions of the same dataset can never be served again
+            for key in [k for k in self._entries if k[0] == dataset_id]:
+                self._drop(key)
+            self._validated[dataset_id] = (version, time.monotonic())
+            if size > self.max_bytes:
+                logger.info(f"Frame for dataset {dataset_id} ({size} bytes) exceeds the cache budget, not cached.")
+                return False
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+            self._entries[(dataset_id, version)] = (frame, size)
+            self.current_bytes += size
+            return True
+
+    def recent_version(self, dataset_id):
+        """
+        Return the version validated for a dataset less than `revalidate_seconds` ago,
+        so callers can skip the S3 HEAD request for hot datasets.
+        """
+        if self.revalidate_seconds <= 0:
+            return None
+        with self._lock:
+            validated = self._validated.get(dataset_id)
+        if validated and time.monotonic() - validated[1] < self.revalidate_seconds:
+            return validated[0]
+        return None
+
+    def mark_validated(self, dataset_id, version):
+        with self._lock:
+            self._validated[dataset_id] = (version, time.monotonic())
+
+    def invalidate(self, dataset_id=None):
+        with self._lock:
+            keys = [k for k in self._entries if dataset_id is None or k[0] == dataset_id]
+            for key in keys:
+                self._drop(key)
+            if dataset_id is None:
+                self._validated.clear()
+            else:
+                self._validated.pop(dataset_id, None)
+
+    def _drop(self, key):
+        _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Process-wide cache shared by every DataQualityService / DataQualityChecker instance
+dataset_frame_cache = FrameCache(
+    max_bytes=int(os.getenv('FRAME_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+    revalidate_seconds=float(os.getenv('FRAME_CACHE_REVALIDATE_SECONDS', 0))
+)
@@ -0,0 +1,257 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from urllib.parse import unquote_plus
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from backend.rule_compiler import compile_rule
+from backend.rule_kernels import unique
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _rule_dict(rule):
+    return rule.model_dump() if hasattr(rule, 'model_dump') else dict(rule)
+
+
+def _rule_key(rule):
+    return (rule['rule_name'], rule['column'], rule['query'])
+
+
+def _normalize_etag(etag):
+    return (etag or '').strip('"')
+
+
+def _encode_partials(partials):
+    """JSON form of an object's partials: rule keys become lists, value hashes base64 uint64 bytes."""
+    encoded = []
+    for key, partial in partials.items():
+        if 'hashes' in partial:
+            partial = dict(partial, hashes=base64.b64encode(partial['hashes'].astype('<u8').tobytes()).decode('ascii'))
+        encoded.append([list(key), partial])
+    return encoded
+
+
+def _decode_partials(encoded):
+    partials = {}
+    for key, partial in encoded:
+        if 'hashes' in partial:
+            partial = dict(partial, hashes=np.frombuffer(base64.b64decode(partial['hashes']), dtype='<u8'))
+        partials[tuple(key)] = partial
+    return partials
+
+
+class IncrementalStateStore:
+    """
+    Local stand-in for the incremental check state: one JSON file per dataset holding the
+    evaluated objects (key + ETag) and their per-rule partial results. File names are a
+    hash of the dataset id, which comes from requests and S3 events.
+    """
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.state_dir, f"{hashlib.sha256(str(dataset_id).encode('utf-8')).hexdigest()}.json")
+
+    def _read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        for obj in state['objects'].values():
+            obj['partials'] = _decode_partials(obj['partials'])
+        return state
+
+    def load(self, dataset_id):
+        try:
+            return self._read(self._path(dataset_id))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'dataset_id': dataset_id, 'rules': [], 'objects': {}}
+
+    def save(self, state):
+        encoded = dict(state, objects={
+            key: dict(obj, partials=_encode_partials(obj['partials'])) for key, obj in state['objects'].items()
+        })
+        tmp_path = self._path(state['dataset_id']) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(encoded, f)
+        os.replace(tmp_path, self._path(state['dataset_id']))
+
+    def all_states(self):
+        for file_name in os.listdir(self.state_dir):
+            if file_name.endswith('.json'):
+                try:
+                    yield self._read(os.path.join(self.state_dir, file_name))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+
+
+class IncrementalChecker:
+    """
+    Evaluates a rule suite object by object. Only new or changed S3 objects (by ETag) are
+    read and checked; their partial counts are merged with the stored partials of the
+    objects that did not change. Uniqueness is merged through per-object value hashes.
+    """
+
+    def __init__(self, checker, state_store=None):
+        self.checker = checker
+        self.dqs = checker.dqs
+        self.db = checker.db
+        self.state_store = state_store or IncrementalStateStore(
+            os.getenv('INCREMENTAL_STATE_DIR', os.path.join('.dq_state', 'incremental'))
+        )
+        # One lock per dataset: runs of different datasets don't wait for each other
+        self._dataset_locks = {}
+        self._lock = threading.Lock()
+
+    def _dataset_lock(self, dataset_id):
+        with self._lock:
+            return self._dataset_locks.setdefault(dataset_id, threading.Lock())
+
+    def list_objects(self, bucket_name, prefix):
+        """Return {key: etag} for every object of the dataset (a single file or a prefix of part-files)."""
+        objects = {}
+        paginator = self.dqs.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for item in page.get('Contents', []):
+                if item['Key'].endswith('/'):
+                    continue
+                objects[item['Key']] = _normalize_etag(item['ETag'])
+        return objects
+
+    def evaluate_object(self, bucket_name, key, file_type, rules, etag=None):
+        """Read one object and compute the partial result of every rule on it."""
+        frame = self.dqs.read_dataframe(f"s3a://{bucket_name}/{key}", file_type, etag=etag).toPandas()
+        partials = {}
+        for rule in rules:
+            if rule['column'] not in frame.columns:
+                partials[_rule_key(rule)] = {'error': f"Column '{rule['column']}' not found in object '{key}'."}
+                continue
+            compiled = compile_rule(rule['rule_name'], rule['column'], rule['query'])
+            if compiled.kernel is unique:
+                # Keep value hashes so duplicates across objects are found when merging
+                values = frame[rule['column']]
+                if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                    # Part-files may infer int or float for the same column: hash one representation
+                    values = values.astype('float64')
+                hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+                partials[_rule_key(rule)] = {'total': len(frame), 'hashes': np.unique(hashes)}
+                continue
+            metrics = self.checker.check_rule(frame, rule['rule_name'], rule['column'], compiled.sql_script, compiled)
+            if metrics is None:
+                partials[_rule_key(rule)] = {'error': f"Rule could not be applied on object '{key}'."}
+                continue
+            partials[_rule_key(rule)] = {
+                'total': len(frame),
+                'valid': int(metrics['valid_count']),
+                'invalid': int(metrics['invalid_count'])
+            }
+        return partials
+
+    def merge(self, state):
+        """Combine the per-object partials into one report per rule."""
+        reports = []
+        for rule in state['rules']:
+            key = _rule_key(rule)
+            partials = [obj['partials'][key] for obj in state['objects'].values() if key in obj['partials']]
+            report = {'Column': rule['column'], 'Rule': rule['rule_name'], 'Objects': len(partials)}
+            errors = [p['error'] for p in partials if 'error' in p]
+            if errors:
+                report['Error'] = errors[0]
+            elif partials and 'hashes' in partials[0]:
+                total = sum(p['total'] for p in partials)
+                distinct = len(np.unique(np.concatenate([p['hashes'] for p in partials])))
+                report['Valid Rows'] = distinct
+                report['Incidents'] = total - distinct
+            else:
+                report['Valid Rows'] = sum(p['valid'] for p in partials)
+                report['Incidents'] = sum(p['invalid'] for p in partials)
+            reports.append(report)
+        return reports
+
+    def run(self, dataset, rules=None, changed_objects=None, removed_objects=()):
+        """
+        Bring the stored state of a dataset up to date and return the merged reports.
+        Without `changed_objects` the dataset prefix is re-scanned and objects that are gone
+        are dropped; with it (from an S3 event) only those objects are considered.
+        """
+        with self._dataset_lock(dataset['id']):
+            state = self.state_store.load(dataset['id'])
+            if rules is not None:
+                state['rules'] = [_rule_dict(rule) for rule in rules]
+            if 'bucket_name' not in state:
+                selected_data = self.db.get_dataset_by_id(dataset['id'])
+                if not selected_data:
+                    raise ValueError(f"No dataset found with ID: {dataset['id']}")
+                source = self.db.get_datasource_by_id(selected_data[0].get('datasource_id'))
+                state['bucket_name'] = source[0]['name']
+                state['prefix'] = selected_data[0].get('name')
+                state['file_type'] = selected_data[0].get('dataset_type')
+
+            if changed_objects is None:
+                listing = self.list_objects(state['bucket_name'], state['prefix'])
+                removed_objects = [key for key in state['objects'] if key not in listing]
+            else:
+                listing = {key: _normalize_etag(etag) for key, etag in changed_objects.items()}
+            for key in removed_objects:
+                state['objects'].pop(key, None)
+
+            evaluated, reused = [], 0
+            for key, etag in listing.items():
+                stored = state['objects'].get(key)
+                missing_rules = [
+                    rule for rule in state['rules']
+                    if stored is None or stored['etag'] != etag or _rule_key(rule) not in stored['partials']
+                ]
+                if not missing_rules:
+                    reused += 1
+                    continue
+                logger.info(f"Evaluating object s3://{state['bucket_name']}/{key} ({len(missing_rules)} rules)")
+                partials = self.evaluate_object(state['bucket_name'], key, state['file_type'], missing_rules, etag)
+                if stored is not None and stored['etag'] == etag:
+                    stored['partials'].update(partials)
+                else:
+                    state['objects'][key] = {'etag': etag, 'partials': partials}
+                evaluated.append(key)
+
+            self.state_store.save(state)
+            return {
+                'reports': self.merge(state),
+                'objects': {'evaluated': evaluated, 'reused': reused, 'removed': list(removed_objects)}
+            }
+
+    def handle_s3_event(self, event):
+        """
+        Process an S3 event notification: every created/removed object is routed to the
+        datasets whose bucket and prefix it belongs to, and only those objects are evaluated.
+        """
+        changes = {}
+        for record in event.get('Records', []):
+            s3 = record.get('s3', {})
+            bucket_name = s3.get('bucket', {}).get('name')
+            obj = s3.get('object', {})
+            # Keys arrive URL-encoded in event notifications
+            key = unquote_plus(obj.get('key', ''))
+            if not bucket_name or not key:
+                continue
+            removed = record.get('eventName', '').startswith('ObjectRemoved')
+            changes.setdefault(bucket_name, []).append((key, obj.get('eTag'), removed))
+
+        results = {}
+        for state in self.state_store.all_states():
+            bucket_changes = changes.get(state.get('bucket_name'), [])
+            matching = [change for change in bucket_changes if change[0].startswith(state.get('prefix', ''))]
+            if not matching:
+                continue
+            changed = {key: etag for key, etag, removed in matching if not removed}
+            removed = [key for key, _, is_removed in matching if is_removed]
+            results[state['dataset_id']] = self.run({'id': state['dataset_id']}, changed_objects=changed, removed_objects=removed)
+        return results
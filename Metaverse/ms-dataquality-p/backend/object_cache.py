@@ -0,0 +1,189 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LocalObjectCache:
+    """
+    Read-through disk cache of raw S3 objects, keyed by (bucket, key, ETag).
+
+    Files live at <cache_dir>/<sha256(bucket/key)>/<etag><extension>, so a changed object
+    never serves a stale copy. Eviction is size-aware: least recently used files are
+    removed until `max_bytes` fits. Objects larger than `max_object_bytes` are not cached.
+
+    Spark reads the returned paths lazily, so every lookup pins the file for `pin_seconds`:
+    pinned files are never evicted, and an object that only fits by evicting pinned files
+    is read from S3 instead of being cached.
+    """
+
+    def __init__(self, cache_dir, s3_client, max_bytes, max_object_bytes, pin_seconds):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.s3_client = s3_client
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.pin_seconds = pin_seconds
+        self._entries = OrderedDict()
+        self._pins = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files left by a previous process (oldest first)."""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith('.tmp'):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self.current_bytes += size
+
+    def path(self, bucket_name, key, etag):
+        object_dir = hashlib.sha256(f"{bucket_name}/{key}".encode('utf-8')).hexdigest()
+        extension = os.path.splitext(key)[1].lower()
+        return os.path.join(self.cache_dir, object_dir, re.sub(r'[^A-Za-z0-9_-]', '', etag) + extension)
+
+    def _key_lock(self, path):
+        with self._lock:
+            return self._key_locks.setdefault(path, threading.Lock())
+
+    def get(self, bucket_name, key, etag):
+        """Local path of the cached object, or None (without downloading)."""
+        path = self.path(bucket_name, key, etag)
+        with self._lock:
+            if path not in self._entries or not os.path.exists(path):
+                return None
+            self._entries.move_to_end(path)
+            self._pin(path)
+        os.utime(path)
+        return path
+
+    def fetch(self, bucket_name, key, etag):
+        """
+        Return the local path of the object, downloading it on a miss. None when the
+        version is unknown, the object is too large for the cache or the download fails.
+        """
+        if not etag:
+            return None
+        path = self.path(bucket_name, key, etag)
+        # One download per object version, concurrent readers wait for it
+        with self._key_lock(path):
+            cached = self.get(bucket_name, key, etag)
+            if cached:
+                with self._lock:
+                    self.hits += 1
+                return cached
+            with self._lock:
+                self.misses += 1
+            try:
+                size = self.s3_client.head_object(Bucket=bucket_name, Key=key)['ContentLength']
+                if size > min(self.max_object_bytes, self.max_bytes):
+                    logger.info(f"s3://{bucket_name}/{key} ({size} bytes) exceeds the object cache limit, not cached.")
+                    return None
+                if not self._make_room(path, size):
+                    logger.info(f"Object cache is full of files in use, s3://{bucket_name}/{key} is not cached.")
+                    return None
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                self.s3_client.download_file(bucket_name, key, tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.warning(f"Could not cache s3://{bucket_name}/{key}: {str(e)}")
+                return None
+            self._add(path, size)
+        return path
+
+    def _pin(self, path):
+        self._pins[path] = time.monotonic() + self.pin_seconds
+
+    def _pinned(self, path, now):
+        expiry = self._pins.get(path)
+        if expiry is not None and expiry <= now:
+            del self._pins[path]
+            return False
+        return expiry is not None
+
+    def _make_room(self, path, size):
+        """Evict unpinned files, least recently used first, until `size` more bytes fit."""
+        with self._lock:
+            now = time.monotonic()
+            # Older versions of the same object can never be served again, once no frame reads them
+            object_dir = os.path.dirname(path)
+            for stale in [p for p in self._entries if os.path.dirname(p) == object_dir and p != path]:
+                if not self._pinned(stale, now):
+                    self._drop(stale)
+            evictable = [p for p in self._entries if not self._pinned(p, now)]
+            if self.current_bytes - sum(self._entries[p] for p in evictable) + size > self.max_bytes:
+                return False
+            for candidate in evictable:
+                if self.current_bytes + size <= self.max_bytes:
+                    break
+                self._drop(candidate)
+                self.evictions += 1
+            return True
+
+    def _add(self, path, size):
+        with self._lock:
+            if path in self._entries:
+                self.current_bytes -= self._entries.pop(path)
+            self._entries[path] = size
+            self.current_bytes += size
+            self._pin(path)
+
+    def _drop(self, path):
+        self.current_bytes -= self._entries.pop(path)
+        self._pins.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            now = time.monotonic()
+            return {
+                'entries': len(self._entries),
+                'pinned': sum(1 for path in list(self._entries) if self._pinned(path, now)),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def create_object_cache(s3_client):
+    """Build the cache from OBJECT_CACHE_* settings, or None when OBJECT_CACHE_ENABLED is false."""
+    if os.getenv('OBJECT_CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+    return LocalObjectCache(
+        os.getenv('OBJECT_CACHE_DIR', os.path.join('.dq_state', 'objects')),
+        s3_client,
+        max_bytes=int(os.getenv('OBJECT_CACHE_MAX_BYTES', 10 * 1024 * 1024 * 1024)),
+        max_object_bytes=int(os.getenv('OBJECT_CACHE_MAX_OBJECT_BYTES', 2 * 1024 * 1024 * 1024)),
+        # Lazy frames live at most as long as the invalid-record results that keep them
+        pin_seconds=float(os.getenv('OBJECT_CACHE_PIN_SECONDS', os.getenv('INVALID_RECORDS_TTL_SECONDS', 3600)))
+    )
@@ -0,0 +1,139 @@
+import os
+import re
+import uuid
+import shutil
+import logging
+import threading
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ParquetCache:
+    """
+    Parquet copies of raw CSV/Excel datasets, written the first time a version is read.
+    Copies live under `root` (an s3a:// prefix or a local directory) at <root>/<dataset_id>/<etag>,
+    so a changed source object never matches an old copy. A copy is complete once Spark
+    has written its _SUCCESS marker. Local copies are written to a private directory and
+    renamed into place; writes of one version are serialized within the process.
+    """
+
+    def __init__(self, root, s3_client, compression='snappy', max_records_per_file=1000000):
+        self.root = root.rstrip('/')
+        self.s3_client = s3_client
+        self.compression = compression
+        self.max_records_per_file = max_records_per_file
+        self.is_s3 = self.root.startswith('s3a://') or self.root.startswith('s3://')
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        if not self.is_s3:
+            self.root = os.path.abspath(self.root)
+            os.makedirs(self.root, exist_ok=True)
+
+    def _dataset_prefix(self, dataset_id):
+        return f"{self.root}/{dataset_id}"
+
+    def path(self, dataset_id, etag):
+        return f"{self._dataset_prefix(dataset_id)}/{re.sub(r'[^A-Za-z0-9_-]', '', etag)}"
+
+    def _split_s3(self, path):
+        bucket_name, _, key = path.split('://', 1)[1].partition('/')
+        return bucket_name, key
+
+    def exists(self, path):
+        if not self.is_s3:
+            return os.path.exists(os.path.join(path, '_SUCCESS'))
+        bucket_name, key = self._split_s3(path)
+        try:
+            self.s3_client.head_object(Bucket=bucket_name, Key=f"{key}/_SUCCESS")
+            return True
+        except Exception:
+            return False
+
+    def lookup(self, dataset_id, etag):
+        """Return the path of the complete Parquet copy of this dataset version, or None."""
+        if not etag or dataset_id is None:
+            return None
+        path = self.path(dataset_id, etag)
+        return path if self.exists(path) else None
+
+    def _key_lock(self, path):
+        with self._lock:
+            return self._key_locks.setdefault(path, threading.Lock())
+
+    def materialize(self, df, dataset_id, etag):
+        """
+        Write the Spark DataFrame as compressed Parquet files of at most `max_records_per_file`
+        rows and drop the copies of older versions. Returns the path, or None on failure.
+        """
+        if not etag or dataset_id is None:
+            return None
+        path = self.path(dataset_id, etag)
+        # Concurrent first reads of a version wait for one write instead of overwriting each other
+        with self._key_lock(path):
+            if self.exists(path):
+                return path
+            # S3 has no rename: there the lock (and the _SUCCESS marker) keep readers off partial copies
+            target = path if self.is_s3 else f"{self._dataset_prefix(dataset_id)}/.tmp-{uuid.uuid4().hex}"
+            try:
+                df.write.mode('overwrite') \
+                    .option('compression', self.compression) \
+                    .option('maxRecordsPerFile', self.max_records_per_file) \
+                    .parquet(self.spark_path(target))
+                if not self.is_s3:
+                    # Only an incomplete copy (no _SUCCESS, so no reader) can be left at `path`
+                    shutil.rmtree(path, ignore_errors=True)
+                    os.rename(target, path)
+            except Exception as e:
+                if not self.is_s3:
+                    shutil.rmtree(target, ignore_errors=True)
+                logger.warning(f"Could not materialize dataset {dataset_id} as Parquet: {str(e)}")
+                return None
+        self.drop_older_versions(dataset_id, path)
+        logger.info(f"Dataset {dataset_id} materialized as Parquet at {path}")
+        return path
+
+    def drop_older_versions(self, dataset_id, current_path=None):
+        prefix = self._dataset_prefix(dataset_id)
+        try:
+            if not self.is_s3:
+                for name in os.listdir(prefix):
+                    stale = os.path.join(prefix, name)
+                    # Private directories of writes still in progress are left alone
+                    if stale != current_path and not name.startswith('.tmp-'):
+                        shutil.rmtree(stale, ignore_errors=True)
+                return
+            bucket_name, key_prefix = self._split_s3(prefix)
+            current_key = self._split_s3(current_path)[1] + '/' if current_path else None
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=key_prefix + '/'):
+                stale = [{'Key': item['Key']} for item in page.get('Contents', [])
+                         if current_key is None or not item['Key'].startswith(current_key)]
+                if stale:
+                    self.s3_client.delete_objects(Bucket=bucket_name, Delete={'Objects': stale})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not drop older Parquet copies of dataset {dataset_id}: {str(e)}")
+
+    def spark_path(self, path):
+        return path if self.is_s3 else f"file://{path}"
+
+
+def create_parquet_cache(s3_client):
+    """Build the cache from PARQUET_CACHE_* settings, or None when PARQUET_CACHE_ENABLED is false."""
+    if os.getenv('PARQUET_CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+    root = os.getenv('PARQUET_CACHE_URI', os.path.join('.dq_state', 'parquet'))
+    if root.startswith('s3://'):
+        root = 's3a://' + root[len('s3://'):]
+    return ParquetCache(
+        root,
+        s3_client,
+        compression=os.getenv('PARQUET_CACHE_COMPRESSION', 'snappy'),
+        max_records_per_file=int(os.getenv('PARQUET_CACHE_MAX_RECORDS_PER_FILE', 1000000))
+    )
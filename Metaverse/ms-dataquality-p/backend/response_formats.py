@@ -0,0 +1,93 @@
+import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Content negotiation for the endpoints returning rows: JSON (default), Arrow IPC stream or Parquet.
+# Arrow and Parquet bodies are built from Arrow tables, never from per-row python objects.
+
+JSON = 'json'
+ARROW = 'arrow'
+PARQUET = 'parquet'
+
+MEDIA_TYPES = {
+    JSON: 'application/json',
+    ARROW: 'application/vnd.apache.arrow.stream',
+    PARQUET: 'application/vnd.apache.parquet',
+}
+
+_ACCEPTED_MEDIA_TYPES = {
+    'application/vnd.apache.arrow.stream': ARROW,
+    'application/vnd.apache.arrow.file': ARROW,
+    'application/vnd.apache.parquet': PARQUET,
+    'application/x-parquet': PARQUET,
+    'application/json': JSON,
+    'application/x-ndjson': JSON,
+}
+
+
+def negotiate_format(accept=None, requested=None):
+    """
+    Pick the response format from an explicit `format` parameter, else from the Accept
+    header (honoring q-values), else JSON.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported format '{requested}', expected one of: {', '.join(MEDIA_TYPES)}")
+        return requested
+    candidates = []
+    for position, part in enumerate((accept or '').split(',')):
+        media_type, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        fmt = _ACCEPTED_MEDIA_TYPES.get(media_type.strip().lower())
+        if fmt and quality > 0:
+            candidates.append((-quality, position, fmt))
+    return min(candidates)[2] if candidates else JSON
+
+
+def to_arrow_table(frame):
+    """
+    Arrow table of a pandas or Spark DataFrame. Spark rows are collected as Arrow record
+    batches (toArrow, or the Arrow collect of older PySpark) without going through pandas.
+    """
+    if hasattr(frame, 'iloc'):
+        return pa.Table.from_pandas(frame, preserve_index=False)
+    if hasattr(frame, 'toArrow'):
+        return frame.toArrow()
+    batches = frame._collect_as_arrow()
+    if batches:
+        return pa.Table.from_batches(batches)
+    # No batch means no rows: the schema comes from an (empty) pandas conversion
+    return pa.Table.from_pandas(frame.limit(0).toPandas(), preserve_index=False)
+
+
+def iter_arrow_stream(table, chunk_rows=65536):
+    """Yield an Arrow IPC stream of the table, one record batch of `chunk_rows` at a time."""
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    for batch in table.to_batches(max_chunksize=chunk_rows):
+        writer.write_batch(batch)
+        yield _drain(sink)
+    writer.close()
+    yield _drain(sink)
+
+
+def parquet_bytes(table):
+    sink = io.BytesIO()
+    pq.write_table(table, sink)
+    return sink.getvalue()
+
+
+def _drain(sink):
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
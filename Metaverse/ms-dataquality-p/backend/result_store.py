@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from dotenv import load_dotenv
+from backend.frame_cache import frame_size_bytes
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def records_to_json(frame):
+    """Convert a (small) frame slice to JSON-safe records: NaN -> null, dates -> ISO strings."""
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+
+class InvalidRecordStore:
+    """
+    Keeps the invalid records of recent checks so the apply-check responses only carry
+    a bounded sample, and the full set can be fetched page by page or streamed later.
+    Results expire after `ttl_seconds`; the oldest are dropped beyond `max_entries` or
+    once the frames and positions they hold exceed `max_bytes`.
+
+    pandas results are stored as the row positions of the invalid records in the checked
+    frame (the one shared with the frame cache), never as a copy of the rows; Spark results
+    are the lazy invalid-row DataFrame. A frame held by a result stays alive even once the
+    frame cache evicts it, so it counts against `max_bytes` (once, however many results of
+    the same check batch point into it).
+    """
+
+    def __init__(self, max_entries, ttl_seconds, max_bytes):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._results = OrderedDict()
+        # id(frame) -> [size in bytes, number of results holding the frame]
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def put(self, records, metadata=None, positions=None):
+        """Store a result: `records` with the `positions` of its invalid rows, or the invalid rows themselves."""
+        result_id = str(uuid.uuid4())
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.int64)
+        with self._lock:
+            self._expire()
+            frame_size = self._frame_size(records)
+            if frame_size > self.max_bytes and positions is not None:
+                # The checked frame alone is over the budget: keep a copy of the invalid rows instead
+                records, positions = records.iloc[positions], None
+                frame_size = self._frame_size(records)
+            if frame_size + (positions.nbytes if positions is not None else 0) > self.max_bytes:
+                logger.info(f"Invalid records of result {result_id} exceed the store budget, not kept.")
+                return result_id
+            self._results[result_id] = (records, positions, metadata or {}, time.monotonic())
+            self._hold(records, frame_size, positions)
+            while len(self._results) > self.max_entries or self.current_bytes > self.max_bytes:
+                self._drop(next(iter(self._results)))
+        return result_id
+
+    def _frame_size(self, records):
+        if not hasattr(records, 'iloc'):
+            # Lazy Spark DataFrame: nothing is held on the driver
+            return 0
+        held = self._frames.get(id(records))
+        return held[0] if held else frame_size_bytes(records)
+
+    def _hold(self, records, frame_size, positions):
+        held = self._frames.get(id(records))
+        if held is None:
+            self._frames[id(records)] = held = [frame_size, 0]
+            self.current_bytes += frame_size
+        held[1] += 1
+        if positions is not None:
+            self.current_bytes += positions.nbytes
+
+    def _drop(self, result_id):
+        records, positions, _, _ = self._results.pop(result_id)
+        held = self._frames[id(records)]
+        held[1] -= 1
+        if held[1] == 0:
+            del self._frames[id(records)]
+            self.current_bytes -= held[0]
+        if positions is not None:
+            self.current_bytes -= positions.nbytes
+
+    def get(self, result_id):
+        """All the invalid records of a result (a new frame), or None if the result expired."""
+        entry = self._get_entry(result_id)
+        return self._rows(entry[0], entry[1]) if entry else None
+
+    def get_source(self, result_id):
+        """(records, positions) of a result without copying rows, or None if the result expired."""
+        entry = self._get_entry(result_id)
+        return (entry[0], entry[1]) if entry else None
+
+    def _rows(self, records, positions, start=None, end=None):
+        if positions is None:
+            return records.iloc[start:end] if hasattr(records, 'iloc') else records
+        return records.iloc[positions[start:end]]
+
+    def _total(self, records, positions, metadata):
+        if 'total' in metadata:
+            return metadata['total']
+        return len(positions) if positions is not None else len(records)
+
+    def _get_entry(self, result_id):
+        with self._lock:
+            self._expire()
+            return self._results.get(result_id)
+
+    def get_page_frame(self, result_id, cursor=0, limit=1000):
+        """
+        Return (page, paging info) for the invalid records starting at `cursor`, or None if the
+        result expired. The page is a pandas slice, or a lazy Spark DataFrame in Spark mode.
+        """
+        entry = self._get_entry(result_id)
+        if entry is None:
+            return None
+        records, positions, metadata, _ = entry
+        total = self._total(records, positions, metadata)
+        cursor = max(cursor, 0)
+        end = min(cursor + limit, total)
+        if hasattr(records, 'iloc'):
+            page = self._rows(records, positions, cursor, end)
+        else:
+            # Lazy Spark DataFrame from the Spark execution mode: only this page is collected.
+            # It is recomputed for every page, so rows need a total order to neither repeat nor go missing
+            page = _ordered(records).offset(cursor).limit(max(end - cursor, 0))
+        return page, {
+            'result_id': result_id,
+            'total': total,
+            'cursor': cursor,
+            'next_cursor': end if end < total else None
+        }
+
+    def get_page(self, result_id, cursor=0, limit=1000):
+        """
+        Return one page of invalid records starting at `cursor`, or None if the result expired.
+        `next_cursor` is None once the last page has been returned.
+        """
+        entry = self.get_page_frame(result_id, cursor, limit)
+        if entry is None:
+            return None
+        page, paging = entry
+        if not hasattr(page, 'iloc'):
+            page = page.toPandas()
+        return dict(paging, records=records_to_json(page))
+
+    def stream_ndjson(self, records, chunk_size=10000, positions=None):
+        """Yield the records (the rows at `positions` when given) as NDJSON, one chunk of rows at a time."""
+        if not hasattr(records, 'iloc'):
+            # Spark DataFrame: rows are pulled from the executors one partition at a time
+            for row in records.toLocalIterator():
+                yield json.dumps(row.asDict(), default=str) + '\n'
+            return
+        total = len(positions) if positions is not None else len(records)
+        for start in range(0, total, chunk_size):
+            chunk = self._rows(records, positions, start, start + chunk_size)
+            yield chunk.to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n'
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, (_, _, _, created) in self._results.items() if now - created > self.ttl_seconds]
+        for key in expired:
+            self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._results),
+                'frames': len(self._frames),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+def _ordered(sdf):
+    """Sort a Spark DataFrame by every orderable column: rows that still tie are identical."""
+    from pyspark.sql import types as T
+    columns = [f"`{field.name}`" for field in sdf.schema.fields if not isinstance(field.dataType, T.MapType)]
+    return sdf.orderBy(*columns) if columns else sdf
+
+
+# Process-wide store shared by the checker and the API
+invalid_record_store = InvalidRecordStore(
+    max_entries=int(os.getenv('INVALID_RECORDS_MAX_RESULTS', 64)),
+    ttl_seconds=float(os.getenv('INVALID_RECORDS_TTL_SECONDS', 3600)),
+    max_bytes=int(os.getenv('INVALID_RECORDS_MAX_BYTES', 256 * 1024 * 1024))
+)
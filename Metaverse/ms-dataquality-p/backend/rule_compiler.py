@@ -0,0 +1,96 @@
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache, partial
+from dotenv import load_dotenv
+from backend.rule_kernels import resolve_kernel, regex
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+# Everything check_rule needs for a rule, prepared once per (rule_name, column, rule_sql)
+CompiledRule = namedtuple('CompiledRule', ['sql_script', 'kernel', 'query', 'position_query'])
+
+# Row position column added to the frame a SQL rule runs on, to map the returned rows back to it
+ROW_POSITION_COLUMN = '__pos'
+
+_DOUBLE_STARS = re.compile(r'\*\*')
+_FIRST_STATEMENT = re.compile(r'.*?;')
+_FROM_TABLE = re.compile(r'\bFROM\s+\w+', flags=re.IGNORECASE)
+_COUNT = re.compile(r'\bCOUNT\b', flags=re.IGNORECASE)
+_NOT_EQUAL = re.compile(r'\b!=\b', flags=re.IGNORECASE)
+_MOD = re.compile(r'\bMOD\b', flags=re.IGNORECASE)
+_SELECT_LIST = re.compile(r'^\s*SELECT\s+.*?\s+FROM\s+df\b', flags=re.IGNORECASE | re.DOTALL)
+# Queries that don't return rows of df as they are (aggregates, deduplication, set operations)
+_NOT_ROW_FILTER = re.compile(r'\b(?:GROUP\s+BY|HAVING|DISTINCT|UNION|INTERSECT|EXCEPT|COUNT|SUM|AVG|MIN|MAX)\b',
+                             flags=re.IGNORECASE)
+# Functions whose arguments were stripped from the generated SQL and get the rule column back
+_COLUMN_FUNCTIONS = [
+    (name, re.compile(rf'\b{name}\b', flags=re.IGNORECASE))
+    for name in ('TRIM', 'LENGTH', 'UPPER', 'LOWER', 'CHAR_LENGTH')
+]
+
+
+def clean_rule_sql(script):
+    """
+    Cleans the SQL script by removing '**' marks and anything after the first semicolon.
+    The semicolon is preserved as part of the query.
+    """
+    script = _DOUBLE_STARS.sub('', script)
+    match = _FIRST_STATEMENT.search(script)
+    if match:
+        script = match.group(0)
+    return script.strip()
+
+
+def normalize_rule_query(rule_name, column, rule_sql):
+    """
+    Rewrite a generated SQL rule so it runs against the DataFrame exposed as table `df`.
+    """
+    query = _FROM_TABLE.sub('FROM df', rule_sql)
+    query = _COUNT.sub('COUNT(*)', query)
+
+    # Apply TRIM(column_name), LENGTH(column_name)... format fixes using the `column` variable
+    for name, pattern in _COLUMN_FUNCTIONS:
+        query = pattern.sub(f'{name}({column})', query)
+
+    if "IntegerOnly" in rule_name:
+        query = _MOD.sub(f'MOD({column}, 1)', query)
+
+    return _NOT_EQUAL.sub('<>', query)
+
+
+def position_query(query):
+    """
+    Rewrite a row-filtering rule query so it returns the ROW_POSITION_COLUMN of the matching rows,
+    or None when the query does not select rows of df (aggregates, DISTINCT, set operations).
+    """
+    if _NOT_ROW_FILTER.search(query) or not _SELECT_LIST.match(query):
+        return None
+    return _SELECT_LIST.sub(f'SELECT {ROW_POSITION_COLUMN} FROM df', query, count=1)
+
+
+@lru_cache(maxsize=int(os.getenv('RULE_CACHE_SIZE', 1024)))
+def compile_rule(rule_name, column, rule_sql):
+    """
+    Prepare a rule once: clean its SQL, then either pick the vectorized kernel of its
+    family (with the user regex compiled for Regex rules) or build the rewritten query.
+    """
+    sql_script = clean_rule_sql(rule_sql)
+    kernel = resolve_kernel(rule_name)
+    if kernel is regex:
+        kernel = partial(regex, pattern=re.compile(sql_script.strip()))
+    query = normalize_rule_query(rule_name, column, sql_script) if kernel is None else None
+    return CompiledRule(sql_script, kernel, query, position_query(query) if query is not None else None)
+
+
+def rule_cache_stats():
+    info = compile_rule.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'entries': info.currsize,
+        'max_entries': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0
+    }
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from dotenv import load_dotenv
+from backend.api_mistral import MISTRAL_MODEL, RULES_PROMPT_VERSION
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Bumped when the signature changes meaning: v2 keys on the exact column name, since the
+# cached SQL spells the column as it was generated for ('Customer ID' rules don't run on 'customer_id')
+SIGNATURE_VERSION = 2
+
+
+def normalize_dtype(dtype):
+    # Spark reports e.g. 'decimal(10,2)': the precision does not change the rules
+    return re.sub(r'\(.*\)', '', str(dtype or 'unknown').strip().lower())
+
+
+def column_signature(column, dtype):
+    """Cache key of a column: exact name, normalized type, the model and prompt version."""
+    key = f"v{SIGNATURE_VERSION}|{MISTRAL_MODEL}|{RULES_PROMPT_VERSION}|{column}|{normalize_dtype(dtype)}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class LocalRuleCacheBackend:
+    """One JSON file per column signature under `cache_dir`."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, signature):
+        return os.path.join(self.cache_dir, f"{signature}.json")
+
+    def get(self, signature):
+        try:
+            with open(self._path(signature), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, item):
+        tmp_path = self._path(item['signature']) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(item, f)
+        os.replace(tmp_path, self._path(item['signature']))
+
+    def delete(self, column=None, dtype=None):
+        deleted = 0
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.json'):
+                continue
+            item = self.get(file_name[:-len('.json')])
+            if item is None:
+                continue
+            if (column is None or item.get('column') == column) and (dtype is None or item.get('dtype') == dtype):
+                os.remove(os.path.join(self.cache_dir, file_name))
+                deleted += 1
+        return deleted
+
+
+class DynamoDBRuleCacheBackend:
+    """Entries stored in the `rule_generation_cache` table next to the other tables of Database."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, signature):
+        item = self.db.get_cached_rules(signature)
+        if item is None:
+            return None
+        # Numbers come back from DynamoDB as Decimal
+        item['expires_at'] = int(item['expires_at'])
+        item['rules'] = json.loads(item['rules'])
+        return item
+
+    def put(self, item):
+        self.db.put_cached_rules(dict(item, rules=json.dumps(item['rules'])))
+
+    def delete(self, column=None, dtype=None):
+        return self.db.delete_cached_rules(column, dtype)
+
+
+class RuleGenerationCache:
+    """
+    Persistent cache of LLM-generated rules keyed by column signature, so datasets that
+    share exact column names and types reuse rules instead of paying an LLM round trip.
+    Entries expire after `ttl_seconds`; invalidate() drops them explicitly.
+    """
+
+    def __init__(self, backend, ttl_seconds):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, column, dtype):
+        try:
+            item = self.backend.get(column_signature(column, dtype))
+        except Exception as e:
+            logger.warning(f"Rule generation cache lookup failed for {column}: {str(e)}")
+            item = None
+        fresh = item is not None and item.get('expires_at', 0) > time.time()
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return item['rules'] if fresh else None
+
+    def put(self, column, dtype, rules):
+        item = {
+            'signature': column_signature(column, dtype),
+            'column': str(column),
+            'dtype': normalize_dtype(dtype),
+            'model': MISTRAL_MODEL,
+            'prompt_version': RULES_PROMPT_VERSION,
+            'rules': rules,
+            'expires_at': int(time.time() + self.ttl_seconds)
+        }
+        try:
+            self.backend.put(item)
+        except Exception as e:
+            logger.warning(f"Could not cache generated rules for {column}: {str(e)}")
+
+    def invalidate(self, column=None, dtype=None):
+        """Drop the entries of a column name and/or type, or every entry. Returns the number removed."""
+        return self.backend.delete(
+            str(column) if column is not None else None,
+            normalize_dtype(dtype) if dtype is not None else None
+        )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def create_rule_generation_cache(db=None):
+    """
+    Build the cache from RULE_GENERATION_CACHE_BACKEND: 'local' (default), 'dynamodb'
+    (needs the Database instance) or 'none'.
+    """
+    backend_name = os.getenv('RULE_GENERATION_CACHE_BACKEND', 'local').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'dynamodb':
+        backend = DynamoDBRuleCacheBackend(db)
+    else:
+        backend = LocalRuleCacheBackend(
+            os.getenv('RULE_GENERATION_CACHE_DIR', os.path.join('.dq_state', 'rule_cache'))
+        )
+    return RuleGenerationCache(
+        backend,
+        ttl_seconds=int(os.getenv('RULE_GENERATION_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+    )
@@ -0,0 +1,178 @@
+import re
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+
+# Vectorized kernels for the built-in rule families used by DataQualityChecker.check_rule.
+# Every kernel takes (series, rule_name, rule_sql) and returns a boolean numpy mask that is
+# True for the rows that FAIL the rule. No kernel calls back into Python once per row.
+
+
+def _is_text(series):
+    return ptypes.is_object_dtype(series.dtype) or ptypes.is_string_dtype(series.dtype)
+
+
+def _is_int(series):
+    return ptypes.is_integer_dtype(series.dtype) and not ptypes.is_bool_dtype(series.dtype)
+
+
+def _mask(values):
+    """Turn a (possibly nullable) boolean result into a plain numpy mask, missing -> False."""
+    if isinstance(values, pd.Series):
+        return values.fillna(False).to_numpy(dtype=bool)
+    return np.asarray(values, dtype=bool)
+
+
+def _text_values(series):
+    """
+    Return the column with every non-null value as a string. Object columns coming out of
+    Spark hold str values already, so only the (usually empty) non-string subset is cast.
+    """
+    if not ptypes.is_object_dtype(series.dtype):
+        return series
+    non_str = _non_str_mask(series)
+    if not non_str.any():
+        return series
+    strings = series.copy()
+    strings[non_str] = series[non_str].astype(str)
+    return strings
+
+
+def _non_str_mask(series):
+    """Flag the non-null values of an object column that are not strings."""
+    try:
+        lengths = series.str.len()
+    except AttributeError:
+        # .str refuses object columns without any string (ints, Decimals, dates, bools...)
+        return _mask(series.notna())
+    return _mask(lengths.isna() & series.notna())
+
+
+def not_null(series, rule_name, rule_sql):
+    return _mask(series.isna())
+
+
+def unique(series, rule_name, rule_sql):
+    return _mask(series.duplicated())
+
+
+def positive_integer(series, rule_name, rule_sql):
+    if not ptypes.is_numeric_dtype(series.dtype) or ptypes.is_bool_dtype(series.dtype):
+        series = pd.to_numeric(series, errors='coerce')
+    return _mask(series <= 0)
+
+
+def numeric(series, rule_name, rule_sql):
+    """A value is valid when its string form is made only of digits."""
+    if _is_int(series):
+        # str(int) is all digits exactly when the value is non-negative
+        return ~_mask(series >= 0)
+    if not _is_text(series):
+        # floats ("1.0", "nan"), booleans, dates... never render as pure digits
+        return np.ones(len(series), dtype=bool)
+    strings = _text_values(series)
+    return ~_mask(strings.str.isdigit())
+
+
+# 10, 100, ..., 10**19: enough to count the digits of any int64 magnitude
+_POWERS_OF_TEN = np.array([10 ** k for k in range(1, 20)], dtype=np.uint64)
+
+
+def _int_lengths(series):
+    """len(str(value)) of an integer column, counted with integer bounds instead of strings."""
+    values = series.to_numpy(dtype='int64', na_value=0)
+    # abs() of int64.min overflows back to itself, which is exactly 2**63 once viewed as uint64
+    magnitude = np.abs(values).view(np.uint64)
+    digits = 1 + np.searchsorted(_POWERS_OF_TEN, magnitude, side='right') + (values < 0)
+    lengths = digits.astype('float64')
+    lengths[_mask(series.isna())] = np.nan
+    return lengths
+
+
+def value_lengths(series):
+    """
+    Length of every value as the Length rule measures it, as a float array where NaN marks
+    the values that fail whatever the expected length (missing ints and text values).
+    """
+    if _is_int(series):
+        return _int_lengths(series)
+    if _is_text(series):
+        strings = _text_values(series)
+        return strings.str.len().to_numpy(dtype='float64', na_value=np.nan)
+    return series.astype(str).str.len().to_numpy(dtype='float64')
+
+
+def length(series, rule_name, rule_sql):
+    expected = int(re.findall(r'\d+', rule_name)[0])
+    return ~(value_lengths(series) == expected)
+
+
+def no_leading_zeros(series, rule_name, rule_sql):
+    if _is_int(series):
+        return _mask(series == 0)
+    if ptypes.is_float_dtype(series.dtype):
+        # "0.0", "0.5" start with a zero; "-0.0", "nan" and "1e-05" (str() switches to
+        # scientific notation below 1e-04) do not
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        return ((values == 0) & ~np.signbit(values)) | ((values >= 1e-4) & (values < 1))
+    if _is_text(series):
+        strings = _text_values(series)
+        return _mask(strings.str.startswith('0'))
+    return np.zeros(len(series), dtype=bool)
+
+
+def consistent_data_type(series, rule_name, rule_sql):
+    """Flags values that are python ints, floats (NaN included) or bools instead of text."""
+    if ptypes.is_numeric_dtype(series.dtype) or ptypes.is_bool_dtype(series.dtype):
+        if isinstance(series.dtype, np.dtype):
+            # Every value of a numpy numeric column is an int, a float or a bool
+            return np.ones(len(series), dtype=bool)
+        # Nullable extension columns hold pd.NA for missing values, which is not a number
+        return _mask(series.notna())
+    if not ptypes.is_object_dtype(series.dtype):
+        return np.zeros(len(series), dtype=bool)
+    # Only the non-string values of an object column (None and NaN included) need the type test
+    try:
+        candidates = _mask(series.str.len().isna())
+    except AttributeError:
+        candidates = np.ones(len(series), dtype=bool)
+    invalid = np.zeros(len(series), dtype=bool)
+    if candidates.any():
+        # Same test as the per-row check: Decimal, dates and None are not flagged
+        invalid[candidates] = series[candidates].map(lambda x: isinstance(x, (int, float))).to_numpy(dtype=bool)
+    return invalid
+
+
+def regex(series, rule_name, rule_sql, pattern=None):
+    pattern = pattern if pattern is not None else re.compile(rule_sql.strip())
+    if _is_text(series):
+        strings = _text_values(series)
+    else:
+        strings = series.astype(str)
+    if isinstance(strings.dtype, pd.ArrowDtype) and isinstance(pattern, re.Pattern):
+        # Arrow-backed strings match with pyarrow.compute, which only takes the pattern text
+        pattern = pattern.pattern
+    return ~_mask(strings.str.match(pattern, na=False))
+
+
+# Order matters: check_rule picks the first family whose name appears in the rule name,
+# e.g. "Positive Integer" must win over "Numeric"-like names further down.
+RULE_KERNELS = (
+    ("Not Null", not_null),
+    ("Unique", unique),
+    ("Positive Integer", positive_integer),
+    ("Numeric", numeric),
+    ("Length", length),
+    ("No Leading Zeros", no_leading_zeros),
+    ("Consistent Data Type", consistent_data_type),
+    ("Regex", regex),
+)
+
+
+def resolve_kernel(rule_name):
+    """Return the kernel for a rule name, or None when the rule must run as SQL."""
+    for family, kernel in RULE_KERNELS:
+        if family in rule_name:
+            return kernel
+    return None
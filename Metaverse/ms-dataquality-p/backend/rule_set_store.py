@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RULE_FIELDS = ('Column', 'Rule', 'SQL Query')
+# DynamoDB rejects items over 400 KB, attribute names included
+MAX_DYNAMODB_ITEM_BYTES = 400 * 1024
+
+
+def rules_hash(rules):
+    """Content hash of a rule set: the same rules in another order hash the same."""
+    rows = sorted(json.dumps([rule[field] for field in RULE_FIELDS]) for rule in rules)
+    return hashlib.sha256('\n'.join(rows).encode('utf-8')).hexdigest()
+
+
+def version_name(sequence):
+    # Zero-padded so versions sort in creation order
+    return f"v{sequence:08d}"
+
+
+class LocalRuleSetBackend:
+    """One JSON file per dataset under `store_dir`, holding every version."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.store_dir, f"{hashlib.sha256(str(dataset_id).encode('utf-8')).hexdigest()}.json")
+
+    def _load(self, dataset_id):
+        try:
+            with open(self._path(dataset_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'versions': []}
+
+    def get(self, dataset_id, version='latest'):
+        versions = self._load(dataset_id)['versions']
+        if not versions:
+            return None
+        if version == 'latest':
+            return versions[-1]
+        return next((item for item in versions if item['version'] == version), None)
+
+    def versions(self, dataset_id):
+        return [{k: v for k, v in item.items() if k != 'rules'} for item in self._load(dataset_id)['versions']]
+
+    def put(self, item, previous_sequence):
+        with self._lock:
+            entry = self._load(item['dataset_id'])
+            current = entry['versions'][-1]['sequence'] if entry['versions'] else None
+            if current != previous_sequence:
+                return False
+            entry['versions'].append(item)
+            tmp_path = self._path(item['dataset_id']) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(item['dataset_id']))
+        return True
+
+
+class DynamoDBRuleSetBackend:
+    """Rule sets stored in the `rule_sets` table next to the other tables of Database."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _decode(self, item):
+        if item is None:
+            return None
+        # Numbers come back from DynamoDB as Decimal
+        item['sequence'] = int(item['sequence'])
+        if 'current_version' in item:
+            # The 'latest' item carries the name of the version it copies
+            item['version'] = item.pop('current_version')
+        if 'rules' in item:
+            item['rules'] = json.loads(item['rules'])
+        return item
+
+    def get(self, dataset_id, version='latest'):
+        return self._decode(self.db.get_rule_set(dataset_id, version))
+
+    def versions(self, dataset_id):
+        return [self._decode(item) for item in self.db.list_rule_set_versions(dataset_id)]
+
+    def put(self, item, previous_sequence):
+        encoded = dict(item, rules=json.dumps(item['rules']))
+        # Upper bound of the stored size (the 'latest' copy also carries current_version)
+        size = sum(len(name.encode('utf-8')) + len(str(value).encode('utf-8')) for name, value in encoded.items())
+        size += len('current_version') + len(str(item['version']))
+        if size > MAX_DYNAMODB_ITEM_BYTES:
+            raise ValueError(
+                f"Rule set of dataset {item['dataset_id']} takes {size} bytes, over the {MAX_DYNAMODB_ITEM_BYTES} bytes "
+                f"DynamoDB item limit ({len(item['rules'])} rules). Use RULE_SET_STORE_BACKEND=local for rule sets this large."
+            )
+        return self.db.put_rule_set(encoded, previous_sequence)
+
+
+class RuleSetStore:
+    """
+    Versioned rule sets per dataset. save() only writes a new version when the rules
+    changed; latest() answers with a single lookup, without listing or parsing CSV files.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def latest(self, dataset_id):
+        return self.backend.get(str(dataset_id), 'latest')
+
+    def get(self, dataset_id, version=None):
+        return self.backend.get(str(dataset_id), version or 'latest')
+
+    def versions(self, dataset_id):
+        return self.backend.versions(str(dataset_id))
+
+    def save(self, dataset_id, rules, file_name=None, source_etag=None, attempts=5):
+        """
+        Store `rules` ([{'Column', 'Rule', 'SQL Query'}]) as the latest rule set of the dataset.
+        Returns (item, created): `created` is False when the latest version already has these rules.
+        A save that loses a race against another one retries on top of the new latest version.
+        """
+        dataset_id = str(dataset_id)
+        content_hash = rules_hash(rules)
+        for _ in range(attempts):
+            latest = self.latest(dataset_id)
+            if latest is not None and latest['rules_hash'] == content_hash:
+                return latest, False
+            sequence = latest['sequence'] + 1 if latest else 1
+            item = {
+                'dataset_id': dataset_id,
+                'version': version_name(sequence),
+                'sequence': sequence,
+                'rules_hash': content_hash,
+                'rules': [{field: rule[field] for field in RULE_FIELDS} for rule in rules],
+                'file_name': file_name,
+                'source_etag': source_etag,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }
+            if self.backend.put(item, latest['sequence'] if latest else None):
+                logger.info(f"Saved rule set {item['version']} of dataset {dataset_id} ({len(rules)} rules)")
+                return item, True
+            logger.info(f"Concurrent rule set save for dataset {dataset_id}, retrying on the new latest version")
+        raise RuntimeError(f"Could not save the rule set of dataset {dataset_id} after {attempts} attempts")
+
+
+def to_quality_rules(rule_set):
+    """Rules of a stored rule set in the {'column', 'rule_name', 'query'} shape of the check endpoints."""
+    return [
+        {'column': rule['Column'], 'rule_name': rule['Rule'], 'query': rule['SQL Query']}
+        for rule in rule_set['rules']
+    ]
+
+
+def create_rule_set_store(db=None):
+    """Build the store from RULE_SET_STORE_BACKEND: 'dynamodb' (default, needs the Database instance) or 'local'."""
+    if os.getenv('RULE_SET_STORE_BACKEND', 'dynamodb').lower() == 'local':
+        backend = LocalRuleSetBackend(os.getenv('RULE_SET_STORE_DIR', os.path.join('.dq_state', 'rule_sets')))
+    else:
+        backend = DynamoDBRuleSetBackend(db)
+    return RuleSetStore(backend)
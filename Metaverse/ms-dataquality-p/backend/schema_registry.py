@@ -0,0 +1,143 @@
+import os
+import csv
+import json
+import logging
+import threading
+from pandas.api import types as ptypes
+from dotenv import load_dotenv
+from backend.approximate import sample_csv_object
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_ISO_DATE = r'^\d{4}-\d{2}-\d{2}$'
+_ISO_TIMESTAMP = r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?$'
+
+
+def _spark_type(series):
+    """Spark SQL type of a sampled column, following what inferSchema would pick."""
+    if series.isna().all():
+        return 'string'
+    if ptypes.is_bool_dtype(series.dtype):
+        return 'boolean'
+    if ptypes.is_integer_dtype(series.dtype):
+        # bigint even when the sample fits in int: later rows may not
+        return 'bigint'
+    if ptypes.is_float_dtype(series.dtype):
+        return 'double'
+    values = series.dropna().astype(str)
+    if values.str.match(_ISO_DATE).all():
+        return 'date'
+    if values.str.match(_ISO_TIMESTAMP).all():
+        return 'timestamp'
+    return 'string'
+
+
+def infer_csv_schema(s3_client, bucket_name, key, sample_rows, block_bytes, max_blocks):
+    """
+    Infer [(column, spark_type)] from a bounded sample of a CSV object (head block plus
+    blocks spread over the file), or None when the header can't be mapped one to one.
+    """
+    sample, _, _ = sample_csv_object(s3_client, bucket_name, key, sample_rows, block_bytes, max_blocks, block_bytes)
+    head = s3_client.get_object(Bucket=bucket_name, Key=key, Range=f"bytes=0-{min(block_bytes, 65536) - 1}")['Body'].read()
+    header = next(csv.reader([head.decode('utf-8', errors='replace').split('\n', 1)[0].rstrip('\r')]))
+    if list(sample.columns) != header or len(set(header)) != len(header) or '' in header:
+        # Duplicate or empty names are renamed differently by pandas and Spark
+        return None
+    return [(column, _spark_type(sample[column])) for column in sample.columns]
+
+
+def schema_to_ddl(schema):
+    """[(column, type)] -> DDL string accepted by DataFrameReader.schema()."""
+    return ', '.join(f"`{column.replace('`', '``')}` {data_type}" for column, data_type in schema)
+
+
+class SchemaRegistry:
+    """
+    Schemas inferred once per (dataset_id, ETag) and kept on disk (one JSON file per
+    dataset), so readers get an explicit schema instead of an inferSchema pass over the object.
+    A schema inferred from a sample is only trusted for every row once a full read of that
+    version succeeded with it (see mark_validated).
+    """
+
+    def __init__(self, registry_dir, sample_rows, block_bytes, max_blocks):
+        self.registry_dir = registry_dir
+        self.sample_rows = sample_rows
+        self.block_bytes = block_bytes
+        self.max_blocks = max_blocks
+        self._schemas = {}
+        self._lock = threading.Lock()
+        os.makedirs(registry_dir, exist_ok=True)
+
+    def _path(self, dataset_id):
+        return os.path.join(self.registry_dir, f"{dataset_id}.json")
+
+    def _entry(self, dataset_id):
+        with self._lock:
+            entry = self._schemas.get(dataset_id)
+        if entry is None:
+            try:
+                with open(self._path(dataset_id), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            with self._lock:
+                self._schemas[dataset_id] = entry
+        return entry
+
+    def get(self, dataset_id, etag):
+        entry = self._entry(dataset_id)
+        if entry is None or entry['etag'] != etag:
+            return None
+        return [tuple(field) for field in entry['schema']]
+
+    def is_validated(self, dataset_id, etag):
+        entry = self._entry(dataset_id)
+        return entry is not None and entry['etag'] == etag and entry.get('validated', False)
+
+    def mark_validated(self, dataset_id, etag, schema=None):
+        """Record that every row of this version fits the schema, replacing it by `schema` when given."""
+        if schema is None:
+            schema = self.get(dataset_id, etag)
+        if schema is not None:
+            self.put(dataset_id, etag, schema, validated=True)
+
+    def put(self, dataset_id, etag, schema, validated=False):
+        entry = {'etag': etag, 'schema': [list(field) for field in schema], 'validated': validated}
+        with self._lock:
+            self._schemas[dataset_id] = entry
+        tmp_path = self._path(dataset_id) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(dataset_id))
+
+    def resolve(self, s3_client, dataset_id, bucket_name, key, file_type, etag):
+        """
+        Return the schema of a dataset version, inferring it from a sample on first use.
+        None means the reader has to fall back to inferSchema (non-CSV, unknown version or failure).
+        """
+        if not etag or dataset_id is None or (file_type or '').lower() != 'csv':
+            return None
+        schema = self.get(dataset_id, etag)
+        if schema is not None:
+            return schema
+        try:
+            schema = infer_csv_schema(s3_client, bucket_name, key, self.sample_rows, self.block_bytes, self.max_blocks)
+        except Exception as e:
+            logger.warning(f"Could not infer schema of s3://{bucket_name}/{key}: {str(e)}")
+            return None
+        if schema:
+            self.put(dataset_id, etag, schema)
+        return schema
+
+
+# Process-wide registry shared by every DataQualityService instance
+schema_registry = SchemaRegistry(
+    registry_dir=os.getenv('SCHEMA_REGISTRY_DIR', os.path.join('.dq_state', 'schemas')),
+    sample_rows=int(os.getenv('SCHEMA_SAMPLE_ROWS', 5000)),
+    block_bytes=int(os.getenv('SCHEMA_SAMPLE_BLOCK_BYTES', 256 * 1024)),
+    max_blocks=int(os.getenv('SCHEMA_SAMPLE_MAX_BLOCKS', 8))
+)
@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLD = 'cold'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class LazyService:
+    """
+    Stand-in for a service object that is only built on first attribute access, so the API
+    module can import (and uvicorn accept connections) before DynamoDB, S3 or GitLab answer.
+    A failed build is retried by the next access.
+    """
+
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._state = COLD
+        self._error = None
+        self._init_seconds = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._state = WARMING
+                    start = time.time()
+                    try:
+                        instance = self._factory()
+                    except Exception as e:
+                        self._state = FAILED
+                        self._error = str(e)
+                        logger.error(f"Failed to initialize {self._name}: {str(e)}")
+                        raise
+                    self._init_seconds = round(time.time() - start, 3)
+                    self._error = None
+                    self._instance = instance
+                    self._state = READY
+                    logger.info(f"{self._name} initialized in {self._init_seconds}s")
+        return self._instance
+
+    def __getattr__(self, attribute):
+        # Only called for attributes missing on the proxy itself, i.e. those of the service
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+        return getattr(self._resolve(), attribute)
+
+    def _status(self):
+        status = {'state': self._state, 'init_seconds': self._init_seconds}
+        if self._error:
+            status['error'] = self._error
+        return status
+
+
+class ServiceRegistry:
+    """Lazy services of an API process, with an optional background warm-up and health reports."""
+
+    def __init__(self):
+        self.services = {}
+        self.required = set()
+        self.started_at = time.time()
+        self.probes = {}
+
+    def register(self, name, factory, required=True):
+        service = LazyService(name, factory)
+        self.services[name] = service
+        if required:
+            self.required.add(name)
+        return service
+
+    def add_probe(self, name, probe):
+        """Extra subsystem reported by readiness (e.g. the Spark session), `probe` returns a status dict."""
+        self.probes[name] = probe
+
+    def warm_up(self, names=None):
+        """Initialize the services in a background thread; requests are served meanwhile."""
+        def run():
+            for name in names or list(self.services):
+                try:
+                    self.services[name]._resolve()
+                except Exception:
+                    # Already logged, the service stays failed until a request retries it
+                    pass
+        thread = threading.Thread(target=run, name='service-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        """FastAPI lifespan handler: starts the background warm-up unless SERVICE_WARMUP=false."""
+        if warmup_enabled():
+            self.warm_up()
+        yield
+
+    def health(self):
+        return {'status': 'ok', 'uptime_seconds': round(time.time() - self.started_at, 3)}
+
+    def readiness(self):
+        """(ready, report): ready once every required service is initialized."""
+        services = {name: service._status() for name, service in self.services.items()}
+        ready = all(services[name]['state'] == READY for name in self.required)
+        report = {'status': 'ready' if ready else 'not ready', 'services': services}
+        for name, probe in self.probes.items():
+            try:
+                report[name] = probe()
+            except Exception as e:
+                report[name] = {'error': str(e)}
+        return ready, report
+
+
+def warmup_enabled():
+    return os.getenv('SERVICE_WARMUP', 'true').lower() == 'true'
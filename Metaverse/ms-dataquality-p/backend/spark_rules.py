@@ -0,0 +1,126 @@
+import re
+import uuid
+from pyspark.sql import functions as F
+from pyspark.sql import types as T
+from pyspark.sql.window import Window
+
+
+# Spark counterparts of backend/rule_kernels.py. Each kernel takes (sdf, column, rule_name, rule_sql)
+# and returns (sdf, condition) where `condition` is a boolean Column that is True for failing rows.
+# Kernels may add helper columns to the DataFrame (e.g. a window rank for Unique).
+
+_INVALID_FLAG = '__dq_invalid'
+_DUPLICATE_RANK = '__dq_rank'
+_DF_TABLE = re.compile(r'\bFROM\s+df\b', flags=re.IGNORECASE)
+
+
+def _as_string(sdf, column):
+    return F.col(f"`{column}`").cast('string')
+
+
+def _is_numeric_type(sdf, column):
+    data_type = sdf.schema[column].dataType
+    return isinstance(data_type, (T.NumericType, T.BooleanType))
+
+
+def not_null(sdf, column, rule_name, rule_sql):
+    return sdf, F.col(f"`{column}`").isNull()
+
+
+def unique(sdf, column, rule_name, rule_sql):
+    # Every occurrence after the first one of a value is a duplicate (same as pandas duplicated()).
+    # Ties are broken on the whole row, so a recomputed frame flags the same rows again
+    order = [F.col(f"`{field.name}`") for field in sdf.schema.fields if not isinstance(field.dataType, T.MapType)]
+    window = Window.partitionBy(F.col(f"`{column}`")).orderBy(*order)
+    sdf = sdf.withColumn(_DUPLICATE_RANK, F.row_number().over(window))
+    return sdf, F.col(_DUPLICATE_RANK) > 1
+
+
+def positive_integer(sdf, column, rule_name, rule_sql):
+    return sdf, F.coalesce(F.col(f"`{column}`").cast('double') <= 0, F.lit(False))
+
+
+def numeric(sdf, column, rule_name, rule_sql):
+    # Null renders as "None" on the pandas path, which is not made of digits either
+    return sdf, F.coalesce(~_as_string(sdf, column).rlike(r'^\p{Nd}+$'), F.lit(True))
+
+
+def length(sdf, column, rule_name, rule_sql):
+    expected = int(re.findall(r'\d+', rule_name)[0])
+    return sdf, F.coalesce(F.length(_as_string(sdf, column)) != expected, F.lit(True))
+
+
+def no_leading_zeros(sdf, column, rule_name, rule_sql):
+    return sdf, F.coalesce(_as_string(sdf, column).startswith('0'), F.lit(False))
+
+
+def consistent_data_type(sdf, column, rule_name, rule_sql):
+    # Spark columns have a single type: numeric columns hold only numbers, string columns none
+    return sdf, F.lit(_is_numeric_type(sdf, column))
+
+
+def regex(sdf, column, rule_name, rule_sql):
+    # pandas str.match only anchors at the start of the value
+    pattern = f"^(?:{rule_sql.strip()})"
+    return sdf, F.coalesce(~_as_string(sdf, column).rlike(pattern), F.lit(True))
+
+
+# Same family order as backend/rule_kernels.RULE_KERNELS
+SPARK_RULE_KERNELS = (
+    ("Not Null", not_null),
+    ("Unique", unique),
+    ("Positive Integer", positive_integer),
+    ("Numeric", numeric),
+    ("Length", length),
+    ("No Leading Zeros", no_leading_zeros),
+    ("Consistent Data Type", consistent_data_type),
+    ("Regex", regex),
+)
+
+
+def resolve_spark_kernel(rule_name):
+    for family, kernel in SPARK_RULE_KERNELS:
+        if family in rule_name:
+            return kernel
+    return None
+
+
+def check_rule_spark(sdf, rule_name, column, compiled, sample_size):
+    """
+    Evaluate one rule on a Spark DataFrame. Counting happens in a single aggregation on
+    the executors; only the counts and at most `sample_size` invalid rows reach the driver.
+    Returns the counts, the invalid-row sample (pandas) and the lazy invalid-row DataFrame.
+    """
+    kernel = resolve_spark_kernel(rule_name)
+    if kernel is not None:
+        flagged, condition = kernel(sdf, column, rule_name, compiled.sql_script)
+        flagged = flagged.withColumn(_INVALID_FLAG, condition)
+        counts = flagged.agg(
+            F.count(F.lit(1)).alias('total'),
+            F.sum(F.col(_INVALID_FLAG).cast('long')).alias('invalid')
+        ).collect()[0]
+        total, invalid_count = counts['total'], counts['invalid'] or 0
+        invalid_rows = flagged.filter(F.col(_INVALID_FLAG)).select(*[F.col(f"`{c}`") for c in sdf.columns])
+    else:
+        # Generated SQL runs as Spark SQL against the dataset registered as a view of its own:
+        # the session is shared, so a fixed name could be replaced by a concurrent request
+        view_name = f"df_{uuid.uuid4().hex}"
+        sdf.createOrReplaceTempView(view_name)
+        try:
+            query = _DF_TABLE.sub(f'FROM {view_name}', compiled.query.strip().rstrip(';'))
+            # The plan is resolved here, the view is not needed once it is dropped
+            filtered = sdf.sparkSession.sql(query)
+            total = sdf.count()
+            invalid_count = total - filtered.count()
+        finally:
+            sdf.sparkSession.catalog.dropTempView(view_name)
+        # Rows can only be matched back when the query returns rows of the dataset itself
+        invalid_rows = sdf.exceptAll(filtered) if filtered.columns == sdf.columns else sdf.limit(0)
+
+    sample = invalid_rows.limit(sample_size).toPandas()
+    return {
+        'valid_count': total - invalid_count,
+        'invalid_count': invalid_count,
+        'invalid_records': sample,
+        'invalid_rows': invalid_rows
+    }
@@ -1,6 +1,10 @@
 from pyspark.sql import SparkSession
 import logging
 import os
+import time
+import threading
+import requests
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Configure logging
@@ -12,12 +16,120 @@ logger = logging.getLogger(__name__)
 env_file = '.env'
 load_dotenv(env_file, override=True)
 
+SPARK_PACKAGES = os.getenv(
+    'SPARK_JARS_PACKAGES',
+    "org.apache.hadoop:hadoop-aws:3.2.0,com.amazonaws:aws-java-sdk-bundle:1.11.563"
+)
+SPARK_JARS_DIR = os.getenv('SPARK_JARS_DIR', os.path.join('.dq_state', 'jars'))
+MAVEN_REPOSITORY = os.getenv('SPARK_JARS_REPOSITORY', 'https://repo1.maven.org/maven2')
+
+# S3A I/O profiles: 'sequential' for whole-object scans (raw CSV/Excel), 'random' for
+# column reads of Parquet copies, 'balanced' in between. Chosen with S3A_IO_PROFILE.
+S3A_PROFILES = {
+    'balanced': {
+        'fs.s3a.connection.maximum': '64',
+        'fs.s3a.threads.max': '32',
+        'fs.s3a.readahead.range': '1M',
+        'fs.s3a.experimental.input.fadvise': 'normal',
+        'fs.s3a.multipart.size': '64M',
+        'fs.s3a.fast.upload': 'true',
+        'fs.s3a.fast.upload.buffer': 'disk',
+        'fs.s3a.block.size': '128M',
+    },
+    'sequential': {
+        'fs.s3a.connection.maximum': '96',
+        'fs.s3a.threads.max': '64',
+        'fs.s3a.readahead.range': '8M',
+        'fs.s3a.experimental.input.fadvise': 'sequential',
+        'fs.s3a.multipart.size': '128M',
+        'fs.s3a.fast.upload': 'true',
+        'fs.s3a.fast.upload.buffer': 'disk',
+        'fs.s3a.block.size': '256M',
+    },
+    'random': {
+        'fs.s3a.connection.maximum': '128',
+        'fs.s3a.threads.max': '64',
+        'fs.s3a.readahead.range': '64K',
+        'fs.s3a.experimental.input.fadvise': 'random',
+        'fs.s3a.multipart.size': '64M',
+        'fs.s3a.fast.upload': 'true',
+        'fs.s3a.fast.upload.buffer': 'disk',
+        'fs.s3a.block.size': '64M',
+    },
+}
+
+# Single settings overriding the chosen profile
+S3A_OVERRIDES = {
+    'S3A_CONNECTION_MAXIMUM': 'fs.s3a.connection.maximum',
+    'S3A_THREADS_MAX': 'fs.s3a.threads.max',
+    'S3A_READAHEAD_RANGE': 'fs.s3a.readahead.range',
+    'S3A_FADVISE': 'fs.s3a.experimental.input.fadvise',
+    'S3A_MULTIPART_SIZE': 'fs.s3a.multipart.size',
+    'S3A_BLOCK_SIZE': 'fs.s3a.block.size',
+}
+
+
+def s3a_options(profile=None):
+    """fs.s3a.* settings of an I/O profile with the S3A_* overrides applied."""
+    profile = (profile or os.getenv('S3A_IO_PROFILE', 'balanced')).lower()
+    if profile not in S3A_PROFILES:
+        raise ValueError(f"Unknown S3A I/O profile '{profile}', expected one of: {', '.join(S3A_PROFILES)}")
+    options = dict(S3A_PROFILES[profile])
+    for variable, option in S3A_OVERRIDES.items():
+        if os.getenv(variable):
+            options[option] = os.getenv(variable)
+    return options
+
+
+def _jar_name(coordinate):
+    group, artifact, version = coordinate.split(':')
+    return f"{artifact}-{version}.jar"
+
+
+def local_jars(jars_dir=SPARK_JARS_DIR, packages=SPARK_PACKAGES):
+    """Paths of the bundled jars, or None when one of the packages is missing from `jars_dir`."""
+    paths = [os.path.abspath(os.path.join(jars_dir, _jar_name(coordinate))) for coordinate in packages.split(',')]
+    return paths if all(os.path.exists(path) for path in paths) else None
+
+
+def download_jars(jars_dir=SPARK_JARS_DIR, packages=SPARK_PACKAGES, repository=MAVEN_REPOSITORY):
+    """
+    Fetch the jars of `packages` into `jars_dir` (e.g. at image build time), so sessions
+    start from local files instead of resolving the packages over the network.
+    """
+    os.makedirs(jars_dir, exist_ok=True)
+    for coordinate in packages.split(','):
+        group, artifact, version = coordinate.split(':')
+        path = os.path.join(jars_dir, _jar_name(coordinate))
+        if os.path.exists(path):
+            continue
+        url = f"{repository}/{group.replace('.', '/')}/{artifact}/{version}/{_jar_name(coordinate)}"
+        logger.info(f"Downloading {url}")
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(path + '.tmp', 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+        os.replace(path + '.tmp', path)
+    return local_jars(jars_dir, packages)
+
+
 def create_spark_session():
     try:
-        spark_s3 = SparkSession.builder \
+        builder = SparkSession.builder \
             .appName("S3DataReader") \
-            .config("spark.master", "local[*]") \
-            .config("spark.jars.packages", "org.apache.hadoop:hadoop-aws:3.2.0,com.amazonaws:aws-java-sdk-bundle:1.11.563,com.crealytics:spark-excel_2.11:0.13.5") \
+            .config("spark.master", "local[*]")
+        jars = local_jars()
+        if jars:
+            builder = builder.config("spark.jars", ",".join(jars))
+        else:
+            # Resolved from Maven; the ivy cache under SPARK_JARS_DIR keeps later starts offline
+            builder = builder \
+                .config("spark.jars.packages", SPARK_PACKAGES) \
+                .config("spark.jars.ivy", os.path.abspath(os.path.join(SPARK_JARS_DIR, 'ivy')))
+        for option, value in s3a_options().items():
+            builder = builder.config(f"spark.hadoop.{option}", value)
+        spark_s3 = builder \
             .config("spark.hadoop.fs.s3a.impl", "org.apache.hadoop.fs.s3a.S3AFileSystem") \
             .config("spark.hadoop.fs.s3a.aws.credentials.provider", "org.apache.hadoop.fs.s3a.SimpleAWSCredentialsProvider") \
             .config("spark.hadoop.fs.s3a.access.key", os.getenv('ACCESS_KEY')) \
@@ -25,6 +137,8 @@ def create_spark_session():
             .config("spark.hadoop.fs.s3a.endpoint", f"s3.{os.getenv('AWS_REGION')}.amazonaws.com") \
             .config("spark.hadoop.fs.s3a.path.style.access", "true") \
             .config("spark.hadoop.com.amazonaws.services.s3.enableV4", "true") \
+            .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+            .config("spark.sql.execution.arrow.pyspark.fallback.enabled", "true") \
             .getOrCreate()
         logger.info("SparkSession created successfully in local mode")
         return spark_s3
@@ -32,6 +146,53 @@ def create_spark_session():
         logger.error(f"Failed to create SparkSession: {e}")
         raise
 
+
+class SparkSessionManager:
+    """
+    One SparkSession per process, created on first use instead of at import time, so the
+    API boots without waiting for the JVM and every service shares the same session.
+    """
+
+    def __init__(self, factory=create_spark_session):
+        self.factory = factory
+        self._session = None
+        self._lock = threading.Lock()
+        self.started_at = None
+        self.startup_seconds = None
+
+    def get(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    start = time.time()
+                    session = self.factory()
+                    self.startup_seconds = round(time.time() - start, 3)
+                    self.started_at = datetime.fromtimestamp(start, timezone.utc).isoformat()
+                    logger.info(f"SparkSession started in {self.startup_seconds}s")
+                    self._session = session
+        return self._session
+
+    def is_started(self):
+        return self._session is not None
+
+    def stop(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.stop()
+                self._session = None
+
+    def stats(self):
+        return {
+            'started': self.is_started(),
+            'started_at': self.started_at,
+            'startup_seconds': self.startup_seconds,
+            'bundled_jars': local_jars() is not None
+        }
+
+
+# Process-wide session shared by every DataQualityService instance
+spark_manager = SparkSessionManager()
+
 """ spark = create_spark_session()
 
 bucket_name = "saas-bucket-1111"
@@ -102,4 +263,8 @@ except Exception as e:
     print(f"Failed to create DataFrame: {str(e)}")
 
 # Don't forget to stop the session when you're done
-spark.stop()"""
\ No newline at end of file
+spark.stop()"""
+
+if __name__ == '__main__':
+    # python -m backend.spark_session downloads the jars into SPARK_JARS_DIR
+    print(download_jars())
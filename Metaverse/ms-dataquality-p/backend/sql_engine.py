@@ -0,0 +1,77 @@
+import os
+import logging
+from dotenv import load_dotenv
+
+env_file = '.env'
+load_dotenv(env_file, override=True)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DuckDBEngine:
+    """
+    Runs generated SQL rules with DuckDB directly on the pandas frame.
+    The frame is registered as a view, so DuckDB scans the existing column buffers
+    in place (no copy into a separate database) with its vectorized columnar executor.
+    """
+    name = 'duckdb'
+    # DuckDB understands the PostgreSQL '~' regex match operator
+    supports_regex_operator = True
+
+    def __init__(self):
+        import duckdb
+        self.connection = duckdb.connect(database=':memory:')
+
+    def query(self, sql, frames):
+        # A cursor is an independent connection to the same database, safe to use per call/thread
+        cursor = self.connection.cursor()
+        try:
+            for table_name, frame in frames.items():
+                cursor.register(table_name, frame)
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+
+class PandasqlEngine:
+    """
+    Fallback engine: pandasql copies the frames into a fresh SQLite database on each call.
+    """
+    name = 'pandasql'
+    supports_regex_operator = False
+
+    def __init__(self):
+        import pandasql
+        self.sqldf = pandasql.sqldf
+
+    def query(self, sql, frames):
+        return self.sqldf(sql, frames)
+
+
+SQL_ENGINES = {
+    DuckDBEngine.name: DuckDBEngine,
+    PandasqlEngine.name: PandasqlEngine,
+}
+
+
+def create_sql_engines(preferred=None):
+    """
+    Build the ordered list of available engines, the preferred one (SQL_ENGINE, default duckdb)
+    first and the others as fallbacks. Engines whose package isn't installed are skipped.
+    """
+    preferred = preferred or os.getenv('SQL_ENGINE', DuckDBEngine.name)
+    names = [preferred] + [name for name in SQL_ENGINES if name != preferred]
+    engines = []
+    for name in names:
+        engine_class = SQL_ENGINES.get(name)
+        if engine_class is None:
+            logger.warning(f"Unknown SQL engine '{name}', skipping it.")
+            continue
+        try:
+            engines.append(engine_class())
+        except ImportError as e:
+            logger.warning(f"SQL engine '{name}' is not available: {str(e)}")
+    if not engines:
+        raise RuntimeError("No SQL engine available, install duckdb or pandasql.")
+    return engines
@@ -0,0 +1,201 @@
+"""
+Offline benchmark of DataQualityChecker.check_rule.
+
+Generates synthetic datasets with controlled null, duplicate and format-violation rates,
+runs every built-in rule family and a few LLM-style SQL rules through check_rule, and
+reports latency percentiles, rows/sec and peak memory per rule as JSON.
+No S3, DynamoDB or Spark is needed.
+
+    python benchmarks/bench_checker.py --rows 1e4 1e5 1e6 --output bench.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.checker import DataQualityChecker
+from backend.rule_kernels import resolve_kernel
+
+
+# (column, rule_name, rule_sql) as the checker receives them
+BUILTIN_RULES = [
+    ('id', 'Unique ID', ''),
+    ('email', 'Not Null Email', ''),
+    ('quantity', 'Positive Integer Quantity', ''),
+    ('code', 'Numeric Code', ''),
+    ('code', 'Length 8 Code', ''),
+    ('code', 'No Leading Zeros Code', ''),
+    ('name', 'Consistent Data Type Name', ''),
+    ('email', 'Regex Email', r'[^@\s]+@[^@\s]+\.[a-z]+'),
+]
+
+# Shaped like the generated rules saved by generate_and_save_rules (arguments already stripped)
+SQL_RULES = [
+    ('email', 'Email Format', "SELECT * FROM table_name WHERE email LIKE '%@%.%';"),
+    ('name', 'Trimmed Name', "SELECT * FROM table_name WHERE TRIM = name;"),
+    ('code', 'Code Character Count', "SELECT * FROM table_name WHERE CHAR_LENGTH = 8;"),
+    ('amount', 'Amount Range', "SELECT * FROM table_name WHERE amount BETWEEN 0 AND 1000;"),
+    ('email', 'Email Present Count', "SELECT COUNT FROM table_name WHERE email IS NOT NULL;"),
+]
+
+
+def generate_dataset(rows, null_rate, duplicate_rate, violation_rate, seed):
+    """
+    Build a frame shaped like a Spark toPandas() result: int64/float64 columns and
+    object columns of str with None for nulls.
+    """
+    rng = np.random.default_rng(seed)
+
+    ids = np.arange(rows, dtype=np.int64)
+    duplicates = rng.random(rows) < duplicate_rate
+    ids[duplicates] = rng.integers(0, rows, int(duplicates.sum()))
+
+    code = pd.Series(rng.integers(10 ** 7, 10 ** 8, rows)).astype(str).astype(object)
+    leading_zero = rng.random(rows) < violation_rate
+    code[leading_zero] = '0' + code[leading_zero].str[1:]
+    not_digits = rng.random(rows) < violation_rate
+    code[not_digits] = code[not_digits].str[:-1] + 'A'
+
+    email = ('user' + pd.Series(ids).astype(str) + '@example.com').astype(object)
+    bad_email = rng.random(rows) < violation_rate
+    email[bad_email] = email[bad_email].str.replace('@', ' at ', regex=False)
+
+    name = pd.Series(rng.choice(['alice', 'bob', 'carol', 'dave', ' erin '], rows)).astype(object)
+
+    quantity = rng.integers(1, 1000, rows).astype(np.int64)
+    non_positive = rng.random(rows) < violation_rate
+    quantity[non_positive] = -rng.integers(0, 10, int(non_positive.sum()))
+
+    frame = pd.DataFrame({
+        'id': ids,
+        'code': code,
+        'email': email,
+        'name': name,
+        'amount': rng.normal(100, 50, rows),
+        'quantity': quantity,
+    })
+    for column in ('code', 'email', 'name', 'amount'):
+        nulls = rng.random(rows) < null_rate
+        frame.loc[nulls, column] = None if frame[column].dtype == object else np.nan
+    return frame
+
+
+def percentile_summary(latencies):
+    values = np.asarray(latencies) * 1000
+    return {
+        'min': round(float(values.min()), 3),
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def bench_rule(checker, frame, column, rule_name, rule_sql, repeats):
+    quiet = io.StringIO()
+    latencies, metrics = [], None
+    with contextlib.redirect_stdout(quiet):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            metrics = checker.check_rule(frame, rule_name, column, rule_sql)
+            latencies.append(time.perf_counter() - start)
+
+        # Separate traced run: tracemalloc slows allocations down, so it is kept out of the timings
+        tracemalloc.start()
+        checker.check_rule(frame, rule_name, column, rule_sql)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    result = {
+        'column': column,
+        'rule': rule_name,
+        'path': 'kernel' if resolve_kernel(rule_name) else 'sql',
+        'repeats': repeats,
+        'latency_ms': percentile_summary(latencies),
+        'rows_per_sec': int(len(frame) / float(np.median(latencies))) if np.median(latencies) > 0 else None,
+        'peak_memory_bytes': peak,
+    }
+    if metrics is None:
+        result['error'] = quiet.getvalue().strip().splitlines()[-1] if quiet.getvalue().strip() else 'check_rule returned None'
+    else:
+        result['valid_count'] = int(metrics['valid_count'])
+        result['invalid_count'] = int(metrics['invalid_count'])
+    return result
+
+
+def run_benchmark(rows_list, repeats, null_rate, duplicate_rate, violation_rate, seed, rule_set):
+    checker = DataQualityChecker(connect=False)
+    rules = {'builtin': BUILTIN_RULES, 'sql': SQL_RULES, 'all': BUILTIN_RULES + SQL_RULES}[rule_set]
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'sql_engines': [engine.name for engine in checker.sql_engines],
+        },
+        'config': {
+            'repeats': repeats,
+            'null_rate': null_rate,
+            'duplicate_rate': duplicate_rate,
+            'violation_rate': violation_rate,
+            'seed': seed,
+            'rules': rule_set,
+        },
+        'datasets': [],
+    }
+    for rows in rows_list:
+        start = time.perf_counter()
+        frame = generate_dataset(rows, null_rate, duplicate_rate, violation_rate, seed)
+        dataset = {
+            'rows': rows,
+            'generation_seconds': round(time.perf_counter() - start, 3),
+            'frame_bytes': int(frame.memory_usage(index=True, deep=True).sum()),
+            'rules': [],
+        }
+        for column, rule_name, rule_sql in rules:
+            print(f"[{rows} rows] {rule_name} on {column}", file=sys.stderr)
+            dataset['rules'].append(bench_rule(checker, frame, column, rule_name, rule_sql, repeats))
+        # High-water mark of the whole process so far (ru_maxrss is in KiB on Linux)
+        dataset['process_max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        report['datasets'].append(dataset)
+        del frame
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DataQualityChecker.check_rule on synthetic datasets.")
+    parser.add_argument('--rows', nargs='+', default=['1e4', '1e5', '1e6'],
+                        help="Dataset sizes, e.g. 1e4 1e5 1e6 1e7 1e8")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--null-rate', type=float, default=0.05)
+    parser.add_argument('--duplicate-rate', type=float, default=0.01)
+    parser.add_argument('--violation-rate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rules', choices=['builtin', 'sql', 'all'], default='all')
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        [int(float(rows)) for rows in args.rows], args.repeats, args.null_rate,
+        args.duplicate_rate, args.violation_rate, args.seed, args.rules
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+from types import SimpleNamespace
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.approximate import ApproximateChecker, sample_csv_object
+from backend.checker import DataQualityChecker
+
+
+class FakeS3:
+    def __init__(self, body):
+        self.body = body
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.body)}
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Range is None:
+            return {'Body': io.BytesIO(self.body)}
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        return {'Body': io.BytesIO(self.body[start:end + 1])}
+
+
+def csv_bytes(rows):
+    return ('id,note\n' + ''.join(f'{i},{note}\n' for i, note in rows)).encode('utf-8')
+
+
+def test_sample_is_spread_over_the_object():
+    body = csv_bytes((i, 'x' * 20) for i in range(200000))
+    sample, population, full = sample_csv_object(FakeS3(body), 'bucket', 'key', 1000, 4096, 512, 1024, seed=1)
+    assert not full
+    assert len(sample) == 1000
+    assert abs(population - 200000) / 200000 < 0.05
+    # Rows come from every part of the object, not from a few contiguous runs
+    assert pd.cut(sample['id'], 10).value_counts().min() > 50
+
+
+def test_blocks_split_inside_quoted_fields_are_skipped():
+    body = csv_bytes((i, '"line one\nline two"' if i % 3 == 0 else 'plain') for i in range(50000))
+    sample, _, _ = sample_csv_object(FakeS3(body), 'bucket', 'key', 500, 2048, 256, 1024, seed=2)
+    assert len(sample) > 0
+    assert set(sample['note']) <= {'line one\nline two', 'plain'}
+
+
+def test_unique_on_sampled_csv_sketches_every_row():
+    body = csv_bytes((i % 150000, 'n') for i in range(200000))
+    s3 = FakeS3(body)
+    checker = DataQualityChecker(connect=False)
+    checker.dqs = SimpleNamespace(s3_client=s3)
+    checker.db = SimpleNamespace(get_dataset_by_id=lambda _: [{'dataset_type': 'csv', 'name': 'key', 'datasource_id': 'ds'}],
+                                 get_datasource_by_id=lambda _: [{'name': 'bucket'}])
+    approximate = ApproximateChecker(checker)
+    approximate.full_read_bytes = 1024
+    rule = SimpleNamespace(column='id', rule_name='Unique', query='')
+    report = approximate.run({'id': 'dataset'}, [rule])['reports'][0]
+    assert report['Estimate Method'] == 'hyperloglog'
+    assert report['Population Estimate'] == 200000
+    low, high = report['Incidents Interval']
+    assert low <= 50000 <= high
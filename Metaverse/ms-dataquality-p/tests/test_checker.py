@@ -0,0 +1,40 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.checker import DataQualityChecker
+from backend.rule_compiler import compile_rule
+from backend.sql_engine import SQL_ENGINES
+
+RANGE_RULE = 'SELECT * FROM dataset WHERE amount BETWEEN 0 AND 1000;'
+
+
+def installed_engines():
+    names = []
+    for name in SQL_ENGINES:
+        try:
+            SQL_ENGINES[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.mark.parametrize('engine', installed_engines())
+def test_sql_rule_locates_invalid_rows_anywhere(monkeypatch, engine):
+    monkeypatch.setenv('SQL_ENGINE', engine)
+    checker = DataQualityChecker(connect=False)
+    # Invalid rows at the start and the end: not the first rows of the frame
+    df = pd.DataFrame({'amount': [5000, 1, 2, 3, 9000]}, index=[10, 11, 12, 13, 14])
+    metrics = checker.check_rule(df, 'Amount Range', 'amount', RANGE_RULE)
+    assert metrics['valid_count'] == 3
+    assert metrics['invalid_count'] == 2
+    assert df.iloc[metrics['invalid_positions']]['amount'].tolist() == [5000, 9000]
+
+
+def test_only_row_filters_get_a_position_query():
+    assert compile_rule('Amount Range', 'amount', RANGE_RULE).position_query.startswith('SELECT __pos FROM df')
+    assert compile_rule('Amount Total', 'amount', 'SELECT SUM(amount) FROM dataset;').position_query is None
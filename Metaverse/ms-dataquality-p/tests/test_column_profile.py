@@ -0,0 +1,23 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.column_profile import ProfileStore
+from backend.rule_kernels import length, not_null, unique
+
+
+def test_profiles_survive_a_new_store(tmp_path):
+    frame = pd.DataFrame({'code': ['ab', 'abc', None, 'ab'], 'amount': [1, -2, 3, 3]})
+    version = ('"etag"', '2024-01-01 00:00:00+00:00')
+    ProfileStore(4, str(tmp_path)).get_or_build('../dataset', version, frame)
+    assert all(name.endswith('.json') for name in os.listdir(tmp_path))
+
+    restarted = ProfileStore(4, str(tmp_path))
+    profile = restarted.get('../dataset', version)
+    assert profile is not None
+    assert profile.invalid_count('code', 'Length 2', length) == 2
+    assert profile.invalid_count('code', 'Not Null', not_null) == 1
+    assert profile.invalid_count('amount', 'Unique', unique) == 1
+    # Another version of the object is profiled again
+    assert restarted.get('../dataset', ('"other"', version[1])) is None
@@ -0,0 +1,87 @@
+import os
+import sys
+import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import excel_reader
+
+openpyxl = pytest.importorskip('openpyxl')
+
+
+def make_workbook(path, rows, title='Sheet1'):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = title
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def read_sheet(tmp_path, rows, batch_rows=2):
+    workbook = make_workbook(str(tmp_path / 'book.xlsx'), rows)
+    output = str(tmp_path / 'sheet.parquet')
+    written = excel_reader.write_sheet_parquet(workbook, 'Sheet1', output, batch_rows=batch_rows)
+    return written, pq.read_table(output)
+
+
+def test_later_float_widens_int_column(tmp_path):
+    written, table = read_sheet(tmp_path, [['amount'], [1], [2], [3], [2.5]])
+    assert written == 4
+    assert table.schema.field('amount').type == pa.float64()
+    assert table.column('amount').to_pylist() == [1.0, 2.0, 3.0, 2.5]
+
+
+def test_later_text_widens_numeric_column_to_string(tmp_path):
+    _, table = read_sheet(tmp_path, [['id', 'amount'], [1, 1], [2, 2], [3, 2.5], [4, 4.0], [5, 'N/A'], [6, None]])
+    assert table.schema.field('amount').type == pa.string()
+    values = table.column('amount').to_pylist()
+    # No value is turned into a null or truncated: 'N/A' stays visible to the rules
+    assert values[:3] == ['1', '2', '2.5']
+    assert values[4:] == ['N/A', None]
+
+
+def test_empty_first_batch_takes_type_of_later_values(tmp_path):
+    _, table = read_sheet(tmp_path, [['code', 'day'], ['a', None], ['b', None],
+                                     ['c', datetime.datetime(2024, 1, 2)], ['d', datetime.datetime(2024, 1, 3)]])
+    assert pa.types.is_timestamp(table.schema.field('day').type)
+    assert table.column('day').to_pylist()[2:] == [datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 3)]
+
+
+def test_conversions_get_their_own_directory(tmp_path):
+    workbook = make_workbook(str(tmp_path / 'book.xlsx'), [['id'], [1], [2]])
+    reader = excel_reader.ExcelReader(None, str(tmp_path / 'staging'), batch_rows=10, max_workers=1, retention_seconds=3600)
+    first = reader.to_parquet('bucket', 'book.xlsx', local_path=workbook, etag='"v1"')
+    again = reader.to_parquet('bucket', 'book.xlsx', local_path=workbook, etag='"v1"')
+    other = reader.to_parquet('bucket', 'book.xlsx', local_path=workbook, etag='"v2"')
+    unversioned = reader.to_parquet('bucket', 'book.xlsx', local_path=workbook)
+    assert first == again
+    assert len({first, other, unversioned}) == 3
+    # Other conversions stay readable until the retention expires
+    assert all(os.listdir(path) == ['part-00000.parquet'] for path in (first, other, unversioned))
+
+
+def test_sheets_disagreeing_on_a_type_share_the_wider_one(tmp_path):
+    workbook = openpyxl.Workbook()
+    first = workbook.active
+    first.title = 'ints'
+    for row in [['id', 'amount', 'code'], [1, 10, 5], [2, 20, 6]]:
+        first.append(row)
+    second = workbook.create_sheet('floats')
+    for row in [['id', 'amount', 'code'], [3, 2.5, 'A7'], [4, 4.0, 'B8']]:
+        second.append(row)
+    path = str(tmp_path / 'book.xlsx')
+    workbook.save(path)
+    reader = excel_reader.ExcelReader(None, str(tmp_path / 'staging'), batch_rows=10, max_workers=2, retention_seconds=3600)
+    output = reader.to_parquet('bucket', 'book.xlsx', sheets='*', local_path=path, etag='"v1"')
+    schemas = [pq.read_schema(os.path.join(output, name)) for name in sorted(os.listdir(output))]
+    assert [schema.field('amount').type for schema in schemas] == [pa.float64(), pa.float64()]
+    assert [schema.field('code').type for schema in schemas] == [pa.string(), pa.string()]
+    assert [schema.field('id').type for schema in schemas] == [pa.int64(), pa.int64()]
+    table = pa.concat_tables(pq.read_table(os.path.join(output, name)) for name in sorted(os.listdir(output)))
+    assert table.column('amount').to_pylist() == [10.0, 20.0, 2.5, 4.0]
+    assert table.column('code').to_pylist() == ['5', '6', 'A7', 'B8']
+    assert table.column(excel_reader.SHEET_COLUMN).to_pylist() == ['ints', 'ints', 'floats', 'floats']
@@ -0,0 +1,39 @@
+import os
+import sys
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.checker import DataQualityChecker
+from backend.incremental import IncrementalChecker, IncrementalStateStore
+
+
+def test_state_files_stay_in_the_state_dir(tmp_path):
+    store = IncrementalStateStore(str(tmp_path / 'state'))
+    state = store.load('../../escape')
+    state['objects']['part-0.csv'] = {'etag': 'abc', 'partials': {
+        ('Unique', 'id', 'q'): {'total': 3, 'hashes': np.array([1, 2, 2 ** 63], dtype=np.uint64)},
+        ('Not Null', 'id', 'q'): {'total': 3, 'valid': 3, 'invalid': 0},
+    }}
+    store.save(state)
+    assert os.listdir(tmp_path) == ['state']
+    assert all(name.endswith('.json') for name in os.listdir(tmp_path / 'state'))
+    loaded = store.load('../../escape')
+    partials = loaded['objects']['part-0.csv']['partials']
+    assert partials[('Unique', 'id', 'q')]['hashes'].tolist() == [1, 2, 2 ** 63]
+    assert partials[('Not Null', 'id', 'q')]['valid'] == 3
+    assert [s['dataset_id'] for s in store.all_states()] == ['../../escape']
+
+
+def test_missing_column_is_reported_for_its_rule_only(tmp_path):
+    frame = pd.DataFrame({'id': [1, 2, 2]})
+    dqs = SimpleNamespace(read_dataframe=lambda *args, **kwargs: SimpleNamespace(toPandas=lambda: frame))
+    checker = DataQualityChecker(connect=False)
+    checker.dqs, checker.db = dqs, None
+    incremental = IncrementalChecker(checker, IncrementalStateStore(str(tmp_path)))
+    rules = [{'rule_name': 'Unique', 'column': 'code', 'query': ''},
+             {'rule_name': 'Unique', 'column': 'id', 'query': ''}]
+    partials = incremental.evaluate_object('bucket', 'part-0.csv', 'csv', rules)
+    assert 'error' in partials[('Unique', 'code', '')]
+    assert partials[('Unique', 'id', '')]['total'] == 3
@@ -0,0 +1,36 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.frame_cache import frame_size_bytes
+from backend.result_store import InvalidRecordStore
+
+
+def test_results_of_one_frame_count_it_once():
+    df = pd.DataFrame({'amount': np.arange(1000)})
+    store = InvalidRecordStore(max_entries=64, ttl_seconds=3600, max_bytes=10 * frame_size_bytes(df))
+    first = store.put(df, positions=[1, 2])
+    second = store.put(df, positions=[3])
+    assert store.stats()['frames'] == 1
+    assert store.stats()['current_bytes'] == frame_size_bytes(df) + 3 * 8
+    assert store.get(first)['amount'].tolist() == [1, 2]
+    assert store.get(second)['amount'].tolist() == [3]
+
+
+def test_oldest_results_are_dropped_beyond_the_byte_budget():
+    frames = [pd.DataFrame({'amount': np.arange(1000)}) for _ in range(3)]
+    store = InvalidRecordStore(max_entries=64, ttl_seconds=3600, max_bytes=2 * frame_size_bytes(frames[0]) + 100)
+    ids = [store.put(frame, positions=[0]) for frame in frames]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+    assert store.stats()['current_bytes'] <= store.max_bytes
+
+
+def test_frame_over_the_budget_keeps_only_its_invalid_rows():
+    df = pd.DataFrame({'amount': np.arange(100000)})
+    store = InvalidRecordStore(max_entries=64, ttl_seconds=3600, max_bytes=frame_size_bytes(df) // 10)
+    result_id = store.put(df, positions=[5, 99999])
+    assert store.get(result_id)['amount'].tolist() == [5, 99999]
+    assert store.stats()['current_bytes'] < frame_size_bytes(df)
@@ -0,0 +1,84 @@
+import os
+import sys
+import datetime
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import rule_kernels
+
+
+# Object columns without a single string: `.str` refuses them, the kernels must not
+NON_STRING_COLUMNS = {
+    'ints': [1, 22, 0, 305, 7],
+    'decimals': [Decimal('1'), Decimal('0.5'), Decimal('22'), Decimal('-3'), Decimal('10')],
+    'dates': [datetime.date(2024, 1, d) for d in range(1, 6)],
+    'bools': [True, False, True, True, False],
+}
+
+
+@pytest.fixture(params=sorted(NON_STRING_COLUMNS))
+def series(request):
+    return pd.Series(NON_STRING_COLUMNS[request.param], dtype=object)
+
+
+def test_numeric_matches_string_form(series):
+    expected = ~series.apply(lambda x: str(x).isdigit()).to_numpy(dtype=bool)
+    np.testing.assert_array_equal(rule_kernels.numeric(series, 'Numeric', ''), expected)
+
+
+def test_length_matches_string_form(series):
+    expected = (series.astype(str).str.len() != 2).to_numpy(dtype=bool)
+    np.testing.assert_array_equal(rule_kernels.length(series, 'Length 2', ''), expected)
+
+
+def test_no_leading_zeros_matches_string_form(series):
+    expected = series.astype(str).str.startswith('0').to_numpy(dtype=bool)
+    np.testing.assert_array_equal(rule_kernels.no_leading_zeros(series, 'No Leading Zeros', ''), expected)
+
+
+def test_regex_matches_string_form(series):
+    expected = ~series.astype(str).str.match(r'^\d+$').to_numpy(dtype=bool)
+    np.testing.assert_array_equal(rule_kernels.regex(series, 'Regex', r'^\d+$'), expected)
+
+
+def baseline_consistent_data_type(series):
+    return series.apply(lambda x: isinstance(x, int) or isinstance(x, float)).to_numpy(dtype=bool)
+
+
+def test_consistent_data_type_matches_type_test(series):
+    np.testing.assert_array_equal(rule_kernels.consistent_data_type(series, 'Consistent Data Type', ''),
+                                  baseline_consistent_data_type(series))
+
+
+@pytest.mark.parametrize('values', [
+    [Decimal('1'), 'x', Decimal('2.5')],
+    ['a', float('nan'), None, 3, True, 'b'],
+    [1.5, float('nan'), 2.0],
+])
+def test_consistent_data_type_on_mixed_columns(values):
+    series = pd.Series(values, dtype=object) if any(isinstance(v, str) for v in values) else pd.Series(values)
+    np.testing.assert_array_equal(rule_kernels.consistent_data_type(series, 'Consistent Data Type', ''),
+                                  baseline_consistent_data_type(series))
+
+
+def test_no_leading_zeros_on_floats_matches_string_form():
+    series = pd.Series([0.0, -0.0, 0.5, 1e-05, 0.0001, 9.99e-05, 1.5, float('nan'), -0.5])
+    expected = series.astype(str).str.startswith('0').to_numpy(dtype=bool)
+    np.testing.assert_array_equal(rule_kernels.no_leading_zeros(series, 'No Leading Zeros', ''), expected)
+
+
+def test_mixed_object_column_casts_only_non_strings():
+    series = pd.Series(['007', 12, None, 'abc'], dtype=object)
+    np.testing.assert_array_equal(rule_kernels.no_leading_zeros(series, 'No Leading Zeros', ''), [True, False, False, False])
+    np.testing.assert_array_equal(rule_kernels.numeric(series, 'Numeric', ''), [False, False, True, True])
+
+
+def test_compiled_regex_on_arrow_strings():
+    import pyarrow as pa
+    from backend.rule_compiler import compile_rule
+    series = pd.Series(['A12', 'b', None], dtype=pd.ArrowDtype(pa.string()))
+    compiled = compile_rule('Regex', 'code', r'[A-Z]\d+')
+    np.testing.assert_array_equal(compiled.kernel(series, 'Regex', compiled.sql_script), [False, True, True])
@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.rule_set_store import DynamoDBRuleSetBackend, RuleSetStore
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.items = {}
+
+    def get_rule_set(self, dataset_id, version='latest'):
+        item = self.items.get((dataset_id, version))
+        return dict(item) if item else None
+
+    def put_rule_set(self, item, previous_sequence):
+        self.items[(item['dataset_id'], item['version'])] = item
+        self.items[(item['dataset_id'], 'latest')] = dict(item, current_version=item['version'])
+        return True
+
+
+def rules(count, query_bytes=100):
+    return [{'Column': f'c{i}', 'Rule': 'Not Null', 'SQL Query': 'x' * query_bytes} for i in range(count)]
+
+
+def test_rule_set_keeps_its_source_etag():
+    store = RuleSetStore(DynamoDBRuleSetBackend(FakeDatabase()))
+    item, created = store.save('dataset', rules(3), 'file.csv', source_etag='"abc"')
+    assert created
+    assert store.latest('dataset')['source_etag'] == '"abc"'
+
+
+def test_rule_set_over_the_item_limit_fails_clearly():
+    db = FakeDatabase()
+    store = RuleSetStore(DynamoDBRuleSetBackend(db))
+    with pytest.raises(ValueError, match='DynamoDB item limit'):
+        store.save('dataset', rules(5000), 'file.csv')
+    assert db.items == {}